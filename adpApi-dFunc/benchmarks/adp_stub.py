@@ -0,0 +1,478 @@
+"""Local stand-in for the ADP auth and hr/v2/workers endpoints
+
+    python benchmarks/adp_stub.py --headcount 5000 --latency 0.05 --port 8443
+
+Serves over TLS and, like ADP, only talks to clients presenting a certificate signed
+by its CA. Every certificate is generated at start-up; Pki.adp_credentials() hands
+out the client certificate and key in the string formats Key Vault produces, so the
+activities run unchanged. Latency, empty bodies, failed TLS handshakes and 429
+throttling are injected from a seeded random generator so runs can be compared.
+"""
+import argparse
+import datetime
+import hashlib
+import ipaddress
+import json
+import math
+import os
+import random
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+auth_path = "/auth/oauth/v2/token"
+workers_path = "/hr/v2/workers"
+
+
+def _name(common_name: str) -> x509.Name:
+    return x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+
+
+def _issue(subject, key, issuer, issuer_key, ca=False, names=()):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = (
+        x509.CertificateBuilder()
+        .subject_name(_name(subject))
+        .issuer_name(_name(issuer))
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+    )
+    if names:
+        builder = builder.add_extension(
+            x509.SubjectAlternativeName(list(names)), critical=False
+        )
+    return builder.sign(issuer_key, hashes.SHA256())
+
+
+def _pem(key) -> bytes:
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+class Pki:
+    """Throwaway CA with a server certificate for localhost and one client certificate
+
+    ca_path and server_path are PEM files under directory, point REQUESTS_CA_BUNDLE
+    and SSL_CERT_FILE at ca_path so clients trust the stub.
+    """
+
+    def __init__(self, directory: str):
+        ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.ca = _issue("adp stub ca", ca_key, "adp stub ca", ca_key, ca=True)
+
+        server_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        server = _issue(
+            "localhost",
+            server_key,
+            "adp stub ca",
+            ca_key,
+            names=[
+                x509.DNSName("localhost"),
+                x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+            ],
+        )
+        self.client_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.client = _issue("adp stub client", self.client_key, "adp stub ca", ca_key)
+
+        self.ca_path = os.path.join(directory, "adp-stub-ca.pem")
+        self.server_path = os.path.join(directory, "adp-stub-server.pem")
+        with open(self.ca_path, "wb") as pem:
+            pem.write(self.ca.public_bytes(serialization.Encoding.PEM))
+        with open(self.server_path, "wb") as pem:
+            pem.write(
+                server.public_bytes(serialization.Encoding.PEM) + _pem(server_key)
+            )
+
+    def adp_credentials(self, client_id="stub-client", client_secret="stub-secret"):
+        """adp_credentials as Parameters builds them from Key Vault"""
+        return {
+            "certificate": self.client.public_bytes(serialization.Encoding.DER).decode(
+                "latin1"
+            ),
+            "private_key": json.dumps(_pem(self.client_key).decode()),
+            "client_id": client_id,
+            "client_secret": client_secret,
+        }
+
+
+class Behaviour:
+    """What the stub serves and which faults it injects
+
+    Args:
+        headcount (int): workers behind hr/v2/workers
+        latency (float): median seconds added to every API response
+        jitter (float): sigma of the lognormal latency, 0 for a fixed latency
+        empty_rate (float): share of 200 responses sent without a body
+        ssl_error_rate (float): share of connections dropped during the handshake
+        max_rps (float): requests per second before 429s, None for no limit
+        retry_after (int): Retry-After seconds sent with a 429
+        etags (bool): send ETags and answer If-None-Match with 304
+        seed (int): seed of the fault and latency generator
+        workers (callable): index -> (base document, custom document)
+    """
+
+    def __init__(
+        self,
+        headcount=1000,
+        latency=0.0,
+        jitter=0.0,
+        empty_rate=0.0,
+        ssl_error_rate=0.0,
+        max_rps=None,
+        retry_after=1,
+        etags=False,
+        seed=0,
+        workers=None,
+    ):
+        self.headcount = headcount
+        self.latency = latency
+        self.jitter = jitter
+        self.empty_rate = empty_rate
+        self.ssl_error_rate = ssl_error_rate
+        self.max_rps = max_rps
+        self.retry_after = retry_after
+        self.etags = etags
+        self.seed = seed
+        self.workers = workers or simple_worker
+
+    def describe(self) -> dict:
+        return {key: value for key, value in vars(self).items() if key != "workers"}
+
+
+def aoid(index: int) -> str:
+    return f"G{index:015d}"
+
+
+def simple_worker(index: int) -> tuple:
+    """(base, custom) documents with the sections Config.columns reads"""
+    base = {
+        "associateOID": aoid(index),
+        "workerID": {"idValue": f"{index:06d}"},
+        "person": {
+            "legalName": {
+                "givenName": f"Given{index}",
+                "familyName1": f"Family{index}",
+            },
+            "birthDate": "1990-01-01",
+        },
+        "workAssignments": [
+            {
+                "positionID": f"P{index % 500:05d}",
+                "hireDate": "2020-01-01",
+                "assignmentStatus": {"statusCode": {"codeValue": "A"}},
+            }
+        ],
+    }
+    custom = {
+        "associateOID": aoid(index),
+        "person": {
+            "communication": {
+                "emails": [
+                    {
+                        "emailUri": f"worker{index}@example.com",
+                        "nameCode": {"codeValue": "Work"},
+                    }
+                ],
+                "mobiles": [{"formattedNumber": f"555-{index % 10000:04d}"}],
+            }
+        },
+    }
+    return base, custom
+
+
+def _copy(source, target, keys):
+    key, rest = keys[0], keys[1:]
+    if not isinstance(source, dict) or key not in source:
+        return
+    value = source[key]
+    if not rest:
+        target[key] = value
+    elif isinstance(value, dict):
+        _copy(value, target.setdefault(key, {}), rest)
+    elif isinstance(value, list):
+        items = target.setdefault(key, [{} for _ in value])
+        for item, selected in zip(value, items):
+            _copy(item, selected, rest)
+
+
+def select(document: dict, paths: str) -> dict:
+    """Keep only the $select paths of a worker, e.g. "workers/person/legalName" """
+    if not paths:
+        return document
+    selected = {}
+    for path in paths.split(","):
+        keys = [key for key in path.strip().split("/") if key]
+        if keys and keys[0] == "workers":
+            keys = keys[1:]
+        if keys:
+            _copy(document, selected, keys)
+    return selected
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, behaviour: Behaviour, pki: Pki, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubHandler)
+        self.behaviour = behaviour
+        self.credentials = pki.adp_credentials()
+        self.tokens = set()
+        self.stats = Counter()
+        self._rng = random.Random(behaviour.seed)
+        self._lock = threading.Lock()
+        self._allowance = behaviour.max_rps
+        self._checked = time.monotonic()
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(pki.server_path)
+        context.load_verify_locations(pki.ca_path)
+        context.verify_mode = ssl.CERT_REQUIRED
+        # handshakes happen on the handler threads, not the accept loop
+        self.socket = context.wrap_socket(
+            self.socket, server_side=True, do_handshake_on_connect=False
+        )
+
+    @property
+    def url(self) -> str:
+        return f"https://localhost:{self.server_address[1]}"
+
+    def chance(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def delay(self) -> float:
+        median, sigma = self.behaviour.latency, self.behaviour.jitter
+        if median <= 0:
+            return 0.0
+        with self._lock:
+            return (
+                self._rng.lognormvariate(math.log(median), sigma) if sigma else median
+            )
+
+    def throttled(self) -> bool:
+        """Token bucket of max_rps requests per second"""
+        rate = self.behaviour.max_rps
+        if not rate:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(rate, self._allowance + (now - self._checked) * rate)
+            self._checked = now
+            if self._allowance < 1:
+                return True
+            self._allowance -= 1
+            return False
+
+    def count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def finish_request(self, request, client_address):
+        if self.chance(self.behaviour.ssl_error_rate):
+            self.count("ssl_error")
+            request.close()
+            return
+        try:
+            request.do_handshake()
+        except (ssl.SSLError, OSError):
+            self.count("handshake_failed")
+            return
+        super().finish_request(request, client_address)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, document=None, headers=None):
+        body = b"" if document is None else json.dumps(document).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(status)
+
+    def do_POST(self):
+        form = parse_qs(self._body().decode())
+        expected = self.server.credentials
+        if urlsplit(self.path).path != auth_path:
+            return self._send(404, {"error": "not found"})
+        if form.get("client_id") != [expected["client_id"]] or form.get(
+            "client_secret"
+        ) != [expected["client_secret"]]:
+            return self._send(401, {"error": "invalid_client"})
+        token = str(uuid.uuid4())
+        self.server.tokens.add(token)
+        self._send(
+            200, {"access_token": token, "token_type": "Bearer", "expires_in": 3600}
+        )
+
+    def do_GET(self):
+        self._body()
+        server, behaviour = self.server, self.server.behaviour
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        bearer = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        if bearer not in server.tokens:
+            return self._send(401, {"error": "invalid_token"})
+        if server.throttled():
+            return self._send(
+                429, {"error": "throttled"}, {"Retry-After": str(behaviour.retry_after)}
+            )
+        time.sleep(server.delay())
+
+        if url.path == workers_path:
+            skip, top = int(query.get("$skip", 0)), int(query.get("$top", 100))
+            indexes = range(skip, min(skip + top, behaviour.headcount))
+            if not indexes:
+                return self._send(204)
+            document = {
+                "workers": [
+                    select(behaviour.workers(index)[0], query.get("$select"))
+                    for index in indexes
+                ]
+            }
+            if query.get("$count") == "true":
+                document["meta"] = {"totalNumber": behaviour.headcount}
+        elif url.path.startswith(f"{workers_path}/"):
+            oid = url.path.rsplit("/", 1)[1]
+            index = int(oid[1:]) if oid[1:].isdigit() else -1
+            if not 0 <= index < behaviour.headcount:
+                return self._send(404, {"error": "unknown worker"})
+            document = {
+                "workers": [select(behaviour.workers(index)[1], query.get("$select"))]
+            }
+        else:
+            return self._send(404, {"error": "not found"})
+
+        if server.chance(behaviour.empty_rate):
+            server.count("empty")
+            return self._send(200)
+        headers = {}
+        if behaviour.etags:
+            digest = hashlib.sha1(json.dumps(document, sort_keys=True).encode())
+            etag = f'"{digest.hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers={"ETag": etag})
+            headers["ETag"] = etag
+        self._send(200, document, headers)
+
+
+@contextmanager
+def serve(behaviour=None):
+    """Run a stub on a free port in a background thread
+
+    Yields:
+        StubServer: running server, with its Pki as server.pki
+    """
+    with tempfile.TemporaryDirectory() as path:
+        pki = Pki(path)
+        server = StubServer(behaviour or Behaviour(), pki)
+        server.pki = pki
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def point_app_at(server: StubServer):
+    """Send the app's ADP requests to server and trust its CA
+
+    Replaces the Config endpoints in every loaded module that imported them, call it
+    after importing the activities.
+    """
+    from SharedCode import Config
+    from SharedCode.Tuples import Endpoints
+
+    stub = Endpoints(f"{server.url}{auth_path}", f"{server.url}{workers_path}")
+    current = Config.endpoints
+    for module in list(sys.modules.values()):
+        if getattr(module, "endpoints", None) is current:
+            module.endpoints = stub
+    os.environ["REQUESTS_CA_BUNDLE"] = server.pki.ca_path
+    os.environ["SSL_CERT_FILE"] = server.pki.ca_path
+
+
+def synthetic(seed=0):
+    """Behaviour.workers serving WorkerGenerator documents shaped by Config"""
+    from SharedCode.Config import columns, custom_columns
+    from synthetic_workers import WorkerGenerator
+
+    return WorkerGenerator(columns, custom_columns, seed=seed).worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--headcount", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--empty-rate", type=float, default=0.0)
+    parser.add_argument("--ssl-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=float, default=None)
+    parser.add_argument("--etags", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--synthetic", action="store_true", help="serve synthetic_workers"
+    )
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--directory", default=".", help="where the PEM files go")
+    args = parser.parse_args()
+
+    behaviour = Behaviour(
+        headcount=args.headcount,
+        latency=args.latency,
+        jitter=args.jitter,
+        empty_rate=args.empty_rate,
+        ssl_error_rate=args.ssl_error_rate,
+        max_rps=args.max_rps,
+        etags=args.etags,
+        seed=args.seed,
+        workers=synthetic(args.seed) if args.synthetic else None,
+    )
+    pki = Pki(args.directory)
+    server = StubServer(behaviour, pki, port=args.port)
+    print(f"ADP stub on {server.url}, CA in {pki.ca_path}")
+    print(json.dumps({"adp_credentials": pki.adp_credentials()}))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""Throughput of the ADP fetch activities against the local stand-in server
+
+    python benchmarks/bench_adp_fetch.py --headcount 2000 --latency 0.02 --jitter 0.5
+    python benchmarks/bench_adp_fetch.py --save before.json
+    python benchmarks/bench_adp_fetch.py --baseline before.json
+
+Runs ADPOpenConnection, GetWorkerAttributes (every page), GetCustomAttributes (one
+worker at a time), GetCustomAttributesBatch and CheckNoneWorkers against
+benchmarks/adp_stub.py over mTLS. For each stage it reports HTTP attempts per second,
+p50/p95/p99 latency of the attempts as the client saw them and wall time. The stub
+injects faults from --seed, so runs with the same arguments are comparable;
+--baseline prints the change against a saved run.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import adp_stub  # noqa: E402
+
+import ADPOpenConnection  # noqa: E402
+import CheckNoneWorkers  # noqa: E402
+import GetCustomAttributes  # noqa: E402
+import GetCustomAttributesBatch  # noqa: E402
+import GetWorkerAttributes  # noqa: E402
+from SharedCode import AsyncFetch, Metrics, Patch, Settings  # noqa: E402
+from SharedCode.Token import tokens  # noqa: E402
+
+
+class Attempts:
+    """Collects every HTTP attempt the app records in SharedCode.Metrics"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+
+    def __call__(self, method, url, status, seconds, bytes_in=0, bytes_out=0):
+        self.latencies.append(seconds)
+        self.statuses[status] += 1
+        Metrics.record_request(method, url, status, seconds, bytes_in, bytes_out)
+
+    def reset(self):
+        self.latencies, self.statuses = [], Counter()
+
+
+def percentiles(values: list) -> dict:
+    if len(values) < 2:
+        value = values[0] if values else None
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def run_stage(name, attempts, server, func):
+    attempts.reset()
+    server.stats.clear()
+    started = time.perf_counter()
+    func()
+    wall = time.perf_counter() - started
+    return {
+        "stage": name,
+        "requests": len(attempts.latencies),
+        "rps": len(attempts.latencies) / wall if wall else None,
+        **percentiles(attempts.latencies),
+        "wall": wall,
+        "statuses": {str(key): value for key, value in attempts.statuses.items()},
+        "injected": {
+            str(key): value
+            for key, value in server.stats.items()
+            if key in ("empty", "ssl_error", 429)
+        },
+    }
+
+
+def benchmark(behaviour, sample, batch_size, top, token_calls) -> list:
+    attempts = Attempts()
+    Patch.record_request = AsyncFetch.record_request = attempts
+    # every run starts cold and talks to the stub
+    Settings.http_cache_path = ""
+
+    with adp_stub.serve(behaviour) as server:
+        adp_stub.point_app_at(server)
+        parameters = {
+            "adp_credentials": server.pki.adp_credentials(),
+            "edw_credentials": {"host": "adp-stub"},
+            "query": {"skip": 0, "top": top, "count": True},
+        }
+        state = {}
+
+        def open_connection():
+            for _ in range(token_calls):
+                tokens._tokens.clear()
+                state["token"] = ADPOpenConnection.main(parameters)
+
+        def worker_pages():
+            aoids, skip = [], 0
+            while True:
+                query = {**parameters["query"], "skip": skip}
+                page = GetWorkerAttributes.main(
+                    ({**parameters, "query": query}, state["token"])
+                )
+                if page["status"] == 204 or not page["workers"]:
+                    break
+                aoids += [worker["associateOID"] for worker in page["workers"]]
+                skip += top
+            state["aoids"] = aoids
+
+        def custom_single():
+            for aoid in state["aoids"][:sample]:
+                GetCustomAttributes.main((parameters, state["token"], aoid))
+
+        def custom_batches():
+            aoids = state["aoids"]
+            for start in range(0, len(aoids), batch_size):
+                GetCustomAttributesBatch.main(
+                    (parameters, state["token"], aoids[start : start + batch_size])
+                )
+
+        def check_none():
+            workers = [(aoid, None) for aoid in state["aoids"][:sample]]
+            CheckNoneWorkers.main((parameters, state["token"], workers))
+
+        return [
+            run_stage("ADPOpenConnection", attempts, server, open_connection),
+            run_stage("GetWorkerAttributes", attempts, server, worker_pages),
+            run_stage("GetCustomAttributes", attempts, server, custom_single),
+            run_stage("GetCustomAttributesBatch", attempts, server, custom_batches),
+            run_stage("CheckNoneWorkers", attempts, server, check_none),
+        ]
+
+
+def _ms(value):
+    return "-" if value is None else f"{value * 1000:.1f}"
+
+
+def report(results: list, baseline=None):
+    previous = {row["stage"]: row for row in (baseline or {}).get("results", [])}
+    print(
+        f"{'stage':<26}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'wall s':>9}  injected"
+    )
+    for row in results:
+        line = (
+            f"{row['stage']:<26}{row['requests']:>9}{row['rps'] or 0:>9.1f}"
+            f"{_ms(row['p50']):>9}{_ms(row['p95']):>9}{_ms(row['p99']):>9}"
+            f"{row['wall']:>9.2f}  {row['injected'] or ''}"
+        )
+        before = previous.get(row["stage"])
+        if before and before["wall"] and row["wall"]:
+            change = (row["wall"] - before["wall"]) / before["wall"] * 100
+            line += f"  wall {change:+.0f}% vs baseline"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--headcount", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.5)
+    parser.add_argument("--empty-rate", type=float, default=0.02)
+    parser.add_argument("--ssl-error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=float, default=None)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--synthetic", action="store_true", help="serve synthetic_workers"
+    )
+    parser.add_argument(
+        "--sample", type=int, default=100, help="workers fetched one at a time"
+    )
+    parser.add_argument("--batch-size", type=int, default=Settings.custom_batch_size)
+    parser.add_argument("--top", type=int, default=200)
+    parser.add_argument("--token-calls", type=int, default=5)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON file from --save")
+    args = parser.parse_args()
+
+    behaviour = adp_stub.Behaviour(
+        headcount=args.headcount,
+        latency=args.latency,
+        jitter=args.jitter,
+        empty_rate=args.empty_rate,
+        ssl_error_rate=args.ssl_error_rate,
+        max_rps=args.max_rps,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        workers=adp_stub.synthetic(args.seed) if args.synthetic else None,
+    )
+    config = {
+        **behaviour.describe(),
+        "synthetic": args.synthetic,
+        "sample": args.sample,
+        "batch_size": args.batch_size,
+        "top": args.top,
+        "token_calls": args.token_calls,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as saved:
+            baseline = json.load(saved)
+        if baseline.get("config") != config:
+            print("warning: baseline was run with different arguments")
+
+    print(json.dumps(config))
+    results = benchmark(
+        behaviour, args.sample, args.batch_size, args.top, args.token_calls
+    )
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as saved:
+            json.dump({"config": config, "results": results}, saved, indent=2)
+
+
+if __name__ == "__main__":
+    main()
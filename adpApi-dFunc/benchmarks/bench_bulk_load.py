@@ -0,0 +1,70 @@
+"""Rows/sec of each BulkLoad strategy against a file backed SQLite database
+
+    python benchmarks/bench_bulk_load.py --rows 50000 --columns 40
+
+Point --url at a SQL Server (mssql+pyodbc://...) to compare against the EDW, the table
+is created in the default schema and dropped afterwards.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from SharedCode.BulkLoad import get_writer, writers  # noqa: E402
+
+
+def make_frame(rows: int, columns: int) -> pd.DataFrame:
+    data = {"associate_oid": [f"G{n:08d}" for n in range(rows)]}
+    for column in range(columns - 1):
+        data[f"attribute_{column}"] = [
+            None if n % 7 == column % 7 else f"value {n} {column}" for n in range(rows)
+        ]
+    return pd.DataFrame(data)
+
+
+def run(url: str, df: pd.DataFrame, strategy: str, table="bench_stg_hr_workers"):
+    engine = create_engine(url)
+    writer = get_writer(strategy)
+    with engine.begin() as connection:
+        if not writer.supports(connection):
+            return None
+        df.head(0).to_sql(table, connection, index=False, if_exists="replace")
+    try:
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            writer.write(connection, df, table)
+        return time.perf_counter() - start
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text(f"DROP TABLE {table}"))
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--url", default=None)
+    args = parser.parse_args()
+
+    df = make_frame(args.rows, args.columns)
+    with tempfile.TemporaryDirectory() as directory:
+        url = args.url or f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        print(f"{args.rows} rows x {args.columns} columns -> {url.split(':')[0]}")
+        for strategy in writers:
+            elapsed = run(url, df, strategy)
+            if elapsed is None:
+                print(f"{strategy:>12}: not supported")
+            else:
+                print(f"{strategy:>12}: {args.rows / elapsed:>10,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""CPU time and peak memory of the format, merge and load stages as headcount grows
+
+    python benchmarks/bench_stages.py --scales 10000 50000 100000
+    python benchmarks/bench_stages.py --scales 10000 --save before.json
+    python benchmarks/bench_stages.py --scales 10000 --baseline before.json
+
+Feeds synthetic workers (benchmarks/synthetic_workers.py, shaped by Config.columns and
+Config.custom_columns) through WorkerFormat, CustomFormat, MergeWorkers and the
+DataFrame prep of LoadEDW, each stage taking the previous one's output as the
+orchestration passes it. Activities run as deployed, log_execution included.
+
+Every stage runs twice: once for CPU (process_time) and wall time, once under
+tracemalloc for the peak memory it allocates above its input. "growth" is CPU per
+worker relative to the smallest scale, 1.0 means the stage scales linearly.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from synthetic_workers import WorkerGenerator  # noqa: E402
+
+import CustomFormat  # noqa: E402
+import LoadEDW  # noqa: E402
+import MergeWorkers  # noqa: E402
+import WorkerFormat  # noqa: E402
+from SharedCode.Config import columns, custom_columns  # noqa: E402
+
+
+def measure(func, *args, memory=True):
+    """Run func twice, timed and then traced
+
+    Returns:
+        tuple: (result, {cpu, wall, peak_bytes})
+    """
+    gc.collect()
+    cpu, wall = time.process_time(), time.perf_counter()
+    result = func(*args)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            func(*args)
+            peak = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+    return result, {"cpu": cpu, "wall": wall, "peak_bytes": peak}
+
+
+def run_scale(generator, count, memory=True) -> list:
+    workers = generator.workers(count)
+    custom_workers = generator.custom_workers(count)
+
+    base, base_stats = measure(WorkerFormat.main, workers, memory=memory)
+    del workers
+    custom, custom_stats = measure(
+        CustomFormat.main, ({}, custom_workers), memory=memory
+    )
+    del custom_workers
+    merged, merge_stats = measure(MergeWorkers.main, (base, custom), memory=memory)
+    del base, custom
+    frame, load_stats = measure(
+        LoadEDW.prepare_workers, merged["workers"], memory=memory
+    )
+    if len(frame) != count:
+        raise RuntimeError(f"{len(frame)} workers left of {count}")
+
+    stages = [
+        ("WorkerFormat", base_stats),
+        ("CustomFormat", custom_stats),
+        ("MergeWorkers", merge_stats),
+        ("LoadEDW prep", load_stats),
+    ]
+    return [{"scale": count, "stage": stage, **stats} for stage, stats in stages]
+
+
+def report(results: list, baseline=None):
+    smallest = {}
+    for row in results:
+        smallest.setdefault(row["stage"], row)
+    previous = {
+        (row["scale"], row["stage"]): row for row in (baseline or {}).get("results", [])
+    }
+    print(
+        f"{'workers':>8}  {'stage':<14}{'cpu s':>8}{'us/worker':>11}{'growth':>8}"
+        f"{'wall s':>8}{'peak MB':>9}{'B/worker':>10}"
+    )
+    for row in results:
+        per_worker = row["cpu"] / row["scale"]
+        first = smallest[row["stage"]]
+        growth = per_worker / (first["cpu"] / first["scale"]) if first["cpu"] else 0
+        peak = row["peak_bytes"]
+        line = (
+            f"{row['scale']:>8}  {row['stage']:<14}{row['cpu']:>8.2f}"
+            f"{per_worker * 1e6:>11.1f}{growth:>8.2f}{row['wall']:>8.2f}"
+            + (
+                f"{peak / 2**20:>9.1f}{peak / row['scale']:>10.0f}"
+                if peak
+                else f"{'-':>9}{'-':>10}"
+            )
+        )
+        before = previous.get((row["scale"], row["stage"]))
+        if before and before["cpu"]:
+            line += f"  cpu {(row['cpu'] - before['cpu']) / before['cpu'] * 100:+.0f}%"
+            if peak and before.get("peak_bytes"):
+                change = (peak - before["peak_bytes"]) / before["peak_bytes"] * 100
+                line += f" peak {change:+.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--extra-fields", type=int, default=8)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc run"
+    )
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON file from --save")
+    args = parser.parse_args()
+
+    generator = WorkerGenerator(
+        columns, custom_columns, seed=args.seed, extra_fields=args.extra_fields
+    )
+    config = {**generator.describe(), "memory": not args.no_memory}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as saved:
+            baseline = json.load(saved)
+        if baseline.get("config") != config:
+            print("warning: baseline was run with different arguments")
+
+    print(json.dumps(config))
+    # pandas and sqlalchemy are imported lazily, keep that out of the first stage
+    run_scale(generator, 100, memory=False)
+    results = []
+    for count in sorted(args.scales):
+        results += run_scale(generator, count, memory=not args.no_memory)
+    report(results, baseline)
+    if args.save:
+        with open(args.save, "w") as saved:
+            json.dump({"config": config, "results": results}, saved, indent=2)
+
+
+if __name__ == "__main__":
+    main()
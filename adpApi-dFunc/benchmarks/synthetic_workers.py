@@ -0,0 +1,191 @@
+"""Synthetic ADP worker and custom attribute documents shaped by Config
+
+    generator = WorkerGenerator(columns, custom_columns, seed=0)
+    base, custom = generator.worker(42)
+    workers = generator.workers(10000)
+    custom_workers = generator.custom_workers(10000)
+
+Documents are built from the flatten_json paths of a column mapping: "_" separated
+tokens become nested keys and numeric tokens become arrays, so every mapped column,
+"remove" columns included, can be found by SharedCode.Flatten. On top of that, the
+generator adds what the real API returns and the mapping never reads:
+- arrays hold several entries, only the first is mapped
+- whole sections are missing, or are empty arrays
+- mapped attributes are None
+- unmapped fields pad every document to a realistic size
+custom_workers() also returns some [aoid, None] pairs, the shape CheckNoneWorkers
+hands on for workers whose custom attributes could not be fetched.
+
+A worker depends only on the seed and its index, so the same arguments always give
+the same documents, whatever the headcount.
+"""
+import random
+
+from datetime import date, timedelta
+
+_epoch = date(1960, 1, 1)
+
+
+def aoid(index: int) -> str:
+    return f"G{index:015d}"
+
+
+def _tokens(mapping: dict) -> list:
+    """[(tokens, column)] of a column mapping, paths split on "_" """
+    return [(tuple(path.split("_")), column) for path, column in mapping.items()]
+
+
+class WorkerGenerator:
+    """Realistic, reproducible workers for the format, merge and load stages
+
+    Args:
+        columns (dict): base column mapping, Config.columns
+        custom_columns (dict): custom attribute column mapping, Config.custom_columns
+        seed (int): seed of every random choice
+        id_column (str): column holding the associate oid
+        missing_rate (float): share of sections left out of a document
+        empty_rate (float): share of array sections sent as []
+        none_rate (float): share of mapped attributes set to None
+        none_custom_rate (float): share of workers without custom attributes
+        max_items (int): most entries in an array section
+        extra_fields (int): unmapped fields added to each document
+    """
+
+    def __init__(
+        self,
+        columns: dict,
+        custom_columns: dict,
+        seed=0,
+        id_column="associate_oid",
+        missing_rate=0.05,
+        empty_rate=0.02,
+        none_rate=0.05,
+        none_custom_rate=0.01,
+        max_items=3,
+        extra_fields=8,
+    ):
+        self.base_paths = _tokens(columns)
+        self.custom_paths = _tokens(custom_columns)
+        self.seed = seed
+        self.id_column = id_column
+        self.missing_rate = missing_rate
+        self.empty_rate = empty_rate
+        self.none_rate = none_rate
+        self.none_custom_rate = none_custom_rate
+        self.max_items = max_items
+        self.extra_fields = extra_fields
+
+    def describe(self) -> dict:
+        return {
+            key: value
+            for key, value in vars(self).items()
+            if key not in ("base_paths", "custom_paths")
+        }
+
+    def _rng(self, index: int, salt: int) -> random.Random:
+        return random.Random(self.seed * 1_000_003 + index * 4 + salt)
+
+    def _value(self, rng, index, tokens, column, item):
+        if column == self.id_column:
+            return aoid(index)
+        if rng.random() < self.none_rate:
+            return None
+        name = tokens[-1].lower()
+        if "date" in name:
+            return (_epoch + timedelta(days=rng.randrange(25000))).isoformat()
+        if "code" in name:
+            return rng.choice(("A", "I", "L", "T", "Work", "Personal"))
+        return f"{tokens[-1]}-{index}-{item}-{rng.randrange(10**6)}"
+
+    def _document(self, index: int, paths: list, rng: random.Random) -> dict:
+        document = {}
+        keep = {tokens[0] for tokens, column in paths if column == self.id_column}
+        sections = dict.fromkeys(
+            tokens[0] for tokens, _ in paths if tokens[0] not in keep
+        )
+        missing = {section for section in sections if rng.random() < self.missing_rate}
+        lengths = {}
+        for tokens, column in paths:
+            if tokens[0] in missing:
+                continue
+            self._place(document, tokens, column, index, rng, lengths)
+        self._pad(document, index, rng)
+        return document
+
+    def _place(self, node, tokens, column, index, rng, lengths, prefix=(), item=0):
+        """Set tokens under node, repeating the leaf in every entry of each array"""
+        key, rest = tokens[0], tokens[1:]
+        if not rest:
+            node[key] = self._value(rng, index, prefix + tokens, column, item)
+            return
+        if rest[0].isdigit():
+            # an array: mapped position rest[0], plus extra entries the mapping skips
+            array_path = prefix + (key,)
+            if array_path not in lengths:
+                empty = rng.random() < self.empty_rate
+                lengths[array_path] = 0 if empty else rng.randint(1, self.max_items)
+            length = (
+                max(lengths[array_path], int(rest[0]) + 1) if lengths[array_path] else 0
+            )
+            items = node.setdefault(key, [])
+            items.extend({} for _ in range(length - len(items)))
+            for position, entry in enumerate(items):
+                if not rest[1:]:
+                    items[position] = self._value(rng, index, tokens, column, position)
+                elif isinstance(entry, dict):
+                    self._place(
+                        entry,
+                        rest[1:],
+                        column,
+                        index,
+                        rng,
+                        lengths,
+                        array_path + ("0",),
+                        position,
+                    )
+            return
+        child = node.setdefault(key, {})
+        if isinstance(child, dict):
+            self._place(child, rest, column, index, rng, lengths, prefix + (key,), item)
+
+    def _pad(self, document: dict, index: int, rng: random.Random):
+        extra = document.setdefault("customFieldGroup", {"stringFields": []})
+        for field in range(self.extra_fields):
+            extra["stringFields"].append(
+                {
+                    "nameCode": {
+                        "codeValue": f"field{field}",
+                        "shortName": f"Field {field}",
+                    },
+                    "stringValue": None
+                    if rng.random() < self.none_rate
+                    else f"v{index}-{field}",
+                    "itemID": f"{index}-{field}",
+                }
+            )
+
+    def base(self, index: int) -> dict:
+        return self._document(index, self.base_paths, self._rng(index, 0))
+
+    def custom(self, index: int) -> dict:
+        custom = self._document(index, self.custom_paths, self._rng(index, 1))
+        custom["associateOID"] = aoid(index)
+        return custom
+
+    def worker(self, index: int) -> tuple:
+        """(base document, custom document) of a worker, as adp_stub.Behaviour wants"""
+        return self.base(index), self.custom(index)
+
+    def workers(self, count: int, start=0) -> list:
+        """Base documents, as GetWorkerAttributes pages hand them to WorkerFormat"""
+        return [self.base(index) for index in range(start, start + count)]
+
+    def custom_workers(self, count: int, start=0) -> list:
+        """[[aoid, [custom document] or None]], as CheckNoneWorkers returns them"""
+        pairs = []
+        for index in range(start, start + count):
+            if self._rng(index, 2).random() < self.none_custom_rate:
+                pairs.append([aoid(index), None])
+            else:
+                pairs.append([aoid(index), [self.custom(index)]])
+        return pairs
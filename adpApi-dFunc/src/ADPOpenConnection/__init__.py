@@ -1,18 +1,18 @@
-import json
-import logging
 import traceback
 
-from SharedCode.Config import endpoints
+from SharedCode.Credentials import resolve_credentials
 from SharedCode.Decorate import log_execution
-from SharedCode.KVAid import make_certificate, make_key
 from SharedCode.LogIt import logger
-from SharedCode.Patch import post_request, teams_notification
+from SharedCode.Patch import teams_notification
+from SharedCode.Token import tokens
 
 
 @log_execution(func_name="ADPOpenConnection")
 def main(ADPOpenConnection: dict) -> dict:
     """Open the connection to ADP Server and retrieve an Auth Token
 
+    A token this worker process already holds is reused until it is about to expire.
+
     Args:
         ADPOpenConnection (dict): {
         adp_credentials -> from parameters
@@ -20,32 +20,13 @@ def main(ADPOpenConnection: dict) -> dict:
         query -> from parameters}
 
     Returns:
-        token: auth token
+        token: {bearer_token, status, expires_in, expires_at}
     """
+    ADPOpenConnection = resolve_credentials(ADPOpenConnection)
     adp_credentials = ADPOpenConnection["adp_credentials"]
 
-    cert = make_certificate(adp_credentials["certificate"])
-    key = make_key(adp_credentials["private_key"])
-
-    form_data = {
-        "grant_type": "client_credentials",
-        "client_id": adp_credentials["client_id"],
-        "client_secret": adp_credentials["client_secret"],
-    }
-    headers = {"user-agent": "cd-adpApi-func-python/1.0.0"}
-
     try:
-        r = post_request(
-            url=endpoints.auth_url,
-            headers=headers,
-            cert=(cert, key),
-            data=form_data,
-            module_name=__name__,
-        )
-        return {
-            "bearer_token": json.loads(r.content)["access_token"],
-            "status": r.status_code,
-        }
+        return tokens.get(adp_credentials)
     except Exception as er:
         properties = {"custom_dimensions": {"app": "ADP"}}
         logger.exception(
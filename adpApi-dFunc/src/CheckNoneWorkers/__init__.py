@@ -1,70 +1,65 @@
-import json
-import requests
-import traceback
-
-from requests.adapters import Retry
-from requests.exceptions import SSLError
-
-from SharedCode.Config import endpoints, queries
-from SharedCode.KVAid import make_certificate, make_key
+from SharedCode.AsyncFetch import make_auth, open_client, repair_custom_attributes
+from SharedCode.Config import endpoints
+from SharedCode.Credentials import resolve_credentials
 from SharedCode.Decorate import log_execution
-from SharedCode.Patch import patch_requests, HTTPAdapter
+from SharedCode.Limiter import get_limiter, release_limiter
+from SharedCode.LogIt import logger
+from SharedCode.PayloadStore import iter_records, offload
+from SharedCode.Settings import (
+    limit_max,
+    max_in_flight,
+    repair_attempts,
+    repair_backoff,
+)
 
 
 @log_execution(func_name="CheckNoneWorkers")
-def main(CheckNoneWorkers: list) -> list:
+async def main(CheckNoneWorkers: list) -> dict:
     """Attempts to find any workers that have None for their attributes and attempt a recall to adp
 
+    Missing workers are re-fetched concurrently and retried with backoff, workers that
+    still come back empty are kept with None attributes and listed in dead_letter.
+
     Args:
         CheckNoneWorkers (list): (parameters, token, workers)
 
     Returns:
-        list: workers with attributes
+        dict: {workers: workers with attributes or its payload reference, dead_letter}
     """
-    parameters = CheckNoneWorkers[0]
+    parameters = resolve_credentials(CheckNoneWorkers[0])
     token = CheckNoneWorkers[1]
-    custom_workers = CheckNoneWorkers[2]
-    cert = make_certificate(parameters["adp_credentials"]["certificate"])
-    key = make_key(parameters["adp_credentials"]["private_key"])
-    select = queries.custom_select
-        
-    headers = {
-        "user-agent": "cd-adpapi-func-python",
-        "Authorization": f"Bearer {token['bearer_token']}",
-        "accept": "application/json",
-    }
-    form_data = {
-        "grath_type": "client_credentials",
-        "client_id": parameters["adp_credentials"]["client_id"],
-        "client_secret": parameters["adp_credentials"]["client_secret"],
-    }
-    params = {"$select": select}
-    
-    patch_requests(adapter=False)
-    session = requests.Session()
-    retry = Retry(connect=3, backoff_factor=0.5)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("https://", adapter)
-    
+    custom_workers = list(iter_records(CheckNoneWorkers[2]))
+    adp_credentials = parameters["adp_credentials"]
+
     none_type_workers = [
-        aoid for aoid, attribute in dict(custom_workers).items() if attribute is None
+        aoid for aoid, attribute in custom_workers if attribute is None
     ]
-    
-    for i, j in enumerate(custom_workers):
-        if j[0] in none_type_workers:
-            aoid = j[0]
-            url = f"{endpoints.select_url}/{aoid}"
-            r = session.get(
-                url=url, headers=headers, params=params, cert=(cert, key), data=form_data
-            )
-            try:
-                custom_worker = json.loads(r.content).get("workers")
-                custom_workers[i][1] = custom_worker
-            except json.JSONDecodeError as er:
-                r = session.get(
-                    url=url, headers=headers, params=params, cert=(cert, key), data=form_data
+    dead_letter = []
+    if none_type_workers:
+        limiter = get_limiter(endpoints.select_url, max_in_flight)
+        try:
+            async with open_client(adp_credentials) as session:
+                repaired, dead_letter = await repair_custom_attributes(
+                    session,
+                    limiter,
+                    make_auth(adp_credentials, token),
+                    none_type_workers,
+                    attempts=repair_attempts,
+                    backoff=repair_backoff,
+                    workers=limit_max,
                 )
-                custom_worker = json.loads(r.content).get("workers")
-                custom_workers[i][1] = list(custom_worker)
-            
-    return custom_workers
+        finally:
+            release_limiter(endpoints.select_url, limiter)
+        custom_workers = [
+            [aoid, repaired.get(aoid, attribute)] for aoid, attribute in custom_workers
+        ]
+
+    if dead_letter:
+        properties = {"custom_dimensions": {"app": "ADP"}}
+        logger.warning(
+            f"{len(dead_letter)} workers still have no attributes after "
+            f"{repair_attempts} attempts: {', '.join(dead_letter)}",
+            extra=properties,
+        )
+
+    return {"workers": offload(custom_workers), "dead_letter": dead_letter}
@@ -1,36 +1,41 @@
 import traceback
 
-import pandas as pd
-
-from flatten_json import flatten
-
 from SharedCode.Config import custom_columns
 from SharedCode.Decorate import log_execution
+from SharedCode.Flatten import Flattener
 from SharedCode.LogIt import logger
+from SharedCode.PayloadStore import iter_records, offload
 from SharedCode.Patch import teams_notification
+from SharedCode.Wire import encode_frame
+
+flattener = Flattener(custom_columns)
 
 
 @log_execution(func_name="CustomFormat")
 def main(CustomFormat: list) -> dict:
     """Format custom attributes in preperation for a merge with the base attributes
 
+    Workers CheckNoneWorkers could not repair are kept, with empty custom attributes.
+
     Args:
-        CustomFormat (list): workers
+        CustomFormat (list): parameters, result of CheckNoneWorkers (or workers and/or
+        payload references)
 
     Returns:
-        dict: {workers, status}
+        dict: {workers, status}, workers is a columnar frame or its reference
     """
     custom_workers = CustomFormat[1]
+    if isinstance(custom_workers, dict) and "dead_letter" in custom_workers:
+        custom_workers = custom_workers["workers"]
+    custom_workers = iter_records(custom_workers)
     try:
-        workers_data = [
-            {**flatten(attribute[0]), "aoid": aoid}
-            for aoid, attribute in dict(custom_workers).items()
-        ]
-        workers_df = pd.DataFrame(workers_data)
-        workers_df = workers_df.rename(columns=custom_columns)
-        columns_to_remove = workers_df.columns[workers_df.columns == "remove"]
-        workers_df.drop(columns=columns_to_remove, inplace=True)
-        workers_dict = workers_df.to_dict()
+        workers_df = flattener.frame(
+            [
+                {**(attribute[0] if attribute else {}), "aoid": aoid}
+                for aoid, attribute in dict(custom_workers).items()
+            ]
+        )
+        workers_frame = encode_frame(workers_df)
     except TypeError as er:
         properties = {"custom_dimensions": {"app": "ADP"}}
         logger.exception(
@@ -41,4 +46,5 @@ def main(CustomFormat: list) -> dict:
         )
         payload = {"status": 500, "worker_count": None, "message": str(er)}
         teams_notification(status=payload, params=CustomFormat[0])
-    return {"workers": workers_dict, "status": 200}
+        raise er
+    return {"workers": offload(workers_frame), "status": 200}
@@ -0,0 +1,15 @@
+from SharedCode.Decorate import log_execution
+from SharedCode.PayloadStore import delete_payloads
+
+
+@log_execution(func_name="DeletePayloads")
+def main(DeletePayloads: list) -> int:
+    """Delete the payloads an orchestration offloaded, once its load is done
+
+    Args:
+        DeletePayloads (list): payload references collected by the orchestration
+
+    Returns:
+        int: payloads deleted
+    """
+    return delete_payloads(DeletePayloads)
@@ -1,38 +1,77 @@
 import azure.durable_functions as df
 
+from SharedCode.PayloadStore import extend_records
+
+
+def page_parameters(parameters: dict, skip: int) -> dict:
+    """Copy of parameters that requests the page of workers starting at skip
+
+    Args:
+        parameters (dict): result of Parameters
+        skip (int): $skip of the page
+
+    Returns:
+        dict: parameters for a single GetWorkerAttributes call
+    """
+    return {**parameters, "query": {**parameters["query"], "skip": skip}}
+
 
 def orchestrator_function(context: df.DurableOrchestrationContext) -> dict:
     """Orchestration that handles gathering all base attributes of a worker
 
+    The first page asks ADP for the headcount; when it is returned every remaining
+    page is requested at once. Otherwise windows of query["pages"] pages are requested
+    in parallel per generation until a page comes back with a 204.
+
     Args:
         context (df.DurableOrchestrationContext): [parameters, token]
 
     Returns:
-        dict: workers
+        list: workers, with payload references in place of pages that were offloaded
     """
     payload = context.get_input()
     parameters = context.get_input()[0]
     token = context.get_input()[1]
+    query = parameters["query"]
 
     if "new" not in payload:
         workers = []
+        skips = [query["skip"]]
     else:
         workers = payload[2]
-        if payload[3] is not None:
-            workers.extend(payload[3])
-        parameters["query"]["skip"] += 200
+        extend_records(workers, payload[3])
+        skips = [query["skip"] + page * query["top"] for page in range(query["pages"])]
+
+    processed_workers = []
+    total = None
     while True:
-        processed_workers = yield context.call_activity(
-            "GetWorkerAttributes", (parameters, token)
-        )
-        if processed_workers["status"] == 204:
-            break
+        page_tasks = [
+            context.call_activity(
+                "GetWorkerAttributes", (page_parameters(parameters, skip), token)
+            )
+            for skip in skips
+        ]
+        # task_all keeps the order of the tasks, so pages are reassembled in order
+        pages = yield context.task_all(page_tasks)
+        for page in pages:
+            if page["status"] == 204:
+                workers.extend(processed_workers)
+                return workers
+            extend_records(processed_workers, page["workers"])
 
-        context.continue_as_new(
-            (parameters, token, workers, processed_workers["workers"], "new")
-        )
+        # only the first page of a run asks for the headcount
+        query["count"] = False
+        total = total or pages[0].get("total")
+        skip = skips[-1] + query["top"]
+        if total is None:
+            break
+        if skip >= total:
+            workers.extend(processed_workers)
+            return workers
+        skips = list(range(skip, total, query["top"]))
 
-    return workers
+    query["skip"] = skip
+    context.continue_as_new((parameters, token, workers, processed_workers, "new"))
 
 
 main = df.Orchestrator.create(orchestrator_function)
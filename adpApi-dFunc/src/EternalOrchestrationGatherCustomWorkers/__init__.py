@@ -1,9 +1,9 @@
 import azure.durable_functions as df
 import contextlib
 
-from datetime import datetime, timedelta
-
 from SharedCode.LogIt import logger
+from SharedCode.PayloadStore import extend_records, payload_len, payload_slice
+from SharedCode.Token import token_expiring
 
 
 def orchestrator_function(context: df.DurableOrchestrationContext) -> dict:
@@ -13,16 +13,15 @@ def orchestrator_function(context: df.DurableOrchestrationContext) -> dict:
         context (df.DurableOrchestrationContext): [parameters, token, workers]
 
     Returns:
-        dict: workers
+        list: [aoid, custom attributes], with payload references in place of
+        batches that were offloaded
     """
     payload = context.get_input()
 
     if "new" not in payload:
         workers = []
-        try:
-            aoids = list(payload[2]["workers"]["associate_oid"].values())
-        except ValueError as er:
-            aoids = []
+        # a list of aoids, or a reference to one when WorkerFormat offloaded it
+        aoids = payload[2].get("aoids") or []
     else:
         try:
             aoids = payload[2]
@@ -31,33 +30,35 @@ def orchestrator_function(context: df.DurableOrchestrationContext) -> dict:
         workers = payload[3]
         processed_worker = payload[4]
         with contextlib.suppress(Exception):
-            workers.extend(processed_worker)
+            extend_records(workers, processed_worker)
 
-    if aoids:
-        start = 0
-        skip = 100
+    if payload_len(aoids):
         parameters = payload[0]
         token = payload[1]
-
-        worker_tasks = [
-            context.call_activity("GetCustomAttributes", (parameters, token, aoid))
-            for aoid in aoids[start : start + skip]
+        batch_size = parameters["query"]["batch_size"]
+        skip = batch_size * parameters["query"]["batches"]
+
+        batch_tasks = [
+            context.call_activity(
+                "GetCustomAttributesBatch",
+                (parameters, token, payload_slice(aoids, start, start + batch_size)),
+            )
+            for start in range(0, min(skip, payload_len(aoids)), batch_size)
         ]
 
-        processed_worker = yield context.task_all(worker_tasks)
+        batches = yield context.task_all(batch_tasks)
+        processed_worker = []
+        for batch in batches:
+            extend_records(processed_worker, batch)
 
-        aoids = aoids[start + skip :]
+        aoids = payload_slice(aoids, skip, payload_len(aoids))
 
         # NOTE: Can get rid of logging after this has run in production with no issues
-        logger.func(f"Current Number of employees gather: {len(aoids)}")
+        logger.func(f"Current Number of employees gather: {payload_len(aoids)}")
 
-        now = datetime.now().strftime("%H:%M:%S")
-        token_time = datetime.strptime(
-            parameters["token_time"], "%H:%M:%S"
-        ) + timedelta(minutes=50)
-        if now > token_time.strftime("%H:%M:%S"):
+        # replay safe: compares against the orchestration clock, not the wall clock
+        if token_expiring(token, context.current_utc_datetime):
             token = yield context.call_activity("ADPOpenConnection", parameters)
-            parameters["token_time"] = now
 
         context.continue_as_new(
             (parameters, token, aoids, workers, processed_worker, "new")
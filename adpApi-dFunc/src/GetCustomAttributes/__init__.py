@@ -1,19 +1,18 @@
 import json
-import requests
 import traceback
 
-from requests.adapters import Retry
 from requests.exceptions import SSLError
 
 from SharedCode.Config import endpoints, queries
-from SharedCode.KVAid import make_certificate, make_key
+from SharedCode.Credentials import resolve_credentials
+from SharedCode.KVAid import load_credentials
 from SharedCode.LogIt import logger
-from SharedCode.Patch import (
-    get_request,
-    teams_notification,
-    HTTPAdapter,
-    patch_requests,
-)
+from SharedCode.Patch import get_request
+from SharedCode.Retry import RetryPolicy
+from SharedCode.Token import tokens
+
+# get_request already retries failures, this only covers empty bodies
+empty_body_policy = RetryPolicy(max_tries=3, retry_statuses=(), retry_exceptions=())
 
 
 def main(GetCustomAttributes: list) -> list:  # sourcery skip: extract-method
@@ -25,11 +24,15 @@ def main(GetCustomAttributes: list) -> list:  # sourcery skip: extract-method
     Returns:
         list: aoid and custom attributes
     """
-    parameters = GetCustomAttributes[0]
+    parameters = resolve_credentials(GetCustomAttributes[0])
     token = GetCustomAttributes[1]
     aoid = GetCustomAttributes[2]
-    cert = make_certificate(parameters["adp_credentials"]["certificate"])
-    key = make_key(parameters["adp_credentials"]["private_key"])
+    adp_credentials = parameters["adp_credentials"]
+    credentials = load_credentials(
+        adp_credentials["certificate"], adp_credentials["private_key"]
+    )
+    cert = credentials.x509
+    key = credentials.pkey
     select = queries.custom_select
 
     headers = {
@@ -39,58 +42,44 @@ def main(GetCustomAttributes: list) -> list:  # sourcery skip: extract-method
     }
     form_data = {
         "grant_type": "client_credentials",
-        "client_id": parameters["adp_credentials"]["client_id"],
-        "client_secret": parameters["adp_credentials"]["client_secret"],
+        "client_id": adp_credentials["client_id"],
+        "client_secret": adp_credentials["client_secret"],
     }
     params = {"$select": select}
 
-    patch_requests(adapter=False)
-    session = requests.Session()
-    retry = Retry(connect=3, backoff_factor=0.5)
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount("https://", adapter)
     url = f"{endpoints.select_url}/{aoid}"
 
-    # NOTE: This api call is sketchy, have to build in many retries
-    try:
-        r = session.get(
-            url=url, headers=headers, params=params, cert=(cert, key), data=form_data
+    def request(token):
+        headers["Authorization"] = f"Bearer {token['bearer_token']}"
+        return get_request(
+            url=url,
+            headers=headers,
+            params=params,
+            cert=(cert, key),
+            data=form_data,
+            module_name=__name__,
         )
-        # try and get payload if no content attempt to call again 2nd attemps
-        try:
-            custom_worker = json.loads(r.content).get("workers")
-            return(aoid, custom_worker)
-        # if no payload make a third attempt but error out if unseccesful
-        except json.JSONDecodeError as er:
-            try:
-                r = session.get(
-                    url=url, headers=headers, params=params, cert=(cert, key), data=form_data,
-                )
-                custom_worker = json.loads(r.content).get("workers")
-                return(aoid, custom_worker)
-            except json.JSONDecodeError as er:
-                r = session.get(
-                    url=url, headers=headers, params=params, cert=(cert, key), data=form_data
-                )
-    # if SSL error attempt to get results again
-    except SSLError as er:
-        r = session.get(
-            url=url, headers=headers, params=params, cert=(cert, key), data=form_data
+
+    # NOTE: This api call is sketchy, get_request retries connection and SSL errors
+    # and retryable statuses, the empty bodies ADP sometimes answers with are retried
+    # here. Workers still empty are picked up again by CheckNoneWorkers.
+    try:
+        r = empty_body_policy.call(
+            tokens.send,
+            request,
+            adp_credentials,
+            token,
+            retry_if=lambda response: not response.content,
+            module_name=__name__,
         )
+        custom_worker = json.loads(r.content).get("workers")
+    except (json.JSONDecodeError, SSLError) as er:
         properties = {"custom_dimensions": {"app": "ADP"}}
         logger.exception(
-            f"Error in {__name__}, retrying request. \n\n\
+            f"Error in {__name__}, no attributes returned for {aoid}. \n\n\
             ERROR: {str(er)}. \n\n\
             TRACEBACK: {traceback.format_exc()}",
             extra=properties
         )
-        # try to get content from the payload, if no content, try to request again
-        try:
-            custom_worker = json.loads(r.content).get("workers")
-            return(aoid, custom_worker)
-        except json.JSONDecodeError as er:
-            r = session.get(
-                url=url, headers=headers, params=params, cert=(cert, key), data=form_data
-            )
-            custom_worker = json.loads(r.content).get("workers")
-            return (aoid, custom_worker)
+        custom_worker = None
+    return (aoid, custom_worker)
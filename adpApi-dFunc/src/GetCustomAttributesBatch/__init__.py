@@ -0,0 +1,29 @@
+from SharedCode.AsyncFetch import fetch_custom_attributes
+from SharedCode.Credentials import resolve_credentials
+from SharedCode.Decorate import log_execution
+from SharedCode.PayloadStore import offload, resolve
+from SharedCode.Settings import max_in_flight
+
+
+@log_execution(func_name="GetCustomAttributesBatch")
+async def main(GetCustomAttributesBatch: list) -> list:
+    """Gathers the custom attributes of a batch of workers from the ADP API concurrently
+
+    Args:
+        GetCustomAttributesBatch (list): parameters, token, list of aoids or a view of
+        a payload reference
+
+    Returns:
+        list: [aoid, custom attributes] for every aoid in the batch, or its reference
+    """
+    parameters = resolve_credentials(GetCustomAttributesBatch[0])
+    token = GetCustomAttributesBatch[1]
+    aoids = resolve(GetCustomAttributesBatch[2])
+
+    custom_workers = await fetch_custom_attributes(
+        aoids,
+        parameters["adp_credentials"],
+        token,
+        max_in_flight=max_in_flight,
+    )
+    return offload(custom_workers)
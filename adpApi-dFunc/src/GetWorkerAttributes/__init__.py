@@ -6,9 +6,12 @@ from requests.exceptions import SSLError
 from urllib3.util.retry import Retry
 
 from SharedCode.Config import endpoints, queries
-from SharedCode.KVAid import make_certificate, make_key
+from SharedCode.Credentials import resolve_credentials
+from SharedCode.KVAid import load_credentials
 from SharedCode.LogIt import logger
 from SharedCode.Patch import get_request, teams_notification
+from SharedCode.PayloadStore import offload
+from SharedCode.Token import tokens
 
 
 def main(GetWorkerAttributes: list) -> dict:
@@ -18,13 +21,18 @@ def main(GetWorkerAttributes: list) -> dict:
         GetWorkerAttributes (list): (parameters, token)
 
     Returns:
-        dict: {status: , workers: }
+        dict: {status: , workers: workers or a payload reference,
+            total: headcount when query["count"] is set}
     """
-    adp_credentials = GetWorkerAttributes[0]["adp_credentials"]
-    query = GetWorkerAttributes[0]["query"]
+    parameters = resolve_credentials(GetWorkerAttributes[0])
+    adp_credentials = parameters["adp_credentials"]
+    query = parameters["query"]
     token = GetWorkerAttributes[1]
-    cert = make_certificate(adp_credentials["certificate"])
-    key = make_key(adp_credentials["private_key"])
+    credentials = load_credentials(
+        adp_credentials["certificate"], adp_credentials["private_key"]
+    )
+    cert = credentials.x509
+    key = credentials.pkey
     url = endpoints.select_url
 
     params = {
@@ -32,6 +40,8 @@ def main(GetWorkerAttributes: list) -> dict:
         "$skip": query["skip"],
         "$top": query["top"],
     }
+    if query.get("count"):
+        params["$count"] = "true"
     headers = {
         "user-agent": "cd-adpApi-func-python/1.0.0",
         "Authorization": f"Bearer {token['bearer_token']}",
@@ -43,8 +53,9 @@ def main(GetWorkerAttributes: list) -> dict:
         "client_secret": adp_credentials["client_secret"],
     }
 
-    try:
-        r = get_request(
+    def request(token):
+        headers["Authorization"] = f"Bearer {token['bearer_token']}"
+        return get_request(
             url=url,
             headers=headers,
             params=params,
@@ -53,11 +64,17 @@ def main(GetWorkerAttributes: list) -> dict:
             module_name=__name__,
         )
 
+    try:
+        r = tokens.send(request, adp_credentials, token)
+
         try:
-            workers = json.loads(r.content).get("workers")
+            content = json.loads(r.content)
+            workers = content.get("workers")
+            total = content.get("meta", {}).get("totalNumber")
             status_code = r.status_code
         except ValueError as er:
             workers = []
+            total = None
             status_code = r.status_code
 
     except SSLError as er:
@@ -72,4 +89,6 @@ def main(GetWorkerAttributes: list) -> dict:
         teams_notification(status=payload, params=GetWorkerAttributes[0])
         raise er
 
-    return {"workers": workers, "status": status_code}
+    if workers:
+        workers = offload(workers)
+    return {"workers": workers, "status": status_code, "total": total}
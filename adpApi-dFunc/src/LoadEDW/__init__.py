@@ -1,56 +1,136 @@
-import numpy as np
-import pandas as pd
-import traceback
+from __future__ import annotations
 
-from sqlalchemy import create_engine
-from sqlalchemy.engine import URL
-from sqlalchemy.orm import sessionmaker
+import traceback
 
+from SharedCode.BulkLoad import get_writer
+from SharedCode.Credentials import resolve_credentials
+from SharedCode.DeltaSync import sync_table
 from SharedCode.Decorate import log_execution
+from SharedCode.Engine import edw_engine
+from SharedCode.Lazy import lazy_import
 from SharedCode.LogIt import logger
+from SharedCode.Metrics import metrics
 from SharedCode.Patch import teams_notification
+from SharedCode.PayloadStore import resolve
+from SharedCode.Settings import db_max_overflow, db_pool_size
+from SharedCode.ShadowSwap import swap_load
+from SharedCode.Wire import decode_frame
+
+pd = lazy_import("pandas")
+
+
+def prepare_workers(workers) -> pd.DataFrame:
+    """Decode the merged workers frame and turn "NaN" strings into NULLs
+
+    Args:
+        workers: columnar frame from MergeWorkers, or its payload reference
+
+    Returns:
+        pd.DataFrame: workers ready to be written
+    """
+    workers_df = decode_frame(resolve(workers))
+    return workers_df.replace("NaN", None)
 
 
 @log_execution(func_name="LoadEDW")
 def main(LoadEDW: dict) -> dict:
     """Loads all workers into hr_stg_workers table in edw_stage
 
+    In "delta" load mode only new, changed and removed workers are written. In "swap"
+    mode every worker is written to a shadow copy of the table that then replaces it
+    (see SharedCode.ShadowSwap), "parallel" mode splits those writes between several
+    pooled connections. Otherwise every worker is appended to the table TruncateEDW
+    emptied. Rows are written with the configured bulk strategy (see
+    SharedCode.BulkLoad).
+
     Args:
         LoadEDW (dict): workers: {all workers}
 
     Returns:
-        dict: {status: , worker_count}
+        dict: {status: , worker_count}, plus partitions: [{partition, rows, seconds}]
+        in "swap" and "parallel" mode
     """
-    edw_credentials = LoadEDW[0]["edw_credentials"]
-    workers = LoadEDW[1]["workers"]
-    workers_df = pd.DataFrame(workers)
-    workers_df = workers_df.replace("NaN", None)
-
-    user = edw_credentials["user"]
-    password = edw_credentials["password"]
-    host = edw_credentials["host"]
-    db_name = edw_credentials["db_name"]
-    driver = edw_credentials["driver"]
+    parameters = resolve_credentials(LoadEDW[0])
+    edw_credentials = parameters["edw_credentials"]
+    load_mode = parameters["load"]["mode"]
+    writer = get_writer(parameters["load"].get("strategy", "to_sql"))
+    workers_df = prepare_workers(LoadEDW[1]["workers"])
 
-    connection_string = (
-        f"Driver={driver};Server={host};Database={db_name};Uid={user};Pwd={password}"
-    )
-    connection_url = URL.create(
-        "mssql+pyodbc", query={"odbc_connect": connection_string}
-    )
-
-    engine = create_engine(connection_url, fast_executemany=True, echo=False)
-    Session = sessionmaker(bind=engine)
+    engine = edw_engine(edw_credentials)
     try:
-        with Session.begin():
-            workers_df.to_sql(
-                con=engine,
+        if load_mode == "delta":
+            with metrics.timer(
+                "db.duration_seconds", activity="LoadEDW", operation="delta"
+            ), engine.begin() as connection:
+                counts = sync_table(
+                    connection,
+                    workers_df,
+                    schema="adp",
+                    table="stg_hr_workers",
+                    writer=writer,
+                )
+            for kind in ("inserted", "updated", "deleted"):
+                metrics.count(
+                    "db.rows", counts[kind], activity="LoadEDW", operation=kind
+                )
+            return {
+                "status": 200,
+                "worker_count": len(workers_df),
+                "message": "Workers synced: {inserted} inserted, {updated} updated, "
+                "{deleted} deleted, {unchanged} unchanged".format(**counts),
+            }
+        if load_mode in ("swap", "parallel"):
+            partitions = 1
+            if load_mode == "parallel":
+                partitions = min(
+                    parameters["load"].get("partitions", 1),
+                    db_pool_size + db_max_overflow,
+                )
+            result = swap_load(
+                engine,
+                workers_df,
                 schema="adp",
-                name="stg_hr_workers",
-                index=False,
-                if_exists="append",
-                chunksize=1000,
+                table="stg_hr_workers",
+                writer=writer,
+                partitions=partitions,
+            )
+            for operation in ("write", "index", "swap"):
+                metrics.observe(
+                    "db.duration_seconds",
+                    result[f"{operation}_seconds"],
+                    activity="LoadEDW",
+                    operation=operation,
+                )
+            for partition in result["partitions"]:
+                metrics.observe(
+                    "db.partition_seconds",
+                    partition["seconds"],
+                    activity="LoadEDW",
+                    partitions=len(result["partitions"]),
+                )
+                metrics.observe(
+                    "db.partition_rows",
+                    partition["rows"],
+                    activity="LoadEDW",
+                    partitions=len(result["partitions"]),
+                )
+            metrics.count(
+                "db.rows", result["inserted"], activity="LoadEDW", operation="inserted"
             )
+            return {
+                "status": 200,
+                "worker_count": len(workers_df),
+                "message": f"All workers uploaded in {len(result['partitions'])} "
+                "partitions and swapped in",
+                "partitions": result["partitions"],
+            }
+        with metrics.timer(
+            "db.duration_seconds", activity="LoadEDW", operation="insert"
+        ), engine.begin() as connection:
+            writer.write(connection, workers_df, schema="adp", table="stg_hr_workers")
+        metrics.count(
+            "db.rows", len(workers_df), activity="LoadEDW", operation="inserted"
+        )
         return {
             "status": 200,
             "worker_count": len(workers_df),
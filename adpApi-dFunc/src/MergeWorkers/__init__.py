@@ -1,4 +1,8 @@
-import pandas as pd
+from SharedCode.Lazy import lazy_import
+from SharedCode.PayloadStore import offload, resolve
+from SharedCode.Wire import decode_frame, encode_frame
+
+pd = lazy_import("pandas")
 
 
 def main(MergeWorkers: list) -> dict:
@@ -8,14 +12,14 @@ def main(MergeWorkers: list) -> dict:
         MergeWorkers (list): [workers, custom_workers]
 
     Returns:
-        dict: workers with all attributes
+        dict: workers with all attributes as a columnar frame, or its payload reference
     """
-    workers = pd.DataFrame(MergeWorkers[0]["workers"])
-    custom_workers = pd.DataFrame(MergeWorkers[1]["workers"])
+    workers = decode_frame(resolve(MergeWorkers[0]["workers"]))
+    custom_workers = decode_frame(resolve(MergeWorkers[1]["workers"]))
 
     workers_df = pd.merge(
         workers, custom_workers, on="associate_oid", suffixes=("", "_delme")
     )
     
 
-    return {"workers": workers_df.to_dict("records"), "status": 200}
+    return {"workers": offload(encode_frame(workers_df)), "status": 200}
@@ -1,38 +1,71 @@
 import azure.durable_functions as df
 
 from SharedCode.Patch import teams_notification
+from SharedCode.PayloadStore import payload_refs
+from SharedCode.Token import token_expiring
 
 
-def orchestrator_function(context: df.DurableOrchestrationContext):
-    """This orchestration will load all the base attributes of workers into the EDW as well as adding messages to a queue for a listener that will pick up and load the custom attributes."""
-
-    parameters = yield context.call_activity("Parameters")
-
-    token = yield context.call_activity("ADPOpenConnection", parameters)
-
+def load_workers(
+    context: df.DurableOrchestrationContext, parameters: dict, token: dict, refs: list
+):
+    """Gather, format and load the workers, collecting payload references into refs"""
     workers = yield context.call_sub_orchestrator(
         "EternalOrchestrationGatherBaseWorkers", (parameters, token)
     )
+    refs.extend(payload_refs(workers))
 
     workers = yield context.call_activity("WorkerFormat", workers)
+    refs.extend(payload_refs(workers))
 
     custom_workers = yield context.call_sub_orchestrator(
         "EternalOrchestrationGatherCustomWorkers", (parameters, token, workers)
     )
+    refs.extend(payload_refs(custom_workers))
 
-    token = yield context.call_activity("ADPOpenConnection", parameters)
+    if token_expiring(token, context.current_utc_datetime):
+        token = yield context.call_activity("ADPOpenConnection", parameters)
 
     custom_workers = yield context.call_activity(
         "CheckNoneWorkers", (parameters, token, custom_workers)
     )
+    refs.extend(payload_refs(custom_workers))
 
     custom_workers = yield context.call_activity("CustomFormat", (parameters, custom_workers))
+    refs.extend(payload_refs(custom_workers))
 
     workers = yield context.call_activity("MergeWorkers", (workers, custom_workers))
+    refs.extend(payload_refs(workers))
 
-    yield context.call_activity("TruncateEDW", parameters)
+    if parameters["load"]["mode"] == "truncate":
+        yield context.call_activity("TruncateEDW", parameters)
 
     payload = yield context.call_activity("LoadEDW", (parameters, workers))
+    return payload
+
+
+def orchestrator_function(context: df.DurableOrchestrationContext):
+    """This orchestration will load all the base attributes of workers into the EDW as well as adding messages to a queue for a listener that will pick up and load the custom attributes."""
+
+    parameters = yield context.call_activity("Parameters")
+
+    token = yield context.call_activity("ADPOpenConnection", parameters)
+
+    if parameters["load"]["mode"] == "stream":
+        payload = yield context.call_activity("StreamSyncWorkers", (parameters, token))
+        teams_notification(status=payload, params=parameters)
+        return
+
+    # offloaded payloads hold worker PII, they are deleted once the load is done
+    # whether it succeeded or not
+    refs = []
+    try:
+        payload = yield from load_workers(context, parameters, token, refs)
+    except Exception:
+        if refs:
+            yield context.call_activity("DeletePayloads", refs)
+        raise
+    if refs:
+        yield context.call_activity("DeletePayloads", refs)
 
     teams_notification(status=payload, params=parameters)
 
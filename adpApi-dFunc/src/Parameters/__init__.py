@@ -1,64 +1,72 @@
 import traceback
 
-from datetime import datetime
-
 from SharedCode.Config import kv_names
+from SharedCode.Credentials import public_edw_credentials, read_credentials
 from SharedCode.Decorate import log_execution
 from SharedCode.KVAid import KVHelper
 from SharedCode.LogIt import logger
 from SharedCode.Patch import teams_notification
+from SharedCode.Settings import (
+    base_pages,
+    bulk_strategy,
+    custom_batch_size,
+    custom_batches,
+    load_mode,
+    load_partitions,
+)
 
 
 @log_execution(func_name="Parameters")
 def main(Parameters: None) -> dict:
     """Sets the credentials/parameter values from the KeyVault for all subsequent calls in the application
+
+    Secrets are not returned. Activities swap the credentials handle for them with
+    SharedCode.Credentials.resolve_credentials.
+
     Returns:
         {
-            adp_credentials:
-                certificate,
-                private_key,
-                client_id,
-                client_secret,
-                user,
-                password
+            credentials:
+                vault,
+                versions
             edw_credentials:
-                user,
-                password,
                 port,
                 host,
                 db_name,
                 driver
             query:
                 skip,
-                top
+                top,
+                count,
+                pages,
+                batch_size,
+                batches
+            load:
+                mode,
+                strategy,
+                partitions
         }
     """
     try:
         kv_help = KVHelper(*kv_names)
-        datv_credentials = kv_help.get_datv_credentials()
-        adp_credentials = {
-            "certificate": kv_help.get_certficate(),
-            "private_key": kv_help.get_private_key(),
-            "client_id": kv_help.get_client_id(),
-            "client_secret": kv_help.get_client_secret(),
-        }
-        edw_credentials = {
-            "user": kv_help.get_srvc_user(),
-            "password": kv_help.get_srvc_pass(),
-            "port": datv_credentials["db_port"],
-            "host": datv_credentials["db_host"],
-            "db_name": datv_credentials["db_name"],
-            "driver": "ODBC Driver 17 for SQL Server",
-        }
+        kv_help.prefetch()
+        _, edw_credentials = read_credentials(kv_help)
         query = {
             "skip": 0,
             "top": 200,
+            "count": True,
+            "pages": base_pages,
+            "batch_size": custom_batch_size,
+            "batches": custom_batches,
         }
         return {
-            "adp_credentials": adp_credentials,
-            "edw_credentials": edw_credentials,
+            "credentials": kv_help.handle(),
+            "edw_credentials": public_edw_credentials(edw_credentials),
             "query": query,
-            "token_time": datetime.now().strftime("%H:%M:%S"),
+            "load": {
+                "mode": load_mode,
+                "strategy": bulk_strategy,
+                "partitions": load_partitions,
+            },
         }
     except Exception as er:
         properties = {"custom_dimensions": {"app": "ADP"}}
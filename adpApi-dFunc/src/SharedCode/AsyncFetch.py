@@ -0,0 +1,435 @@
+import asyncio
+import json
+import os
+import random
+import ssl
+import tempfile
+import threading
+import time
+import traceback
+
+import aiohttp
+from cryptography.hazmat.primitives import hashes, serialization
+
+from SharedCode.Config import endpoints, queries
+from SharedCode.HttpCache import get_cache
+from SharedCode.KVAid import load_credentials
+from SharedCode.Limiter import get_limiter, release_limiter
+from SharedCode.LogIt import logger
+from SharedCode.Metrics import record_request
+from SharedCode.Retry import CircuitOpenError, RetryPolicy
+from SharedCode.Settings import limit_max
+from SharedCode.Token import tokens
+from SharedCode.Tuples import HttpResponse
+
+# ssl contexts are not tied to an event loop, so one per certificate is kept for
+# the life of the worker process
+_ssl_contexts = {}
+_ssl_lock = threading.Lock()
+
+
+def make_ssl_context(cert, key) -> ssl.SSLContext:
+    """Build (or reuse) an SSLContext that presents the ADP client certificate
+
+    Args:
+        cert (object): cryptography certificate from KVAid.load_credentials
+        key (object): cryptography private key from KVAid.load_credentials
+
+    Returns:
+        ssl.SSLContext: context for mTLS against the ADP API
+    """
+    fingerprint = cert.fingerprint(hashes.SHA256()).hex()
+    with _ssl_lock:
+        if fingerprint in _ssl_contexts:
+            return _ssl_contexts[fingerprint]
+
+        # the ssl module can only load a cert chain from disk
+        cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+        key_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        )
+        fd, path = tempfile.mkstemp(suffix=".pem")
+        try:
+            with os.fdopen(fd, "wb") as pem:
+                pem.write(cert_pem + key_pem)
+            context = ssl.create_default_context()
+            context.load_cert_chain(path)
+        finally:
+            os.remove(path)
+
+        _ssl_contexts[fingerprint] = context
+        return context
+
+
+class PageFetchError(Exception):
+    """A page of workers could not be read, so the headcount is incomplete"""
+
+    def __init__(self, status, skip):
+        self.status = status
+        self.skip = skip
+
+    def __str__(self):
+        return (
+            f"Page at $skip={self.skip} failed with status {self.status} after retries"
+        )
+
+
+def _unreadable(response) -> bool:
+    # ADP sometimes answers 200 with an empty or truncated body
+    if response.status in (204, 304, 401):
+        return False
+    try:
+        json.loads(response.content)
+    except json.JSONDecodeError:
+        return True
+    return False
+
+
+async def _get(
+    session,
+    limiter,
+    url,
+    auth,
+    params,
+    data,
+    attempts,
+    headers=None,
+    cache=None,
+    raise_open=False,
+):
+    """GET a JSON document through a RetryPolicy, retrying retryable statuses,
+    connection errors and empty bodies
+
+    With a cache the request is made conditional on the stored ETag/Last-Modified
+    and a 304 is answered from the cache. With raise_open a CircuitOpenError is
+    raised instead of answered as (None, None), for callers that wait for the
+    circuit to close.
+
+    Returns:
+        tuple: (status, parsed body or None)
+    """
+    key = entry = None
+    if cache is not None:
+        key = cache.key(url, params)
+        entry = await asyncio.to_thread(cache.lookup, key)
+        if entry is not None and cache.fresh(entry):
+            cache.hit()
+            return (200, json.loads(entry.body))
+        if entry is not None:
+            headers = {**(headers or {}), **cache.validators(entry)}
+
+    policy = RetryPolicy(
+        max_tries=attempts,
+        retry_exceptions=(aiohttp.ClientError, asyncio.TimeoutError),
+    )
+
+    async def attempt(token):
+        request_headers = {
+            **(headers or {}),
+            "Authorization": f"Bearer {token['bearer_token']}",
+        }
+        async with limiter:
+            started = time.monotonic()
+            try:
+                async with session.get(
+                    url, headers=request_headers, params=params, data=data
+                ) as r:
+                    response = HttpResponse(r.status, r.headers, await r.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                limiter.record(None, time.monotonic() - started)
+                record_request("GET", url, "error", time.monotonic() - started)
+                raise
+            limiter.record(response.status, time.monotonic() - started)
+            record_request(
+                "GET",
+                url,
+                response.status,
+                time.monotonic() - started,
+                bytes_in=len(response.content),
+            )
+            return response
+
+    status = None
+    try:
+        token = auth["token"]
+        response = await policy.call_async(
+            attempt, token, endpoint=url, retry_if=_unreadable, module_name=__name__
+        )
+        # a rejected token is replaced once, every request shares the new one
+        if response.status == 401:
+            auth["token"] = await asyncio.to_thread(
+                tokens.refresh, auth["adp_credentials"], token
+            )
+            response = await policy.call_async(
+                attempt,
+                auth["token"],
+                endpoint=url,
+                retry_if=_unreadable,
+                module_name=__name__,
+            )
+        status = response.status
+        if status == 204:
+            return (status, None)
+        if status == 304 and entry is not None:
+            await asyncio.to_thread(cache.revalidated, key)
+            return (200, json.loads(entry.body))
+        content = json.loads(response.content)
+        if cache is not None and status == 200:
+            await asyncio.to_thread(
+                cache.store, key, response.headers, response.content
+            )
+        return (status, content)
+    except (
+        json.JSONDecodeError,
+        aiohttp.ClientError,
+        asyncio.TimeoutError,
+        CircuitOpenError,
+    ) as er:
+        if raise_open and isinstance(er, CircuitOpenError):
+            raise
+        properties = {"custom_dimensions": {"app": "ADP"}}
+        logger.warning(
+            f"No content returned for {url} after {attempts} attempts.\n\n\
+            ERROR: {str(er)}.\n\n\
+            TRACEBACK: {traceback.format_exc()}",
+            extra={**properties, "sampled": True},
+        )
+    return (status, None)
+
+
+def open_client(adp_credentials, max_connections=limit_max) -> aiohttp.ClientSession:
+    """Pooled aiohttp client presenting the ADP client certificate
+
+    Args:
+        adp_credentials (dict): adp_credentials from Parameters
+        max_connections (int, optional): connections kept open, the limiter decides
+        how many are used. Defaults to ADP_LIMIT_MAX.
+
+    Returns:
+        aiohttp.ClientSession: client, to be used as an async context manager
+    """
+    credentials = load_credentials(
+        adp_credentials["certificate"], adp_credentials["private_key"]
+    )
+    connector = aiohttp.TCPConnector(
+        ssl=make_ssl_context(credentials.certificate, credentials.private_key),
+        limit=max_connections,
+    )
+    headers = {
+        "user-agent": "cd-adpApi-func-python",
+        "accept": "application/json",
+    }
+    return aiohttp.ClientSession(connector=connector, headers=headers)
+
+
+def make_auth(adp_credentials, token) -> dict:
+    """Token state shared by every request of a client, replaced on a 401"""
+    return {
+        "adp_credentials": adp_credentials,
+        "token": tokens.bearer(adp_credentials, token),
+    }
+
+
+def _form_data(adp_credentials) -> dict:
+    return {
+        "grant_type": "client_credentials",
+        "client_id": adp_credentials["client_id"],
+        "client_secret": adp_credentials["client_secret"],
+    }
+
+
+async def gather_custom_attributes(
+    session, limiter, auth, aoids, attempts=3, cache=None, raise_open=False
+) -> list:
+    """Fetch the custom attributes of aoids concurrently on an open client
+
+    Args:
+        session (aiohttp.ClientSession): client from open_client
+        limiter (Limiter.AdaptiveLimiter): caps the requests in flight
+        auth (dict): token state from make_auth
+        aoids (list): associate oids to request
+        attempts (int, optional): tries per worker on an empty body. Defaults to 3.
+        cache (HttpCache.HttpCache, optional): conditional cache. Defaults to None.
+        raise_open (bool, optional): raise CircuitOpenError rather than return None
+        for a worker the open circuit kept from being requested. Defaults to False.
+
+    Returns:
+        list: [(aoid, custom attributes or None)] in the order of aoids
+    """
+    params = {"$select": queries.custom_select}
+    form_data = _form_data(auth["adp_credentials"])
+
+    async def get_worker(aoid):
+        _, content = await _get(
+            session,
+            limiter,
+            f"{endpoints.select_url}/{aoid}",
+            auth,
+            params,
+            form_data,
+            attempts,
+            cache=cache,
+            raise_open=raise_open,
+        )
+        return (aoid, content.get("workers") if content else None)
+
+    return await asyncio.gather(*(get_worker(aoid) for aoid in aoids))
+
+
+async def repair_custom_attributes(
+    session, limiter, auth, aoids, attempts=4, backoff=1.0, workers=16
+) -> tuple:
+    """Re-fetch workers whose custom attributes came back empty
+
+    A queue is drained by up to workers concurrent consumers. A worker that is
+    still empty goes back on the queue after an exponential, jittered backoff, so
+    the wait never holds a request slot. After attempts tries it is dead-lettered.
+    While the circuit of the API is open no request goes out, so the worker waits
+    out the circuit's retry_in without spending a try, up to attempts times.
+
+    Args:
+        session (aiohttp.ClientSession): client from open_client
+        limiter (Limiter.AdaptiveLimiter): caps the requests in flight
+        auth (dict): token state from make_auth
+        aoids (list): associate oids to repair
+        attempts (int, optional): tries per worker. Defaults to 4.
+        backoff (float, optional): seconds before the first retry. Defaults to 1.0.
+        workers (int, optional): concurrent consumers. Defaults to 16.
+
+    Returns:
+        tuple: ({aoid: custom attributes}, [dead-lettered aoids])
+    """
+    queue = asyncio.Queue()
+    repaired, dead_letter = {}, []
+    waiting = set()
+    circuit_waits = {}
+    for aoid in aoids:
+        queue.put_nowait((aoid, 1))
+
+    async def requeue(aoid, attempt, delay):
+        try:
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            queue.put_nowait((aoid, attempt))
+        finally:
+            # only now is the failed try done, so join() cannot return early
+            queue.task_done()
+
+    def later(aoid, attempt, delay):
+        task = asyncio.ensure_future(requeue(aoid, attempt, delay))
+        waiting.add(task)
+        task.add_done_callback(waiting.discard)
+
+    async def consume():
+        while True:
+            aoid, attempt = await queue.get()
+            try:
+                ((_, attributes),) = await gather_custom_attributes(
+                    session, limiter, auth, [aoid], attempts=1, raise_open=True
+                )
+            except CircuitOpenError as er:
+                circuit_waits[aoid] = circuit_waits.get(aoid, 0) + 1
+                if circuit_waits[aoid] <= attempts:
+                    later(aoid, attempt, max(er.retry_in, backoff))
+                    continue
+                attributes = None
+            except Exception:
+                attributes = None
+            if attributes is not None:
+                repaired[aoid] = attributes
+                queue.task_done()
+            elif attempt < attempts:
+                later(aoid, attempt + 1, backoff * 2 ** (attempt - 1))
+            else:
+                dead_letter.append(aoid)
+                queue.task_done()
+
+    consumers = [
+        asyncio.ensure_future(consume()) for _ in range(min(workers, len(aoids)))
+    ]
+    try:
+        await queue.join()
+    finally:
+        for task in consumers + list(waiting):
+            task.cancel()
+        await asyncio.gather(*consumers, *waiting, return_exceptions=True)
+    return repaired, dead_letter
+
+
+async def iter_worker_pages(session, limiter, auth, top=200, attempts=3):
+    """Page through the base attributes of every worker until ADP answers 204
+
+    Args:
+        session (aiohttp.ClientSession): client from open_client
+        limiter (Limiter.AdaptiveLimiter): caps the requests in flight
+        auth (dict): token state from make_auth
+        top (int, optional): workers per page. Defaults to 200.
+        attempts (int, optional): tries per page on an empty body. Defaults to 3.
+
+    Yields:
+        list: workers of one page
+
+    Raises:
+        PageFetchError: a page still failed (error status, unreadable body, open
+        circuit) after its retries, ending here would pass for a complete headcount
+    """
+    form_data = _form_data(auth["adp_credentials"])
+    headers = {"accept": "application/json;masked=false"}
+    skip = 0
+    while True:
+        params = {"$select": queries.base_select, "$skip": skip, "$top": top}
+        status, content = await _get(
+            session,
+            limiter,
+            endpoints.select_url,
+            auth,
+            params,
+            form_data,
+            attempts,
+            headers=headers,
+        )
+        if status == 204:
+            return
+        if status != 200 or content is None:
+            raise PageFetchError(status, skip)
+        workers = content.get("workers")
+        if not workers:
+            return
+        yield workers
+        skip += top
+
+
+async def fetch_custom_attributes(
+    aoids, adp_credentials, token, max_in_flight=16, attempts=3
+) -> list:
+    """Fetch the custom attributes of many workers concurrently on one pooled client
+
+    Args:
+        aoids (list): associate oids to request
+        adp_credentials (dict): adp_credentials from Parameters
+        token (dict): result of ADPOpenConnection
+        max_in_flight (int, optional): requests in flight at first, the adaptive
+        limiter takes it from there. Defaults to 16.
+        attempts (int, optional): tries per worker on an empty body. Defaults to 3.
+
+    Returns:
+        list: [(aoid, custom attributes)] in the order of aoids
+    """
+    limiter = get_limiter(endpoints.select_url, max_in_flight)
+    cache = get_cache()
+    try:
+        async with open_client(adp_credentials) as session:
+            return await gather_custom_attributes(
+                session,
+                limiter,
+                make_auth(adp_credentials, token),
+                aoids,
+                attempts,
+                cache=cache,
+            )
+    finally:
+        release_limiter(endpoints.select_url, limiter)
+        if cache is not None:
+            properties = {"custom_dimensions": {"app": "ADP", **cache.snapshot()}}
+            logger.func(f"ADP http cache: {cache.snapshot()}", extra=properties)
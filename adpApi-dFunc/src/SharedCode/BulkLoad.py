@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from SharedCode.Lazy import lazy_import
+from SharedCode.Settings import tvp_type
+
+pd = lazy_import("pandas")
+sqlalchemy = lazy_import("sqlalchemy")
+
+_placeholders = {
+    "qmark": lambda number: "?",
+    "format": lambda number: "%s",
+    "numeric": lambda number: f":{number + 1}",
+    "named": lambda number: f":p{number}",
+    "pyformat": lambda number: f"%(p{number})s",
+}
+
+
+def _rows(df: pd.DataFrame) -> list:
+    # DBAPI drivers expect None rather than NaN for NULL
+    return list(
+        df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    )
+
+
+def _bind_length(column_type, values: pd.Series) -> int:
+    """NVARCHAR length to bind a column with, 0 for NVARCHAR(MAX)
+
+    The declared length of a string column, otherwise the longest value. Columns
+    without values (all NULL, or an empty frame) bind as NVARCHAR(1).
+    """
+    if isinstance(column_type, sqlalchemy.String) and column_type.length:
+        length = column_type.length
+    else:
+        longest = values.dropna().astype(str).str.len().max()
+        length = 1 if pd.isna(longest) else max(int(longest), 1)
+    return length if length <= 4000 else 0
+
+
+def _target(connection, table: str, schema=None) -> str:
+    preparer = connection.dialect.identifier_preparer
+    quoted = preparer.quote(table)
+    return f"{preparer.quote_schema(schema)}.{quoted}" if schema else quoted
+
+
+def _column_list(connection, columns: list) -> str:
+    preparer = connection.dialect.identifier_preparer
+    return ", ".join(preparer.quote(column) for column in columns)
+
+
+class BulkWriter:
+    """Appends a DataFrame to an existing table inside the caller's transaction"""
+
+    name = None
+
+    def supports(self, connection) -> bool:
+        return True
+
+    def write(self, connection, df: pd.DataFrame, table: str, schema=None) -> int:
+        """Append df to table
+
+        Args:
+            connection (sqlalchemy.engine.Connection): connection inside a transaction
+            df (pd.DataFrame): rows to write, columns named like the table's
+            table (str): target table
+            schema (str, optional): target schema. Defaults to None.
+
+        Returns:
+            int: rows written
+        """
+        raise NotImplementedError
+
+
+class ExecuteManyWriter(BulkWriter):
+    """DBAPI executemany on the raw cursor.
+
+    On pyodbc this turns on fast_executemany and declares every parameter as NVARCHAR
+    sized from the target column (or the data), so the driver binds each column once
+    instead of guessing types row by row.
+    """
+
+    name = "executemany"
+
+    def __init__(self, chunksize=10000):
+        self.chunksize = chunksize
+
+    def input_sizes(self, connection, df, table, schema=None) -> list:
+        import pyodbc
+
+        target = sqlalchemy.Table(
+            table, sqlalchemy.MetaData(), schema=schema, autoload_with=connection
+        )
+        return [
+            (
+                pyodbc.SQL_WVARCHAR,
+                _bind_length(
+                    target.c[column].type if column in target.c else None, df[column]
+                ),
+                0,
+            )
+            for column in df.columns
+        ]
+
+    def write(self, connection, df, table, schema=None):
+        placeholder = _placeholders[connection.dialect.paramstyle]
+        statement = "INSERT INTO {target} ({columns}) VALUES ({values})".format(
+            target=_target(connection, table, schema),
+            columns=_column_list(connection, df.columns),
+            values=", ".join(placeholder(number) for number in range(len(df.columns))),
+        )
+        rows = _rows(df)
+        if not rows:
+            return 0
+        if connection.dialect.paramstyle in ("named", "pyformat"):
+            rows = [{f"p{n}": value for n, value in enumerate(row)} for row in rows]
+
+        cursor = connection.connection.cursor()
+        try:
+            if connection.dialect.driver == "pyodbc":
+                cursor.fast_executemany = True
+                cursor.setinputsizes(self.input_sizes(connection, df, table, schema))
+            for start in range(0, len(rows), self.chunksize):
+                cursor.executemany(statement, rows[start : start + self.chunksize])
+        finally:
+            cursor.close()
+        return len(rows)
+
+
+class TvpWriter(BulkWriter):
+    """SQL Server table-valued parameter: one INSERT ... SELECT round trip per chunk.
+
+    Needs a user-defined table type (ADP_TVP_TYPE) in the target schema whose columns
+    match the DataFrame's columns in order.
+    """
+
+    name = "tvp"
+
+    def __init__(self, type_name=tvp_type, chunksize=50000):
+        self.type_name = type_name
+        self.chunksize = chunksize
+
+    def supports(self, connection):
+        return (
+            connection.dialect.name == "mssql" and connection.dialect.driver == "pyodbc"
+        )
+
+    def write(self, connection, df, table, schema=None):
+        columns = _column_list(connection, df.columns)
+        statement = (
+            f"INSERT INTO {_target(connection, table, schema)} ({columns}) "
+            f"SELECT {columns} FROM ?"
+        )
+        rows = _rows(df)
+        cursor = connection.connection.cursor()
+        try:
+            for start in range(0, len(rows), self.chunksize):
+                # pyodbc takes the table type name and schema as the first two items
+                tvp = [
+                    self.type_name,
+                    schema or "dbo",
+                    *rows[start : start + self.chunksize],
+                ]
+                cursor.execute(statement, (tvp,))
+        finally:
+            cursor.close()
+        return len(rows)
+
+
+class ToSqlWriter(BulkWriter):
+    """pandas to_sql, works on any database SQLAlchemy supports"""
+
+    name = "to_sql"
+
+    def __init__(self, chunksize=1000):
+        self.chunksize = chunksize
+
+    def write(self, connection, df, table, schema=None):
+        df.to_sql(
+            table,
+            connection,
+            schema=schema,
+            index=False,
+            if_exists="append",
+            chunksize=self.chunksize,
+        )
+        return len(df)
+
+
+writers = {
+    writer.name: writer for writer in (ExecuteManyWriter, TvpWriter, ToSqlWriter)
+}
+
+
+def get_writer(name: str) -> BulkWriter:
+    """Bulk writer for a configured strategy name
+
+    Args:
+        name (str): "executemany", "tvp" or "to_sql"
+
+    Returns:
+        BulkWriter: writer
+    """
+    try:
+        return writers[name]()
+    except KeyError:
+        raise ValueError(f"Unknown bulk load strategy: {name}")
@@ -0,0 +1,80 @@
+import json
+import threading
+
+from SharedCode.Config import kv_names
+from SharedCode.KVAid import KVHelper
+
+# credentials resolved from a handle, kept per worker process. A handle names exact
+# versions, so its credentials never go stale; a rotation produces a new handle.
+_resolved = {}
+_resolved_lock = threading.Lock()
+
+odbc_driver = "ODBC Driver 17 for SQL Server"
+
+
+def read_credentials(kv_help: KVHelper) -> tuple:
+    """Read the ADP and EDW credentials through a KVHelper
+
+    Args:
+        kv_help (KVHelper): helper, prefetched or not
+
+    Returns:
+        tuple: (adp_credentials, edw_credentials)
+    """
+    datv_credentials = kv_help.get_datv_credentials()
+    adp_credentials = {
+        "certificate": kv_help.get_certficate(),
+        "private_key": kv_help.get_private_key(),
+        "client_id": kv_help.get_client_id(),
+        "client_secret": kv_help.get_client_secret(),
+    }
+    edw_credentials = {
+        "user": kv_help.get_srvc_user(),
+        "password": kv_help.get_srvc_pass(),
+        "port": datv_credentials["db_port"],
+        "host": datv_credentials["db_host"],
+        "db_name": datv_credentials["db_name"],
+        "driver": odbc_driver,
+    }
+    return adp_credentials, edw_credentials
+
+
+def public_edw_credentials(edw_credentials: dict) -> dict:
+    """The parts of edw_credentials that may be stored in orchestration history"""
+    return {key: edw_credentials[key] for key in ("host", "port", "db_name", "driver")}
+
+
+def resolve_credentials(parameters: dict) -> dict:
+    """Parameters with the secrets of their credential handle filled back in
+
+    Parameters only ships {"credentials": {vault, versions}} between activities, so
+    no secret is written to the durable task hub. The first activity on a worker
+    reads the pinned versions from Key Vault, later ones reuse them.
+
+    Args:
+        parameters (dict): result of Parameters
+
+    Returns:
+        dict: parameters with adp_credentials and edw_credentials, unchanged when
+        it carries no handle
+    """
+    handle = parameters.get("credentials")
+    if handle is None:
+        return parameters
+
+    key = json.dumps(handle, sort_keys=True)
+    with _resolved_lock:
+        resolved = _resolved.get(key)
+    if resolved is None:
+        kv_help = KVHelper(handle["vault"], *kv_names[1:], versions=handle["versions"])
+        kv_help.prefetch()
+        resolved = read_credentials(kv_help)
+        with _resolved_lock:
+            _resolved[key] = resolved
+
+    adp_credentials, edw_credentials = resolved
+    return {
+        **parameters,
+        "adp_credentials": adp_credentials,
+        "edw_credentials": {**parameters.get("edw_credentials", {}), **edw_credentials},
+    }
@@ -1,51 +1,48 @@
 import asyncio
+import random
 import time
 import traceback
 from functools import wraps
 
 from SharedCode.LogIt import logger
+from SharedCode.Metrics import metrics, payload_bytes
+from SharedCode.Retry import RetryPolicy
+from SharedCode.Settings import payload_sample_rate, retry_base_delay, retry_max_tries
 
 
-def retry(max_tries=5, delay_seconds=1.5):
-    """retry a function up to max_tries with a delay between tries of delay_seconds
+def retry(
+    max_tries=retry_max_tries, delay_seconds=retry_base_delay, exceptions=(Exception,)
+):
+    """retry a function up to max_tries, backing off exponentially (with jitter)
+
+    Responses with a retryable status are retried too and Retry-After is honoured, see
+    SharedCode.Retry.RetryPolicy.
 
     Args:
-        max_tries (int, optional): how many retries to attempt. Defaults to 5.
-        delay_seconds (float, optional): how many seconds between attempts. Defaults to 1.5.
+        max_tries (int, optional): attempts to make. Defaults to ADP_RETRY_MAX_TRIES.
+        delay_seconds (float, optional): seconds before the first retry.
+            Defaults to ADP_RETRY_BASE_DELAY.
+        exceptions (tuple, optional): exceptions to retry. Defaults to (Exception,).
     """
+    return RetryPolicy(
+        max_tries=max_tries, base_delay=delay_seconds, retry_exceptions=exceptions
+    )
 
-    def decorator_retry(func):
-        @wraps(func)
-        def wrapper_retry(*args, **kwargs):
-            tries = 1
-            while tries < max_tries:
-                try:
-                    module_name = kwargs.get("module_name", "None")
-                    if tries > 1:
-                        logger.warning(
-                            f"HTTP Request from {module_name}: attempt number {tries}."
-                        )
-                    return func(*args, **kwargs)
-                except Exception as er:
-                    logger.warning("Starting new retry attempt")
-                    logger.warning(f"{str(er)}")
-                    tries += 1
-                    if tries == max_tries:
-                        logger.critical(
-                            f"Reached max retry attempts.\n\n\
-                            ERROR: {str(er)}.\n\n\
-                            TRACEBACK: {traceback.format_exc()}"
-                        )
-                        raise er
-                    time.sleep(delay_seconds)
-
-        return wrapper_retry
 
-    return decorator_retry
+def _worker_count(result):
+    # activities report the workers they handled as worker_count, or return them
+    if isinstance(result, dict):
+        return result.get("worker_count")
+    return len(result) if isinstance(result, list) else None
 
 
 def log_execution(_func=None, *, func_name=__name__):
-    """Log the start and end of an activity function.
+    """Log the start and end of an activity function and record its metrics.
+
+    Duration, payload bytes in and out, worker counts and errors are recorded per
+    activity in SharedCode.Metrics, which exports them every ADP_METRICS_INTERVAL
+    seconds. Payload bytes are measured for ADP_PAYLOAD_SAMPLE_RATE of the
+    invocations only.
 
     Args:
         _func (_type_, optional): The function being wrapped. Defaults to None.
@@ -55,8 +52,17 @@ def log_execution(_func=None, *, func_name=__name__):
     def log_func(func):
         @wraps(func)
         def wrapper_log_func(*args, **kwargs):
+            started = time.perf_counter()
+            metrics.count("activity.invocations", activity=func_name)
+            # sizing a payload serializes it, too costly to do on every invocation
+            measure = random.random() < payload_sample_rate
+            if measure:
+                metrics.observe(
+                    "activity.bytes_in", payload_bytes(list(args)), activity=func_name
+                )
             try:
-                properties = {"custom_dimensions": {"app": "ADP"}}
+                # start and end of every invocation, sampled by ADP_LOG_SAMPLE_RATE
+                properties = {"custom_dimensions": {"app": "ADP"}, "sampled": True}
                 logger.func(f"Running: {func_name}", extra=properties)
                 if asyncio.iscoroutinefunction(func):
                     # convert the coroutine object to a regular function
@@ -64,6 +70,7 @@ def log_execution(_func=None, *, func_name=__name__):
                 else:
                     result = func(*args, **kwargs)
             except Exception as er:
+                metrics.count("activity.errors", activity=func_name)
                 properties = {"custom_dimensions": {"app": "ADP"}}
                 logger.exception(
                     f"EXCEPTION Raised in {func_name}. \n\n\
@@ -72,8 +79,24 @@ def log_execution(_func=None, *, func_name=__name__):
                     extra=properties
                 )
             else:
-                logger.func(f"Successfully Executed: {func_name}")
+                if measure:
+                    metrics.observe(
+                        "activity.bytes_out", payload_bytes(result), activity=func_name
+                    )
+                workers = _worker_count(result)
+                if workers is not None:
+                    metrics.observe("activity.workers", workers, activity=func_name)
+                logger.func(
+                    f"Successfully Executed: {func_name}", extra={"sampled": True}
+                )
                 return result
+            finally:
+                metrics.observe(
+                    "activity.duration_seconds",
+                    time.perf_counter() - started,
+                    activity=func_name,
+                )
+                metrics.export_due()
 
         return wrapper_log_func
 
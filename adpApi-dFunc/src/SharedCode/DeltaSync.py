@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+import uuid
+
+from SharedCode.BulkLoad import ToSqlWriter
+from SharedCode.Lazy import lazy_import
+
+pd = lazy_import("pandas")
+sqlalchemy = lazy_import("sqlalchemy")
+
+
+def _canonical(value) -> str:
+    # NULL and NaN hash alike, everything else by its string form
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return "\x00"
+    return str(value)
+
+
+def normalise(df: pd.DataFrame, table: sqlalchemy.Table) -> pd.DataFrame:
+    """df with the columns table stores as dates or numbers converted to them
+
+    Workers arrive from the API as text while the table hands back typed values, so
+    both sides go through this before hashing for "2020-01-01" and date(2020, 1, 1),
+    or "42" and 42, to hash alike. Values that do not convert count as NULL.
+
+    Args:
+        df (pd.DataFrame): rows, from the API or read from table
+        table (sqlalchemy.Table): table with the column types
+
+    Returns:
+        pd.DataFrame: converted copy of df
+    """
+    converted = {}
+    for column in table.columns:
+        if column.name not in df.columns:
+            continue
+        values = df[column.name]
+        if isinstance(column.type, (sqlalchemy.Date, sqlalchemy.DateTime)):
+            converted[column.name] = pd.to_datetime(
+                values, errors="coerce", utc=True, format="ISO8601"
+            )
+        elif isinstance(column.type, (sqlalchemy.Integer, sqlalchemy.Numeric)):
+            converted[column.name] = pd.to_numeric(values, errors="coerce").astype(
+                float
+            )
+    return df.assign(**converted) if converted else df
+
+
+def row_hashes(df: pd.DataFrame, columns: list, table=None) -> pd.Series:
+    """Stable SHA256 per row over the given columns, independent of column order
+
+    Args:
+        df (pd.DataFrame): rows to hash
+        columns (list): columns included in the hash
+        table (sqlalchemy.Table, optional): target of the rows, values are
+        normalised to its column types first. Defaults to None.
+
+    Returns:
+        pd.Series: hex digests indexed like df
+    """
+    ordered = sorted(columns)
+    values = df[ordered] if table is None else normalise(df[ordered], table)
+    digests = [
+        hashlib.sha256("\x1f".join(map(_canonical, row)).encode()).hexdigest()
+        for row in values.itertuples(index=False, name=None)
+    ]
+    return pd.Series(digests, index=df.index, dtype=object)
+
+
+def plan_delta(incoming: pd.Series, existing: pd.Series) -> tuple:
+    """Compare row hashes keyed by the business key
+
+    Args:
+        incoming (pd.Series): hash per key of the rows being loaded
+        existing (pd.Series): hash per key of the rows in the target
+
+    Returns:
+        tuple: (keys to insert, keys to update, keys to delete)
+    """
+    shared = incoming.index.intersection(existing.index)
+    changed = shared[incoming[shared].values != existing[shared].values]
+    inserts = incoming.index.difference(existing.index)
+    deletes = existing.index.difference(incoming.index)
+    return list(inserts), list(changed), list(deletes)
+
+
+def sync_table(
+    connection,
+    df: pd.DataFrame,
+    table: str,
+    schema=None,
+    key="associate_oid",
+    hash_column="row_hash",
+    writer=None,
+) -> dict:
+    """Bring a table in line with df by writing only the rows that differ
+
+    Hashes of the target come from hash_column when the table has one, otherwise
+    they are computed from the stored rows; either way values are normalised to the
+    column types of the table first. Changed and new rows are staged in tables named
+    for this run, so overlapping runs do not share them, then applied with one
+    set-based delete and one insert inside the caller's transaction.
+
+    Args:
+        connection (sqlalchemy.engine.Connection): connection inside a transaction
+        df (pd.DataFrame): every row the table should hold
+        table (str): target table
+        schema (str, optional): target schema. Defaults to None.
+        key (str, optional): business key column. Defaults to "associate_oid".
+        hash_column (str, optional): stored row hash column. Defaults to "row_hash".
+        writer (BulkLoad.BulkWriter, optional): writes the staged rows. Defaults to
+        pandas to_sql.
+
+    Returns:
+        dict: {inserted, updated, deleted, unchanged}
+    """
+    target = sqlalchemy.Table(
+        table, sqlalchemy.MetaData(), schema=schema, autoload_with=connection
+    )
+    target_columns = [column.name for column in target.columns]
+    columns = [column for column in df.columns if column in target_columns]
+    store_hash = hash_column in target_columns and hash_column not in columns
+
+    df = df[columns].drop_duplicates(subset=key, keep="last")
+    incoming = pd.Series(row_hashes(df, columns, target).values, index=df[key])
+
+    if store_hash:
+        query = sqlalchemy.select(target.c[key], target.c[hash_column])
+        existing = pd.DataFrame(connection.execute(query).all(), columns=[key, "hash"])
+        existing = pd.Series(existing["hash"].values, index=existing[key])
+    else:
+        query = sqlalchemy.select(*(target.c[column] for column in columns))
+        stored = pd.DataFrame(connection.execute(query).all(), columns=columns)
+        existing = pd.Series(
+            row_hashes(stored, columns, target).values, index=stored[key]
+        )
+
+    # keys stored more than once are rewritten so the table ends up with one row each
+    duplicated = existing.index[existing.index.duplicated()].unique()
+    existing = existing[~existing.index.duplicated(keep="first")]
+    existing[duplicated] = None
+
+    inserts, updates, deletes = plan_delta(incoming, existing)
+    counts = {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": len(incoming) - len(inserts) - len(updates),
+    }
+    if not (inserts or updates or deletes):
+        return counts
+
+    changes = df[df[key].isin(inserts + updates)]
+    if store_hash:
+        changes = changes.assign(**{hash_column: incoming.loc[changes[key]].values})
+    removed = pd.DataFrame({key: updates + deletes})
+
+    prefix = f"{schema}." if schema else ""
+    run = uuid.uuid4().hex[:8]
+    staged_rows = f"{table}_delta_{run}"
+    staged_keys = f"{table}_delta_keys_{run}"
+    changes.head(0).to_sql(
+        staged_rows, connection, schema=schema, index=False, if_exists="replace"
+    )
+    (writer or ToSqlWriter()).write(connection, changes, staged_rows, schema)
+    removed.to_sql(
+        staged_keys, connection, schema=schema, index=False, if_exists="replace"
+    )
+    written = ", ".join(f'"{column}"' for column in changes.columns)
+    for statement in (
+        f'DELETE FROM {prefix}{table} WHERE "{key}" IN '
+        f'(SELECT "{key}" FROM {prefix}{staged_keys})',
+        f"INSERT INTO {prefix}{table} ({written}) "
+        f"SELECT {written} FROM {prefix}{staged_rows}",
+        f"DROP TABLE {prefix}{staged_rows}",
+        f"DROP TABLE {prefix}{staged_keys}",
+    ):
+        connection.execute(sqlalchemy.text(statement))
+    return counts
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+
+from SharedCode.Lazy import lazy_import
+from SharedCode.LogIt import logger
+from SharedCode.Metrics import metrics
+from SharedCode.Settings import (
+    db_max_overflow,
+    db_pool_recycle,
+    db_pool_size,
+    db_pool_timeout,
+)
+
+sqlalchemy = lazy_import("sqlalchemy")
+
+
+def _digest(secret) -> str:
+    return hashlib.sha256(str(secret or "").encode()).hexdigest()
+
+
+class EngineRegistry:
+    """SQLAlchemy engines shared by every activity running on a worker
+
+    An engine owns a bounded pool of open connections, so reusing one saves later
+    invocations the driver setup and login to the database. Engines are keyed by the
+    non-secret parts of their connection; when the secret of a key changes (a rotated
+    password) the old engine is disposed and replaced.
+
+    Args:
+        pool_size (int): connections kept open per engine
+        max_overflow (int): extra connections opened when the pool is exhausted
+        pool_timeout (int): seconds to wait for a pooled connection
+        pool_recycle (int): seconds after which a connection is reopened
+    """
+
+    def __init__(
+        self,
+        pool_size=db_pool_size,
+        max_overflow=db_max_overflow,
+        pool_timeout=db_pool_timeout,
+        pool_recycle=db_pool_recycle,
+    ):
+        self.pool_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_recycle": pool_recycle,
+            "pool_pre_ping": True,
+        }
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._engines)
+
+    def get(self, url, key=None, secret=None, **options) -> sqlalchemy.engine.Engine:
+        """Engine for url, created on first use
+
+        Args:
+            url (str or URL): database url
+            key (tuple, optional): non-secret parts identifying the connection.
+                Defaults to the url with its password hidden.
+            secret (str, optional): secret part of the connection. Defaults to the
+                password of the url.
+            **options: further create_engine arguments, part of the key
+
+        Returns:
+            Engine: pooled engine shared with every caller of the same key
+        """
+        url = sqlalchemy.engine.make_url(url)
+        if key is None:
+            key = (url.render_as_string(hide_password=True),)
+            secret = url.password if secret is None else secret
+        key = key + tuple(
+            sorted((name, repr(value)) for name, value in options.items())
+        )
+        digest = _digest(secret)
+
+        with self._lock:
+            entry = self._engines.get(key)
+            if entry is not None and entry[0] == digest:
+                return entry[1]
+            if entry is not None:
+                logger.func(
+                    f"Credentials changed, replacing the engine for {key[0]}",
+                    extra={"custom_dimensions": {"app": "ADP"}},
+                )
+                entry[1].dispose()
+            engine = sqlalchemy.create_engine(
+                url, echo=False, **{**self.pool_options, **options}
+            )
+            self._engines[key] = (digest, engine)
+        metrics.count("db.engines_created", dialect=url.get_backend_name())
+        return engine
+
+    def dispose(self):
+        """Close every pooled connection and forget the engines"""
+        with self._lock:
+            engines, self._engines = self._engines, {}
+        for _, engine in engines.values():
+            engine.dispose()
+
+
+engines = EngineRegistry()
+
+
+def edw_engine(edw_credentials: dict, **options) -> sqlalchemy.engine.Engine:
+    """Shared engine for the EDW described by edw_credentials
+
+    Args:
+        edw_credentials (dict): {user, password, host, db_name, driver}
+        **options: further create_engine arguments
+
+    Returns:
+        Engine: mssql+pyodbc engine with fast_executemany
+    """
+    driver = edw_credentials["driver"]
+    host = edw_credentials["host"]
+    db_name = edw_credentials["db_name"]
+    user = edw_credentials["user"]
+    password = edw_credentials["password"]
+
+    connection_string = (
+        f"Driver={driver};Server={host};Database={db_name};Uid={user};Pwd={password}"
+    )
+    connection_url = sqlalchemy.engine.URL.create(
+        "mssql+pyodbc", query={"odbc_connect": connection_string}
+    )
+    return engines.get(
+        connection_url,
+        key=("mssql+pyodbc", driver, host, db_name, user),
+        secret=password,
+        **{"fast_executemany": True, **options},
+    )
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from SharedCode.Lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+_missing = object()
+
+
+def _step(node, tokens: tuple, start: int):
+    """Resolve the next path segment, a segment may span several "_" tokens when
+    the JSON key itself contains underscores
+
+    Returns:
+        tuple: (child node, index of the next unused token) or (_missing, start)
+    """
+    if isinstance(node, list):
+        token = tokens[start]
+        if token.isdigit() and int(token) < len(node):
+            return node[int(token)], start + 1
+        return _missing, start
+    if isinstance(node, dict):
+        for end in range(start + 1, len(tokens) + 1):
+            key = "_".join(tokens[start:end])
+            if key in node:
+                return node[key], end
+    return _missing, start
+
+
+def _leaf(value):
+    # flatten_json keeps None and empty containers, anything else nested is not a leaf
+    if isinstance(value, (dict, list)) and value:
+        return None
+    return value
+
+
+class Flattener:
+    """Extracts only the mapped flatten_json paths of a document
+
+    Compiled once from a Config column mapping ({flattened path: column name}),
+    paths mapped to "remove" are never visited. Numeric tokens index lists, so
+    "workAssignments_0_hireDate" reads document["workAssignments"][0]["hireDate"].
+    When several paths map to the same column the first one that is present wins.
+    """
+
+    def __init__(self, mapping: dict, drop="remove"):
+        self.columns = []
+        self.paths = {}
+        for path, column in mapping.items():
+            if column == drop:
+                continue
+            if column not in self.paths:
+                self.columns.append(column)
+                self.paths[column] = []
+            self.paths[column].append(tuple(path.split("_")))
+
+    def extract(self, document: dict, tokens: tuple):
+        node, position = document, 0
+        while position < len(tokens):
+            node, position = _step(node, tokens, position)
+            if node is _missing:
+                return None
+        return _leaf(node)
+
+    def row(self, document: dict) -> dict:
+        """Mapped columns of one document
+
+        Args:
+            document (dict): nested worker JSON
+
+        Returns:
+            dict: {column name: value}, None where no path is present
+        """
+        row = {}
+        for column in self.columns:
+            value = None
+            for tokens in self.paths[column]:
+                value = self.extract(document, tokens)
+                if value is not None:
+                    break
+            row[column] = value
+        return row
+
+    def frame(self, documents) -> pd.DataFrame:
+        """Build a DataFrame straight from column arrays
+
+        Args:
+            documents (iterable): nested worker JSON documents
+
+        Returns:
+            pd.DataFrame: one row per document, one column per mapped column
+        """
+        data = {column: [] for column in self.columns}
+        for document in documents:
+            for column, value in self.row(document).items():
+                data[column].append(value)
+        return pd.DataFrame(data, columns=self.columns)
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from SharedCode import Settings
+
+CacheEntry = namedtuple("CacheEntry", ["etag", "last_modified", "body", "stored_at"])
+
+
+class HttpCache:
+    """Responses kept in SQLite for conditional GETs
+
+    An entry with an ETag or Last-Modified is revalidated with If-None-Match /
+    If-Modified-Since and a 304 reuses its body. An entry without validators is
+    reused without a request while younger than ttl seconds.
+
+    Entries not stored or revalidated for max_age seconds are never used and are
+    deleted, as are the oldest entries beyond max_entries, when the cache is opened
+    and then every evict_every stores. Methods block on SQLite, async callers run
+    them in a thread.
+
+    Counters: hits (no request sent), revalidated (304), misses (full body fetched).
+    """
+
+    def __init__(
+        self,
+        path,
+        ttl=0,
+        max_age=86400,
+        max_entries=100000,
+        evict_every=1000,
+        clock=time.time,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self.clock = clock
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS http_cache ("
+                "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+                "body BLOB, stored_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS ix_http_cache_stored_at "
+                "ON http_cache (stored_at)"
+            )
+        self.evict()
+
+    @staticmethod
+    def key(url: str, params=None) -> str:
+        return f"{url}?{urlencode(sorted((params or {}).items()))}"
+
+    def lookup(self, key: str) -> CacheEntry:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, body, stored_at FROM http_cache "
+                "WHERE key = ? AND stored_at >= ?",
+                (key, self.clock() - self.max_age),
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def fresh(self, entry: CacheEntry) -> bool:
+        """True when an entry without validators may be used without a request"""
+        if entry.etag or entry.last_modified:
+            return False
+        return self.clock() - entry.stored_at < self.ttl
+
+    @staticmethod
+    def validators(entry: CacheEntry) -> dict:
+        """Conditional request headers for an entry"""
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def hit(self):
+        with self._lock:
+            self.counters["hits"] += 1
+
+    def revalidated(self, key: str):
+        with self._lock, self._db:
+            self.counters["revalidated"] += 1
+            self._db.execute(
+                "UPDATE http_cache SET stored_at = ? WHERE key = ?", (self.clock(), key)
+            )
+
+    def store(self, key: str, headers, body: bytes):
+        with self._lock, self._db:
+            self.counters["misses"] += 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    body,
+                    self.clock(),
+                ),
+            )
+            due = self.counters["misses"] % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self) -> int:
+        """Delete entries older than max_age, then the oldest beyond max_entries
+
+        Returns:
+            int: entries deleted
+        """
+        with self._lock, self._db:
+            deleted = self._db.execute(
+                "DELETE FROM http_cache WHERE stored_at < ?",
+                (self.clock() - self.max_age,),
+            ).rowcount
+            deleted += self._db.execute(
+                "DELETE FROM http_cache WHERE key IN (SELECT key FROM http_cache "
+                "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        return deleted
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM http_cache")
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(path=None) -> HttpCache:
+    """Process wide response cache
+
+    Args:
+        path (str, optional): SQLite file, relative paths are under the temp
+        directory. Defaults to ADP_HTTP_CACHE.
+
+    Returns:
+        HttpCache: cache or None when caching is disabled
+    """
+    path = Settings.http_cache_path if path is None else path
+    if not path:
+        return None
+    path = os.path.join(tempfile.gettempdir(), path)
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = HttpCache(
+                path,
+                Settings.http_cache_ttl,
+                Settings.http_cache_max_age,
+                Settings.http_cache_max_entries,
+            )
+        return _caches[path]
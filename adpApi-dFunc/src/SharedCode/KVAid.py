@@ -1,23 +1,32 @@
+import hashlib
 import json
 import logging
+import threading
+import time
 import traceback
 
-from azure.core.exceptions import ClientAuthenticationError
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.certificates import CertificateClient, KeyVaultCertificate
-from azure.keyvault.certificates._models import KeyVaultCertificate
-from azure.keyvault.keys import KeyClient
-from azure.keyvault.secrets import KeyVaultSecret, SecretClient
-from azure.keyvault.secrets._models import KeyVaultSecret
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 from cryptography import x509
-from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives import hashes, serialization
+from OpenSSL.crypto import X509, PKey
 
 from SharedCode import LogIt
+from SharedCode.Lazy import lazy_import
+from SharedCode.Settings import kv_cache_ttl
+from SharedCode.Tuples import CertMaterial, VaultObject
 
 logger = logging.getLogger("func")
 
+# the Key Vault SDKs are imported when a vault is first read
+az_exceptions = lazy_import("azure.core.exceptions")
+az_identity = lazy_import("azure.identity")
+kv_certificates = lazy_import("azure.keyvault.certificates")
+kv_secrets = lazy_import("azure.keyvault.secrets")
+
 
-def string_it(azure_object: KeyVaultCertificate or KeyVaultSecret) -> str:
+def string_it(azure_object: "KeyVaultCertificate or KeyVaultSecret") -> str:
     """Turn a KeyVaultObject into a json serializable string to be passed between activity functions
 
     Args:
@@ -26,9 +35,9 @@ def string_it(azure_object: KeyVaultCertificate or KeyVaultSecret) -> str:
     Returns:
         str: cert or key string
     """
-    if isinstance(azure_object, KeyVaultSecret):
+    if isinstance(azure_object, kv_secrets.KeyVaultSecret):
         return json.dumps(azure_object.value)
-    elif isinstance(azure_object, KeyVaultCertificate):
+    elif isinstance(azure_object, kv_certificates.KeyVaultCertificate):
         return bytes(azure_object.cer).decode("latin1")
     else:
         logging.info(f"{azure_object} not correct type")
@@ -83,6 +92,163 @@ def make_key(private_key_string: str) -> object:  # pragma: no cover
         )
 
 
+class CertCache:
+    """Parsed certificate/key pairs keyed by a hash of their strings.
+
+    Parsing the DER certificate, loading the RSA key and converting both to pyOpenSSL
+    happens once per credential per worker process. Only max_entries pairs are kept,
+    so the least recently used pair is evicted once the credentials rotate.
+    """
+
+    def __init__(self, max_entries=2):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, certificate_string: str, private_key_string: str) -> CertMaterial:
+        """Parsed credential material, built on first use
+
+        Args:
+            certificate_string (str): certificate from KVHelper.get_certficate
+            private_key_string (str): key from KVHelper.get_private_key
+
+        Returns:
+            CertMaterial: (fingerprint, certificate, private_key, x509, pkey)
+        """
+        digest = hashlib.sha256(
+            f"{certificate_string}\0{private_key_string}".encode("latin1")
+        ).hexdigest()
+        with self._lock:
+            if digest in self._entries:
+                self._entries.move_to_end(digest)
+                return self._entries[digest]
+
+        certificate = make_certificate(certificate_string)
+        private_key = make_key(private_key_string)
+        material = CertMaterial(
+            fingerprint=certificate.fingerprint(hashes.SHA256()).hex(),
+            certificate=certificate,
+            private_key=private_key,
+            x509=X509.from_cryptography(certificate),
+            pkey=PKey.from_cryptography_key(private_key),
+        )
+        with self._lock:
+            self._entries[digest] = material
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return material
+
+    def find(self, certificate, private_key) -> CertMaterial:
+        """Cached material for already parsed cryptography objects, if there is any
+
+        Args:
+            certificate (object): cryptography certificate
+            private_key (object): cryptography private key
+
+        Returns:
+            CertMaterial: matching material or None
+        """
+        with self._lock:
+            for material in self._entries.values():
+                if (
+                    material.certificate is certificate
+                    and material.private_key is private_key
+                ):
+                    return material
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cert_cache = CertCache()
+
+
+def load_credentials(certificate_string: str, private_key_string: str) -> CertMaterial:
+    """Parse the ADP certificate and key once per worker process
+
+    Args:
+        certificate_string (str): certificate from KVHelper.get_certficate
+        private_key_string (str): key from KVHelper.get_private_key
+
+    Returns:
+        CertMaterial: pass (x509, pkey) as the cert of an ADP request
+    """
+    return cert_cache.get(certificate_string, private_key_string)
+
+
+class VaultCache:
+    """Key Vault values kept for ttl seconds across warm invocations.
+
+    Entries are keyed by (vault url, kind, name) and remember their version. When a
+    fetch returns a different version than the cached one the entry is replaced, so
+    a rotated secret is picked up on the next fetch after its ttl.
+    """
+
+    def __init__(self, ttl=900, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> VaultObject:
+        """Cached object when it is younger than ttl, otherwise None"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or self.clock() - entry.fetched_at >= self.ttl:
+            return None
+        return entry
+
+    def put(self, key: tuple, value: str, version: str) -> VaultObject:
+        entry = VaultObject(value, version, self.clock())
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = entry
+        if previous is not None and previous.version != version:
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.func(
+                f"Key Vault {key[1]} {key[2]} rotated to version {version}",
+                extra=properties,
+            )
+        return entry
+
+    def invalidate(self, key=None, version=None):
+        """Drop an entry (every entry when key is None) unless it holds version"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            elif (
+                version is None
+                or getattr(self._entries.get(key), "version", None) != version
+            ):
+                self._entries.pop(key, None)
+
+
+vault_cache = VaultCache(ttl=kv_cache_ttl)
+
+# one credential and client pair per vault, so warm invocations reuse their tokens
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_clients(kv_url: str) -> tuple:
+    """(SecretClient, CertificateClient) for a vault, created once per worker process"""
+    with _clients_lock:
+        if kv_url not in _clients:
+            az_credentials = az_identity.DefaultAzureCredential(
+                additionally_allowed_tenants=["*"],
+                exclude_shared_token_cache_credential=True,
+            )
+            _clients[kv_url] = (
+                kv_secrets.SecretClient(vault_url=kv_url, credential=az_credentials),
+                kv_certificates.CertificateClient(
+                    vault_url=kv_url, credential=az_credentials
+                ),
+            )
+        return _clients[kv_url]
+
+
 class KVHelper:
     # Set KV connection credentials
     def __init__(
@@ -96,19 +262,15 @@ class KVHelper:
         db_pass,
         db_host,
         db_port,
+        versions=None,
     ):
         self.kv_name = kv_name
         self.kv_url = f"https://{self.kv_name}.vault.azure.net"
-        self.az_credentials = DefaultAzureCredential(
-            additionally_allowed_tenants=["*"],
-            exclude_shared_token_cache_credential=True,
-        )
-        self.secret_client = SecretClient(
-            vault_url=self.kv_url, credential=self.az_credentials
-        )
-        self.cert_client = CertificateClient(
-            vault_url=self.kv_url, credential=self.az_credentials
-        )
+        self.secret_client, self.cert_client = get_clients(self.kv_url)
+        # objects fetched during this run, each name is only requested once
+        self._fetched = {}
+        # "kind:name" -> version, set to pin objects to the versions of a handle
+        self.versions = dict(versions or {})
         # Set Names of KeyVault Objects
         self.client_id = kv_client_id
         self.client_secret = kv_client_secret
@@ -119,6 +281,87 @@ class KVHelper:
         self.db_host = db_host
         self.db_port = db_port
 
+    def _fetch(self, kind: str, name: str) -> str:
+        """Request one object from the vault and cache its usable string
+
+        A pinned object is requested at its version and not cached, so an old
+        version never replaces a newer one in vault_cache.
+        """
+        pinned = self.versions.get(f"{kind}:{name}")
+        if kind == "certificate":
+            cert = (
+                self.cert_client.get_certificate_version(name, pinned)
+                if pinned
+                else self.cert_client.get_certificate(name)
+            )
+            value, version = string_it(cert), cert.properties.version
+        else:
+            secret = self.secret_client.get_secret(name, pinned)
+            value, version = secret.value, secret.properties.version
+        if not pinned:
+            vault_cache.put((self.kv_url, kind, name), value, version)
+        self.versions[f"{kind}:{name}"] = version
+        return value
+
+    def _get(self, kind: str, name: str, cached=False) -> str:
+        key = (kind, name)
+        if key not in self._fetched:
+            entry = vault_cache.get((self.kv_url, kind, name)) if cached else None
+            pinned = self.versions.get(f"{kind}:{name}")
+            if entry is not None and pinned in (None, entry.version):
+                self.versions[f"{kind}:{name}"] = entry.version
+                self._fetched[key] = entry.value
+            else:
+                self._fetched[key] = self._fetch(kind, name)
+        return self._fetched[key]
+
+    def handle(self) -> dict:
+        """Vault and object versions read so far, safe to pass between activities
+
+        Returns:
+            dict: {vault, versions: {"kind:name": version}}
+        """
+        return {"vault": self.kv_name, "versions": dict(self.versions)}
+
+    def prefetch(self):
+        """Fetch every object Parameters needs concurrently
+
+        Objects cached by an earlier invocation within ADP_KV_CACHE_TTL are not
+        requested again. The getters below then answer from this run's results.
+
+        Raises:
+            er: ClientAuthenticationError
+        """
+        objects = [("certificate", self.certificate)] + [
+            ("secret", name)
+            for name in dict.fromkeys(
+                [
+                    self.certificate,
+                    self.client_id,
+                    self.client_secret,
+                    self.db_user,
+                    self.db_pass,
+                    self.db_host,
+                    self.db_port,
+                ]
+            )
+        ]
+        try:
+            with ThreadPoolExecutor(max_workers=len(objects)) as pool:
+                values = list(
+                    pool.map(lambda item: self._get(*item, cached=True), objects)
+                )
+        except az_exceptions.ClientAuthenticationError as er:
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.critical(
+                f"Couldn't authenticate to {self.kv_name} from {__class__}.\n\n\
+                ERROR: {str(er)}\n\n\
+                TRACEBACK: {traceback.format_exc()}",
+                extra=properties
+            )
+            raise er
+        self._fetched.update(zip(objects, values))
+
     def get_srvc_user(self) -> str:
         """Retrieve User Name for a service account
         Raises:
@@ -128,8 +371,8 @@ class KVHelper:
             str: {user_name : {user_name}}
         """
         try:
-            return self.secret_client.get_secret(self.db_user).value
-        except ClientAuthenticationError as er:
+            return self._get("secret", self.db_user)
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logger.critical(
                 f"Couldn't authenticate to {self.kv_name} from {__class__}.\n\n\
@@ -148,8 +391,8 @@ class KVHelper:
             str: {pass : {password}}
         """
         try:
-            return self.secret_client.get_secret(self.db_pass).value
-        except ClientAuthenticationError as er:
+            return self._get("secret", self.db_pass)
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logger.critical(
                 f"Couldn't authenticate to {self.kv_name} from {__class__}\n\n\
@@ -170,13 +413,13 @@ class KVHelper:
         """
         try:
             return {
-                "db_user": self.secret_client.get_secret(self.db_user).value,
-                "db_pass": self.secret_client.get_secret(self.db_pass).value,
-                "db_port": self.secret_client.get_secret(self.db_port).value,
-                "db_host": self.secret_client.get_secret(self.db_host).value,
+                "db_user": self._get("secret", self.db_user),
+                "db_pass": self._get("secret", self.db_pass),
+                "db_port": self._get("secret", self.db_port),
+                "db_host": self._get("secret", self.db_host),
                 "db_name": self.db_name,
             }
-        except ClientAuthenticationError as er:
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logging.critical(
                 f"Couldn't authenticate to {self.kv_name} from {__class__}\n\n\
@@ -193,9 +436,8 @@ class KVHelper:
             str: Certificate string
         """
         try:
-            cert = self.cert_client.get_certificate(self.certificate)
-            return string_it(cert)
-        except ClientAuthenticationError as er:
+            return self._get("certificate", self.certificate)
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logging.critical(
                 f"Couldn't authenticate to {self.kv_name}.\n\n\
@@ -211,9 +453,8 @@ class KVHelper:
             str: private key string
         """
         try:
-            key = self.secret_client.get_secret(self.certificate)
-            return string_it(key)
-        except ClientAuthenticationError as er:
+            return json.dumps(self._get("secret", self.certificate))
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logging.exception(
                 f"Couldn't authenticate to {self.kv_name}.\n\n\
@@ -229,8 +470,8 @@ class KVHelper:
             str: client id
         """
         try:
-            return self.secret_client.get_secret(self.client_id).value
-        except ClientAuthenticationError as er:
+            return self._get("secret", self.client_id)
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logging.exception(
                 f"Couldn't authenticate to {self.kv_name}. \n\n\
@@ -246,8 +487,8 @@ class KVHelper:
             str: client secret
         """
         try:
-            return self.secret_client.get_secret(self.client_secret).value
-        except ClientAuthenticationError as er:
+            return self._get("secret", self.client_secret)
+        except az_exceptions.ClientAuthenticationError as er:
             properties = {"custom_dimensions": {"app": "ADP"}}
             logging.exception(
                 f"Couldn't authenticate to {self.kv_name}. \n\n\
@@ -0,0 +1,31 @@
+import importlib
+import sys
+import types
+
+# Every activity imports SharedCode, but only some of them need pandas, sqlalchemy or
+# the Key Vault SDKs. Modules bound with lazy_import are imported the first time one
+# of their attributes is used, so an activity only pays for what it calls.
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access"""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # later lookups are answered from the real module's namespace
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """Bind a module without importing it yet
+
+    Args:
+        name (str): dotted module name, e.g. "sqlalchemy.engine"
+
+    Returns:
+        types.ModuleType: the module when it is already imported, otherwise a
+        LazyModule that imports it on first use
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
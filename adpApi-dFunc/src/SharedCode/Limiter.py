@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+from SharedCode.LogIt import logger
+from SharedCode.Settings import latency_target, limit_max, limit_min
+
+
+class AdaptiveLimiter:
+    """AIMD cap on the requests in flight, used like an asyncio.Semaphore
+
+    Every healthy response widens the limit by 1/limit, so about one more request
+    per round trip (additive increase). A 429, a 5xx, a connection error or a
+    response slower than latency_target cuts it by backoff (multiplicative
+    decrease), at most once per average round trip so one burst of throttling
+    counts once.
+
+    Call record(status, latency) after each request; limit, in_flight and
+    snapshot() expose the current state.
+    """
+
+    def __init__(
+        self,
+        initial=16,
+        minimum=limit_min,
+        maximum=limit_max,
+        backoff=0.5,
+        latency_target=latency_target,
+        clock=time.monotonic,
+    ):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.clock = clock
+        self._limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.latency = None
+        self.counters = {
+            "requests": 0,
+            "successes": 0,
+            "throttled": 0,
+            "errors": 0,
+            "slow": 0,
+            "increases": 0,
+            "decreases": 0,
+        }
+        self._last_decrease = None
+        self._condition = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _wait(self) -> asyncio.Condition:
+        # created on first use so it binds to the running event loop
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def __aenter__(self):
+        condition = self._wait()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        condition = self._wait()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    def record(self, status, latency=None):
+        """Adjust the limit from the outcome of one request
+
+        Args:
+            status (int): HTTP status, None when the request failed to complete
+            latency (float, optional): seconds the request took. Defaults to None.
+        """
+        self.counters["requests"] += 1
+        if latency is not None:
+            self.latency = (
+                latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            )
+
+        if status is None:
+            reason = "errors"
+        elif status == 429 or status >= 500:
+            reason = "throttled"
+        elif self.latency_target and latency and latency > self.latency_target:
+            reason = "slow"
+        else:
+            self.counters["successes"] += 1
+            grown = min(self._limit + 1 / self._limit, self.maximum)
+            if int(grown) > int(self._limit):
+                self.counters["increases"] += 1
+            self._limit = grown
+            return
+
+        self.counters[reason] += 1
+        now = self.clock()
+        if self._last_decrease is None or now - self._last_decrease >= (
+            self.latency or 0
+        ):
+            self._limit = max(self._limit * self.backoff, self.minimum)
+            self._last_decrease = now
+            self.counters["decreases"] += 1
+
+    def snapshot(self) -> dict:
+        """Current limit, requests in flight, average latency and counters"""
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "latency": self.latency,
+            **self.counters,
+        }
+
+
+# limits learned per endpoint, so the next activity on this worker starts where the
+# last one ended instead of at ADP_MAX_IN_FLIGHT
+_learned = {}
+_learned_lock = threading.Lock()
+
+
+def get_limiter(endpoint: str, initial=16) -> AdaptiveLimiter:
+    """New limiter for an endpoint starting at the last limit learned for it
+
+    Args:
+        endpoint (str): url or name of the endpoint
+        initial (int, optional): limit when nothing was learned yet. Defaults to 16.
+
+    Returns:
+        AdaptiveLimiter: limiter for one event loop
+    """
+    with _learned_lock:
+        return AdaptiveLimiter(initial=_learned.get(endpoint, initial))
+
+
+def release_limiter(endpoint: str, limiter: AdaptiveLimiter):
+    """Keep the limit learned for an endpoint and log the limiter's counters"""
+    with _learned_lock:
+        _learned[endpoint] = limiter.limit
+    properties = {"custom_dimensions": {"app": "ADP", **limiter.snapshot()}}
+    logger.func(f"ADP limiter for {endpoint}: {limiter.snapshot()}", extra=properties)
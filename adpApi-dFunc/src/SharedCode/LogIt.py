@@ -1,14 +1,22 @@
+import atexit
 import logging
 import os
+import queue
+import random
 import sys
+import threading
+import time
 
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+from SharedCode.Settings import (
+    log_sample_rate,
+    telemetry_batch_size,
+    telemetry_flush_interval,
+    telemetry_queue_size,
+)
 
 # set logging level and target
 func_log_level = logging.INFO + 1
 logging.addLevelName(func_log_level, "FUNC")
-insight_key = os.environ["APPINSIGHTS_INSTRUMENTATIONKEY"]
-application_insights_connection_string = f"InstrumentationKey={insight_key}"
 # log with new logging name
 def log_func_message(self, message, *args, **kwargs):
     if self.isEnabledFor(func_log_level):
@@ -23,17 +31,230 @@ class ApplicationInsightsFilter(logging.Filter):
         return True
 
 
+class LazyAzureHandler(logging.Handler):
+    """Builds the AzureLogHandler, and imports opencensus, when the first record is
+    logged. Without APPINSIGHTS_INSTRUMENTATIONKEY records are left to the other
+    handlers, so the app still imports and runs locally.
+    """
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self._handler = None
+        self._build_lock = threading.Lock()
+
+    @property
+    def handler(self) -> logging.Handler:
+        with self._build_lock:
+            if self._handler is None:
+                insight_key = os.environ.get("APPINSIGHTS_INSTRUMENTATIONKEY")
+                if insight_key:
+                    from opencensus.ext.azure.log_exporter import AzureLogHandler
+
+                    self._handler = AzureLogHandler(
+                        connection_string=f"InstrumentationKey={insight_key}"
+                    )
+                else:
+                    self._handler = logging.NullHandler()
+        return self._handler
+
+    def emit(self, record):
+        self.handler.handle(record)
+
+    def flush(self):
+        if self._handler is not None:
+            self._handler.flush()
+
+    def close(self):
+        if self._handler is not None:
+            self._handler.close()
+        super().close()
+
+
+class HandlerExporter:
+    """Exports batches of records through a logging handler"""
+
+    def __init__(self, handler: logging.Handler):
+        self.handler = handler
+
+    def export(self, records: list):
+        for record in records:
+            self.handler.handle(record)
+
+    def close(self):
+        self.handler.close()
+
+
+class MemoryExporter:
+    """Keeps exported batches in memory, for tests and local runs"""
+
+    def __init__(self):
+        self.batches = []
+
+    @property
+    def records(self) -> list:
+        return [record for batch in self.batches for record in batch]
+
+    def export(self, records: list):
+        self.batches.append(list(records))
+
+    def close(self):
+        pass
+
+
+class TelemetryPipeline(logging.Handler):
+    """Queue records and export them in batches from a background thread
+
+    emit only samples and enqueues, so logging never waits on Application Insights.
+    A batch is exported when it holds batch_size records or flush_interval seconds
+    after its first record. When max_queue records are waiting, new records are
+    dropped and counted instead of blocking the caller.
+
+    Records logged with extra={"sampled": True} are kept with probability
+    sample_rate, records at ERROR and above are always kept.
+    """
+
+    def __init__(
+        self,
+        exporter,
+        max_queue=10000,
+        batch_size=100,
+        flush_interval=2.0,
+        sample_rate=1.0,
+        rng=random.random,
+    ):
+        super().__init__()
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sample_rate = sample_rate
+        self.rng = rng
+        self.dropped = 0
+        self.sampled_out = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+        self._exit_hook = False
+
+    def emit(self, record):
+        if (
+            getattr(record, "sampled", False)
+            and record.levelno < logging.ERROR
+            and self.sample_rate < 1
+        ):
+            if self.rng() >= self.sample_rate:
+                self.sampled_out += 1
+                return
+            # lets Application Insights weight what was kept
+            record.custom_dimensions = {
+                **getattr(record, "custom_dimensions", {}),
+                "sample_rate": self.sample_rate,
+            }
+        try:
+            # resolve the message now, its arguments may change before the export
+            record.msg, record.args = record.getMessage(), None
+        except Exception:
+            self.handleError(record)
+            return
+        if self._flusher is None:
+            self._start_flusher()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_flusher(self):
+        # emit runs on whichever thread logs, only the first one starts the flusher
+        with self._flusher_lock:
+            if self._flusher is None:
+                flusher = threading.Thread(
+                    target=self._run, name="telemetry-flusher", daemon=True
+                )
+                flusher.start()
+                self._flusher = flusher
+
+    def _export(self, batch: list):
+        try:
+            self.exporter.export(batch)
+        except Exception:
+            self.failed += len(batch)
+        batch.clear()
+        if not self._exit_hook:
+            # the exporter may have registered its own exit hook (AzureLogHandler
+            # stops its worker), this one is registered later so it runs first
+            atexit.register(self.flush)
+            self._exit_hook = True
+
+    def _run(self):
+        batch, deadline = [], None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, threading.Event):
+                # flush() marker: everything queued before it has been taken
+                self._export(batch)
+                deadline = None
+                item.set()
+                continue
+            if item is not None:
+                batch.append(item)
+                deadline = deadline or time.monotonic() + self.flush_interval
+            if len(batch) >= self.batch_size or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                self._export(batch)
+                deadline = None
+
+    def flush(self, timeout=5.0) -> bool:
+        """Export everything queued so far
+
+        Returns:
+            bool: False when the flusher did not catch up within timeout seconds
+        """
+        if self._flusher is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def snapshot(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        # logging.shutdown closes every handler at exit, so nothing queued is lost
+        self.flush()
+        self.exporter.close()
+        super().close()
+
+
 # configure the root logger
 logger = logging.getLogger("func")
 logger.setLevel(func_log_level)
 debug_logger = logging.getLogger("func.debug")
 debug_logger.setLevel(logging.DEBUG)
 # configure Azure Handler for FUNC, WARNING, ERROR, CRITICAL LEVELS
-azure_handler = AzureLogHandler(
-    connection_string=application_insights_connection_string
-)
+azure_handler = LazyAzureHandler()
 azure_handler.setLevel(func_log_level)
 azure_handler.addFilter(ApplicationInsightsFilter())
+telemetry = TelemetryPipeline(
+    HandlerExporter(azure_handler),
+    max_queue=telemetry_queue_size,
+    batch_size=telemetry_batch_size,
+    flush_interval=telemetry_flush_interval,
+    sample_rate=log_sample_rate,
+)
+telemetry.setLevel(func_log_level)
 # configure the debug handler
 debug_handler = logging.StreamHandler(sys.stderr)
 debug_handler.setLevel(logging.DEBUG)
@@ -41,5 +262,5 @@ debug_handler.addFilter(lambda record: record.levelno == logging.DEBUG)
 # add handlers
 # logger.addHandler(console_handler)
 logging.Logger.func = log_func_message
-logger.addHandler(azure_handler)
+logger.addHandler(telemetry)
 debug_logger.addHandler(debug_handler)
@@ -0,0 +1,208 @@
+import bisect
+import json
+import re
+import threading
+import time
+
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from SharedCode.LogIt import logger
+from SharedCode.Settings import metrics_export_interval
+
+# upper bounds of the histogram buckets, doubling from a millisecond (or a thousandth
+# of a byte/row) past any duration or payload size an activity sees
+default_bounds = tuple(0.001 * 2**step for step in range(47))
+
+# path segments that identify one worker or request, e.g. an associate oid
+_id_segment = re.compile(r"^(?=.*\d)[\w-]{8,}$")
+
+
+def endpoint_label(url: str) -> str:
+    """url without query and with ids collapsed, so every worker shares one series"""
+    parts = urlsplit(url)
+    path = "/".join(
+        "{id}" if _id_segment.match(segment) else segment
+        for segment in parts.path.split("/")
+    )
+    return f"{parts.scheme}://{parts.netloc}{path}"
+
+
+def payload_bytes(value) -> int:
+    """Size of value as the JSON an activity receives or returns"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_request(method, url, status, seconds, bytes_in=0, bytes_out=0):
+    """Count one HTTP attempt and observe its duration and sizes per endpoint"""
+    endpoint = endpoint_label(url)
+    metrics.count("http.requests", method=method, endpoint=endpoint, status=status)
+    metrics.observe("http.duration_seconds", seconds, method=method, endpoint=endpoint)
+    metrics.observe("http.bytes_in", bytes_in, method=method, endpoint=endpoint)
+    metrics.observe("http.bytes_out", bytes_out, method=method, endpoint=endpoint)
+
+
+class Histogram:
+    """Count, sum, min, max and bucketed distribution of observed values"""
+
+    def __init__(self, bounds=default_bounds):
+        self.bounds = sorted(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th value, capped at max"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, hits in zip(self.bounds, self.buckets):
+            seen += hits
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by name and labels (activity, endpoint, ...)
+
+    Values accumulate until export, which hands a snapshot to the exporter and
+    starts the next interval from zero.
+    """
+
+    def __init__(self, exporter=None, interval=60.0, clock=time.monotonic):
+        self.exporter = exporter
+        self.interval = interval
+        self.clock = clock
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._exported_at = clock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+    def count(self, name: str, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the seconds spent in the with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self, reset=False) -> list:
+        """[{name, labels, type, value or histogram fields}] of the current interval"""
+        with self._lock:
+            counters, histograms = self._counters, self._histograms
+            if reset:
+                self._counters, self._histograms = {}, {}
+                self._exported_at = self.clock()
+        series = [
+            {"name": name, "labels": dict(labels), "type": "counter", "value": value}
+            for (name, labels), value in counters.items()
+        ]
+        series += [
+            {"name": name, "labels": dict(labels), "type": "histogram", **h.snapshot()}
+            for (name, labels), h in histograms.items()
+        ]
+        return series
+
+    def export(self) -> list:
+        """Hand the current interval to the exporter and start a new one"""
+        series = self.snapshot(reset=True)
+        if self.exporter is not None and series:
+            self.exporter.export(series)
+        return series
+
+    def export_due(self):
+        """Export when interval seconds have passed since the last export"""
+        if self.clock() - self._exported_at >= self.interval:
+            self.export()
+
+
+class LogExporter:
+    """Sends one FUNC record per series, its fields as custom dimensions"""
+
+    def export(self, series: list):
+        for metric in series:
+            labels = ",".join(
+                f"{key}={value}" for key, value in metric["labels"].items()
+            )
+            fields = {
+                key: str(value)
+                for key, value in metric.items()
+                if key not in ("name", "labels")
+            }
+            properties = {
+                "custom_dimensions": {
+                    "app": "ADP",
+                    "metric": metric["name"],
+                    **metric["labels"],
+                    **fields,
+                }
+            }
+            logger.func(f"ADP metric {metric['name']} {labels}", extra=properties)
+
+
+class MemoryExporter:
+    """Keeps exported snapshots in memory, for tests"""
+
+    def __init__(self):
+        self.exports = []
+
+    def export(self, series: list):
+        self.exports.append(series)
+
+    def find(self, name: str, **labels) -> list:
+        wanted = {key: str(value) for key, value in labels.items()}
+        return [
+            metric
+            for series in self.exports
+            for metric in series
+            if metric["name"] == name and wanted.items() <= metric["labels"].items()
+        ]
+
+
+metrics = MetricsRegistry(exporter=LogExporter(), interval=metrics_export_interval)
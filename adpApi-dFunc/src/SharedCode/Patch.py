@@ -1,14 +1,24 @@
 import json
 import logging
 import requests
+import threading
+import time
 import traceback
 
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from cryptography.hazmat.primitives import hashes
 from OpenSSL.crypto import PKCS12, X509, PKey
+from requests.exceptions import ConnectionError, Timeout
 from urllib3.contrib import pyopenssl
 
 from SharedCode.Config import adaptive_card, adaptive_card_url
 from SharedCode.Decorate import retry
+from SharedCode.KVAid import cert_cache
 from SharedCode.LogIt import logger
+from SharedCode.Metrics import payload_bytes, record_request
+from SharedCode.Settings import http_pool_size
 
 
 def _is_key_file_encrypted(keyfile):
@@ -47,7 +57,7 @@ class HTTPAdapter(requests.adapters.HTTPAdapter):
                 cert = None
             elif isinstance(cert, tuple) and len(cert) == 2:
                 # X509 and PKey
-                if isinstance(cert[0], X509) and hasattr(cert[1], PKey):
+                if isinstance(cert[0], X509) and isinstance(cert[1], PKey):
                     conn.cert_file = cert[0]
                     conn.key_file = cert[1]
                     cert = None
@@ -55,8 +65,14 @@ class HTTPAdapter(requests.adapters.HTTPAdapter):
                 elif hasattr(cert[0], "public_bytes") and hasattr(
                     cert[1], "private_bytes"
                 ):
-                    conn.cert_file = X509.from_cryptography(cert[0])
-                    conn.key_file = PKey.from_cryptography_key(cert[1])
+                    # reuse the conversion made by KVAid.load_credentials
+                    material = cert_cache.find(cert[0], cert[1])
+                    if material is not None:
+                        conn.cert_file = material.x509
+                        conn.key_file = material.pkey
+                    else:
+                        conn.cert_file = X509.from_cryptography(cert[0])
+                        conn.key_file = PKey.from_cryptography_key(cert[1])
                     cert = None
         super().cert_verify(conn, url, verify, cert)
 
@@ -73,7 +89,12 @@ def patch_requests(adapter=True):
     session.mount('https', HTTPAdapter())
     session.get('https://httpbin.org/get')
     """
-    if hasattr(requests.packages.urllib3.util.ssl_, "_is_key_file_encrypted"):
+    ssl_ = requests.packages.urllib3.util.ssl_
+    # patching twice would make _is_key_file_encrypted call itself
+    if (
+        hasattr(ssl_, "_is_key_file_encrypted")
+        and ssl_._is_key_file_encrypted is not _is_key_file_encrypted
+    ):
         _is_key_file_encrypted.original = (
             requests.packages.urllib3.util.ssl_._is_key_file_encrypted
         )
@@ -85,8 +106,146 @@ def patch_requests(adapter=True):
         requests.sessions.HTTPAdapter = HTTPAdapter
 
 
+def credential_fingerprint(cert=None) -> str:
+    """SHA256 fingerprint of the client certificate in a requests cert argument
+
+    Args:
+        cert (tuple, optional): (certificate, key) as cryptography or pyOpenSSL objects
+
+    Returns:
+        str: hex fingerprint, "anonymous" when no certificate is given
+    """
+    if not cert:
+        return "anonymous"
+    certificate = cert[0] if isinstance(cert, tuple) else cert
+    if isinstance(certificate, PKCS12):
+        certificate = certificate.get_certificate()
+    if isinstance(certificate, X509):
+        return certificate.digest("sha256").decode()
+    return certificate.fingerprint(hashes.SHA256()).hex()
+
+
+class SessionPool:
+    """Process-wide requests sessions keyed by client certificate fingerprint.
+
+    A session keeps its connections (and their TLS handshakes) alive between activity
+    invocations that run in the same worker process. Sessions are safe to share
+    between threads; once more than max_sessions certificates are in use the least
+    recently used session leaves the pool, and is closed as soon as no request holds
+    a lease on it.
+
+    Adapters do not retry, every request goes through a RetryPolicy instead.
+    """
+
+    def __init__(self, pool_size=32, max_sessions=4):
+        self.pool_size = pool_size
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._leases = Counter()
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            pool_block=True,
+        )
+        session.mount("https://", adapter)
+        return session
+
+    def _evict(self) -> list:
+        """Drop the sessions beyond max_sessions from the pool, under the lock
+
+        Returns:
+            list: evicted sessions nobody holds, for the caller to close
+        """
+        idle = []
+        while len(self._sessions) > self.max_sessions:
+            _, session = self._sessions.popitem(last=False)
+            if self._leases[id(session)]:
+                self._retired[id(session)] = session
+            else:
+                idle.append(session)
+        return idle
+
+    @contextmanager
+    def lease(self, cert=None):
+        """Session for the given requests cert argument, created on first use
+
+        The session stays open until the block exits, even when it is evicted
+        meanwhile.
+
+        Args:
+            cert (tuple, optional): (certificate, key). Defaults to None.
+
+        Yields:
+            requests.Session: pooled session
+        """
+        fingerprint = credential_fingerprint(cert)
+        with self._lock:
+            session = self._sessions.get(fingerprint)
+            if session is None:
+                session = self._new_session()
+                self._sessions[fingerprint] = session
+            else:
+                self._sessions.move_to_end(fingerprint)
+            self._leases[id(session)] += 1
+            idle = self._evict()
+        for stale in idle:
+            stale.close()
+
+        try:
+            yield session
+        finally:
+            retired = None
+            with self._lock:
+                self._leases[id(session)] -= 1
+                if not self._leases[id(session)]:
+                    del self._leases[id(session)]
+                    retired = self._retired.pop(id(session), None)
+            if retired is not None:
+                retired.close()
+
+    def clear(self):
+        """Close every pooled session, leased ones once they are released"""
+        with self._lock:
+            max_sessions, self.max_sessions = self.max_sessions, 0
+            idle = self._evict()
+            self.max_sessions = max_sessions
+        for session in idle:
+            session.close()
+
+
+# patch once per worker process rather than on every request
+patch_requests(adapter=False)
+sessions = SessionPool(pool_size=http_pool_size)
+
+
+def _send(method, url, cert=None, **kwargs):
+    """One request on the pooled session, recorded in the metrics whatever happens"""
+    started = time.perf_counter()
+    response = None
+    try:
+        with sessions.lease(cert) as session:
+            response = getattr(session, method)(url=url, cert=cert, **kwargs)
+        return response
+    finally:
+        record_request(
+            method.upper(),
+            url,
+            getattr(response, "status_code", "error"),
+            time.perf_counter() - started,
+            bytes_in=payload_bytes(getattr(response, "content", None)),
+            bytes_out=payload_bytes(
+                getattr(getattr(response, "request", None), "body", None)
+            ),
+        )
+
+
 # Build in retries for all post requests
-@retry()
+@retry(exceptions=(ConnectionError, Timeout))
 def post_request(url, headers, cert=None, auth=None, data=None, module_name=None):
     """post request with built in Retries and Error Propagation from retry decorator
 
@@ -96,12 +255,11 @@ def post_request(url, headers, cert=None, auth=None, data=None, module_name=None
     Returns:
         _type_: response
     """
-    patch_requests()
-    return requests.post(url=url, headers=headers, cert=cert, auth=auth, data=data)
+    return _send("post", url, headers=headers, cert=cert, auth=auth, data=data)
 
 
 # Build in retries for all get requests
-@retry(max_tries=12, delay_seconds=3)
+@retry(exceptions=(ConnectionError, Timeout))
 def get_request(
     url, headers, params=None, cert=None, auth=None, data=None, module_name=None
 ):
@@ -113,9 +271,8 @@ def get_request(
     Returns:
         _type_: response
     """
-    patch_requests()
-    return requests.get(
-        url=url, headers=headers, params=params, auth=auth, cert=cert, data=data
+    return _send(
+        "get", url, headers=headers, params=params, auth=auth, cert=cert, data=data
     )
 
 
@@ -146,7 +303,7 @@ def teams_notification(status, params, base_card=adaptive_card, url=adaptive_car
     ][0]["content"]["body"][3]["text"].format(message=status["message"])
 
     try:
-        r = requests.post(url=url, data=json.dumps(base_card), headers=headers)
+        r = post_request(url=url, data=json.dumps(base_card), headers=headers)
     except Exception as er:
         logging.debug(f"error {str(er)}")
         logger.exception(
@@ -0,0 +1,293 @@
+import json
+import os
+import tempfile
+import uuid
+
+from itertools import chain
+
+from SharedCode import Settings
+from SharedCode.LogIt import logger
+
+
+def is_ref(payload) -> bool:
+    """True when payload is a reference written by PayloadStore.put"""
+    return isinstance(payload, dict) and "payload_ref" in payload
+
+
+class PayloadStore:
+    """Claim-check store for payloads too large to carry through Durable history.
+
+    put() writes a payload and returns a small reference. Lists are split into chunks
+    of chunk_size items, so readers only load the chunks they need. Backends implement
+    _write and _read for a single chunk.
+    """
+
+    name = None
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+
+    def _write(self, path: str, data: bytes):
+        raise NotImplementedError
+
+    def _read(self, path: str) -> bytes:
+        raise NotImplementedError
+
+    def _delete(self, path: str):
+        raise NotImplementedError
+
+    def put(self, payload) -> dict:
+        """Write a payload and return its reference
+
+        Args:
+            payload (list or dict): JSON serializable payload
+
+        Returns:
+            dict: {payload_ref, store, chunks, count, chunk_size}
+        """
+        key = uuid.uuid4().hex
+        if isinstance(payload, list):
+            chunks = [
+                payload[start : start + self.chunk_size]
+                for start in range(0, len(payload), self.chunk_size)
+            ]
+            count = len(payload)
+        else:
+            chunks = [payload]
+            count = None
+        for number, chunk in enumerate(chunks):
+            self._write(f"{key}/{number:05d}.json", json.dumps(chunk).encode())
+        return {
+            "payload_ref": key,
+            "store": self.name,
+            "chunks": len(chunks),
+            "count": count,
+            "chunk_size": self.chunk_size,
+        }
+
+    def iter_chunks(self, ref: dict, first=0, last=None):
+        """Lazily read the chunks of a reference
+
+        Args:
+            ref (dict): reference from put
+            first (int, optional): first chunk to read. Defaults to 0.
+            last (int, optional): chunk to stop before. Defaults to all chunks.
+
+        Yields:
+            list or dict: chunk
+        """
+        last = ref["chunks"] if last is None else min(last, ref["chunks"])
+        for number in range(first, last):
+            yield json.loads(self._read(f"{ref['payload_ref']}/{number:05d}.json"))
+
+    def get(self, ref: dict, start=None, stop=None):
+        """Read a payload back, optionally only the items start:stop of a list
+
+        Args:
+            ref (dict): reference from put
+            start (int, optional): first item. Defaults to None.
+            stop (int, optional): item to stop before. Defaults to None.
+
+        Returns:
+            list or dict: payload
+        """
+        if ref["count"] is None:
+            return next(self.iter_chunks(ref))
+        start = start or 0
+        stop = ref["count"] if stop is None else min(stop, ref["count"])
+        if start >= stop:
+            return []
+        size = ref["chunk_size"]
+        first, last = start // size, (stop - 1) // size + 1
+        items = list(chain.from_iterable(self.iter_chunks(ref, first, last)))
+        offset = first * size
+        return items[start - offset : stop - offset]
+
+    def delete(self, ref: dict):
+        for number in range(ref["chunks"]):
+            self._delete(f"{ref['payload_ref']}/{number:05d}.json")
+
+
+class LocalPayloadStore(PayloadStore):
+    """Payloads on the local filesystem, visible to one instance. Meant for testing."""
+
+    name = "local"
+
+    def __init__(self, root=None, chunk_size=1000):
+        super().__init__(chunk_size)
+        self.root = root or os.path.join(tempfile.gettempdir(), "adp-payloads")
+
+    def _write(self, path, data):
+        full_path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb") as chunk:
+            chunk.write(data)
+
+    def _read(self, path):
+        with open(os.path.join(self.root, path), "rb") as chunk:
+            return chunk.read()
+
+    def _delete(self, path):
+        full_path = os.path.join(self.root, path)
+        os.remove(full_path)
+        if not os.listdir(os.path.dirname(full_path)):
+            os.rmdir(os.path.dirname(full_path))
+
+
+class BlobPayloadStore(PayloadStore):
+    """Payloads in an Azure Storage container shared by every instance of the app"""
+
+    name = "blob"
+
+    def __init__(self, connection_string, container, chunk_size=1000):
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.blob import BlobServiceClient
+
+        super().__init__(chunk_size)
+        service = BlobServiceClient.from_connection_string(connection_string)
+        self.container = service.get_container_client(container)
+        try:
+            self.container.create_container()
+        except ResourceExistsError:
+            pass
+
+    def _write(self, path, data):
+        self.container.upload_blob(path, data, overwrite=True)
+
+    def _read(self, path):
+        return self.container.download_blob(path).readall()
+
+    def _delete(self, path):
+        self.container.delete_blob(path)
+
+
+_stores = {}
+
+
+def get_store(name=None) -> PayloadStore:
+    """Configured payload store for this worker process
+
+    Args:
+        name (str, optional): backend name. Defaults to ADP_PAYLOAD_STORE.
+
+    Returns:
+        PayloadStore: store or None when payloads are kept inline
+    """
+    name = Settings.payload_store if name is None else name
+    if not name:
+        return None
+    if name not in _stores:
+        if name == "local":
+            _stores[name] = LocalPayloadStore(
+                Settings.payload_path or None, Settings.payload_chunk_size
+            )
+        elif name == "blob":
+            _stores[name] = BlobPayloadStore(
+                os.environ["AzureWebJobsStorage"],
+                Settings.payload_container,
+                Settings.payload_chunk_size,
+            )
+        else:
+            raise ValueError(f"Unknown payload store: {name}")
+    return _stores[name]
+
+
+def offload(payload):
+    """Write payload to the configured store, or return it as is when there is none"""
+    store = get_store()
+    return payload if store is None else store.put(payload)
+
+
+def resolve(payload):
+    """Read a reference (or a view of one) back, anything else is returned unchanged"""
+    if not is_ref(payload):
+        return payload
+    return get_store(payload["store"]).get(
+        payload, payload.get("start"), payload.get("stop")
+    )
+
+
+def delete_payloads(refs: list) -> int:
+    """Delete the payloads behind refs once nothing reads them any more
+
+    Views of the same payload are deleted once. A payload that cannot be deleted is
+    logged and skipped, so one failure does not keep the others in the store.
+
+    Args:
+        refs (list): references and views of references
+
+    Returns:
+        int: payloads deleted
+    """
+    deleted = 0
+    for ref in {ref["payload_ref"]: ref for ref in refs}.values():
+        try:
+            get_store(ref["store"]).delete(ref)
+            deleted += 1
+        except Exception as er:
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.warning(
+                f"Could not delete payload {ref['payload_ref']}: {str(er)}",
+                extra=properties,
+            )
+    return deleted
+
+
+# The helpers below never touch the store, so orchestrations can use them on replay.
+
+
+def payload_len(payload) -> int:
+    """Number of items in a list or in a view of a referenced list"""
+    if not is_ref(payload):
+        return len(payload or [])
+    return payload.get("stop", payload["count"]) - payload.get("start", 0)
+
+
+def payload_slice(payload, start: int, stop: int):
+    """Items start:stop of a list, or the equivalent view of a referenced list"""
+    if not is_ref(payload):
+        return payload[start:stop]
+    offset = payload.get("start", 0)
+    end = payload.get("stop", payload["count"])
+    return {
+        **payload,
+        "start": min(offset + start, end),
+        "stop": min(offset + stop, end),
+    }
+
+
+def payload_refs(payload) -> list:
+    """References held by an activity result: the result, its items or its values"""
+    if is_ref(payload):
+        return [payload]
+    items = payload.values() if isinstance(payload, dict) else payload or []
+    return [item for item in items if is_ref(item)]
+
+
+def extend_records(records: list, payload):
+    """Add an activity result to an accumulated list, keeping references as is"""
+    if is_ref(payload):
+        records.append(payload)
+    else:
+        records.extend(payload or [])
+
+
+def iter_records(items):
+    """Lazily iterate records from a list mixing records and references to record lists
+
+    Args:
+        items (list or dict): records, references, or a reference to records
+
+    Yields:
+        object: record
+    """
+    if is_ref(items):
+        items = [items]
+    for item in items or []:
+        if not is_ref(item):
+            yield item
+        elif "start" in item:
+            yield from resolve(item)
+        else:
+            for chunk in get_store(item["store"]).iter_chunks(item):
+                yield from chunk
@@ -0,0 +1,68 @@
+import asyncio
+
+from functools import wraps
+
+_done = object()
+
+
+def in_thread(func):
+    """Run a blocking stage (CPU work, database writes) off the event loop"""
+
+    @wraps(func)
+    async def wrapper(item):
+        return await asyncio.to_thread(func, item)
+
+    return wrapper
+
+
+async def run_pipeline(source, stages: list, maxsize=2) -> int:
+    """Push every item of source through stages, each stage running concurrently
+
+    Stages are linked by queues holding at most maxsize items, so a slow stage
+    pauses the ones before it instead of letting items pile up in memory. The
+    first failure cancels every stage and is raised.
+
+    Args:
+        source (async iterable): produces the items
+        stages (list): async callables taking an item and returning the next stage's
+        item, the return of the last one is discarded
+        maxsize (int, optional): items buffered between stages. Defaults to 2.
+
+    Returns:
+        int: items that went through every stage
+    """
+    queues = [asyncio.Queue(maxsize) for _ in stages]
+    finished = 0
+
+    async def produce():
+        async for item in source:
+            await queues[0].put(item)
+        await queues[0].put(_done)
+
+    async def work(number, stage):
+        nonlocal finished
+        outbox = queues[number + 1] if number + 1 < len(stages) else None
+        while True:
+            item = await queues[number].get()
+            if item is _done:
+                break
+            result = await stage(item)
+            if outbox is None:
+                finished += 1
+            else:
+                await outbox.put(result)
+        if outbox is not None:
+            await outbox.put(_done)
+
+    tasks = [asyncio.ensure_future(produce())] + [
+        asyncio.ensure_future(work(number, stage))
+        for number, stage in enumerate(stages)
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return finished
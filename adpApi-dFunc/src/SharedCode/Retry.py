@@ -0,0 +1,323 @@
+import asyncio
+import random
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlsplit
+
+from SharedCode.LogIt import logger
+from SharedCode.Metrics import endpoint_label, metrics
+from SharedCode.Settings import (
+    breaker_reset,
+    breaker_threshold,
+    retry_base_delay,
+    retry_max_delay,
+    retry_max_tries,
+)
+
+# 408 timeout, 425 too early, 429 throttled and the transient server errors
+retryable_statuses = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, endpoint, retry_in):
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+    def __str__(self):
+        return (
+            f"Circuit open for {self.endpoint}, "
+            f"retrying in {self.retry_in:.1f} seconds."
+        )
+
+
+class CircuitBreaker:
+    """Fails fast once an endpoint has failed failure_threshold times in a row.
+
+    After reset_timeout seconds one trial call is let through (half open), its
+    success closes the circuit again, its failure reopens it.
+    """
+
+    def __init__(
+        self, endpoint, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic
+    ):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self.trial:
+                self.trial = True
+                return
+            retry_in = max(self.reset_timeout - (self.clock() - self.opened_at), 0)
+            raise CircuitOpenError(self.endpoint, retry_in)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.trial = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    """Process wide circuit breaker of an endpoint (scheme and host of a url)"""
+    parts = urlsplit(endpoint)
+    key = f"{parts.scheme}://{parts.netloc}" if parts.netloc else endpoint
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(key, breaker_threshold, breaker_reset)
+        return _breakers[key]
+
+
+def _status(response):
+    # requests responses have status_code, aiohttp responses have status
+    return getattr(response, "status_code", getattr(response, "status", None))
+
+
+def retry_after(response) -> float:
+    """Seconds asked for by a Retry-After header (delta or HTTP date), or None"""
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryPolicy:
+    """Retries a call with exponential backoff and full jitter
+
+    A call is retried when it raises one of retry_exceptions, when the response has
+    one of retry_statuses, or when retry_if(response) is true. Retry-After on a
+    response is honoured (up to max_delay). The last response is returned once the
+    tries run out, the last exception is raised. Exceptions (retried or not) and
+    retryable statuses count against the circuit breaker of their endpoint,
+    responses retried only for retry_if do not.
+
+    Use call/call_async directly or the policy as a decorator on a function taking a
+    url keyword.
+    """
+
+    def __init__(
+        self,
+        max_tries=retry_max_tries,
+        base_delay=retry_base_delay,
+        max_delay=retry_max_delay,
+        retry_statuses=retryable_statuses,
+        retry_exceptions=(Exception,),
+        jitter=True,
+        breaker=True,
+    ):
+        self.max_tries = max_tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.jitter = jitter
+        self.breaker = breaker
+
+    def delay(self, attempt: int, response=None) -> float:
+        """Seconds to wait after the given (1 based) failed attempt"""
+        asked = retry_after(response) if response is not None else None
+        if asked is not None:
+            return min(asked, self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+
+    def _breaker(self, endpoint):
+        return get_breaker(endpoint) if self.breaker and endpoint else None
+
+    def _count(self, breaker, response):
+        # only retryable statuses say the endpoint is failing, a response retried
+        # for retry_if (an empty body) still came from a healthy endpoint
+        if _status(response) in self.retry_statuses:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _failed(self, response, retry_if) -> bool:
+        return _status(response) in self.retry_statuses or bool(
+            retry_if and retry_if(response)
+        )
+
+    def _log(self, attempt, module_name, reason):
+        if attempt == self.max_tries:
+            logger.critical(
+                f"Reached max retry attempts.\n\n\
+                ERROR: {reason}."
+            )
+        else:
+            # one per retried request, sampled by ADP_LOG_SAMPLE_RATE
+            logger.warning(
+                f"HTTP Request from {module_name}: "
+                f"attempt number {attempt + 1}. {reason}",
+                extra={"sampled": True},
+            )
+
+    def _record(self, endpoint, module_name, retries, slept):
+        if retries:
+            label = endpoint_label(endpoint) if endpoint else str(module_name)
+            metrics.count("http.retries", retries, endpoint=label)
+            metrics.observe("http.retry_sleep_seconds", slept, endpoint=label)
+
+    def call(
+        self, func, *args, endpoint=None, retry_if=None, module_name=None, **kwargs
+    ):
+        """Call func until it succeeds or the tries run out
+
+        Args:
+            func (callable): function to call with args and kwargs
+            endpoint (str, optional): url of the circuit breaker. Defaults to None.
+            retry_if (callable, optional): response -> retry it. Defaults to None.
+            module_name (str, optional): caller named in the logs. Defaults to None.
+
+        Returns:
+            object: func's result
+        """
+        breaker = self._breaker(endpoint)
+        retries = slept = 0
+        try:
+            for attempt in range(1, self.max_tries + 1):
+                if breaker:
+                    breaker.before_call()
+                try:
+                    response = func(*args, **kwargs)
+                except self.retry_exceptions as er:
+                    if breaker:
+                        breaker.record_failure()
+                    self._log(attempt, module_name, str(er))
+                    if attempt == self.max_tries or isinstance(er, CircuitOpenError):
+                        raise
+                    wait = self.delay(attempt)
+                    time.sleep(wait)
+                    retries, slept = retries + 1, slept + wait
+                    continue
+                except BaseException:
+                    # anything else (a cancelled task included) still ends a half
+                    # open trial, or the circuit would wait for its outcome forever
+                    if breaker:
+                        breaker.record_failure()
+                    raise
+                if not self._failed(response, retry_if):
+                    if breaker:
+                        breaker.record_success()
+                    return response
+                if breaker:
+                    self._count(breaker, response)
+                self._log(attempt, module_name, f"status {_status(response)}")
+                if attempt == self.max_tries:
+                    return response
+                wait = self.delay(attempt, response)
+                time.sleep(wait)
+                retries, slept = retries + 1, slept + wait
+        finally:
+            self._record(endpoint, module_name, retries, slept)
+
+    async def call_async(
+        self, func, *args, endpoint=None, retry_if=None, module_name=None, **kwargs
+    ):
+        """Async variant of call, func returns an awaitable"""
+        breaker = self._breaker(endpoint)
+        retries = slept = 0
+        try:
+            for attempt in range(1, self.max_tries + 1):
+                if breaker:
+                    breaker.before_call()
+                try:
+                    response = await func(*args, **kwargs)
+                except self.retry_exceptions as er:
+                    if breaker:
+                        breaker.record_failure()
+                    self._log(attempt, module_name, str(er))
+                    if attempt == self.max_tries or isinstance(er, CircuitOpenError):
+                        raise
+                    wait = self.delay(attempt)
+                    await asyncio.sleep(wait)
+                    retries, slept = retries + 1, slept + wait
+                    continue
+                except BaseException:
+                    # anything else (a cancelled task included) still ends a half
+                    # open trial, or the circuit would wait for its outcome forever
+                    if breaker:
+                        breaker.record_failure()
+                    raise
+                if not self._failed(response, retry_if):
+                    if breaker:
+                        breaker.record_success()
+                    return response
+                if breaker:
+                    self._count(breaker, response)
+                self._log(attempt, module_name, f"status {_status(response)}")
+                if attempt == self.max_tries:
+                    return response
+                wait = self.delay(attempt, response)
+                await asyncio.sleep(wait)
+                retries, slept = retries + 1, slept + wait
+        finally:
+            self._record(endpoint, module_name, retries, slept)
+
+    def __call__(self, func):
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def wrapper_async(*args, module_name=None, **kwargs):
+                return await self.call_async(
+                    func,
+                    *args,
+                    endpoint=kwargs.get("url"),
+                    module_name=module_name,
+                    **kwargs,
+                )
+
+            return wrapper_async
+
+        @wraps(func)
+        def wrapper(*args, module_name=None, **kwargs):
+            return self.call(
+                func,
+                *args,
+                endpoint=kwargs.get("url"),
+                module_name=module_name,
+                **kwargs,
+            )
+
+        return wrapper
@@ -0,0 +1,110 @@
+import os
+
+# Tunables read from the function app settings (local.settings.json locally).
+# Defaults are what the app runs with when a setting is absent.
+
+# custom attribute gathering
+custom_batch_size = int(os.environ.get("ADP_CUSTOM_BATCH_SIZE", 250))
+custom_batches = int(os.environ.get("ADP_CUSTOM_BATCHES", 4))
+max_in_flight = int(os.environ.get("ADP_MAX_IN_FLIGHT", 16))
+
+# the adaptive limiter starts at max_in_flight requests in flight and moves between
+# limit_min and limit_max, responses slower than latency_target seconds count as
+# congestion
+limit_min = int(os.environ.get("ADP_LIMIT_MIN", 2))
+limit_max = int(os.environ.get("ADP_LIMIT_MAX", 64))
+latency_target = float(os.environ.get("ADP_LATENCY_TARGET", 5.0))
+
+# CheckNoneWorkers re-fetches workers that came back empty up to repair_attempts
+# times, waiting about repair_backoff * 2^n seconds between tries
+repair_attempts = int(os.environ.get("ADP_REPAIR_ATTEMPTS", 4))
+repair_backoff = float(os.environ.get("ADP_REPAIR_BACKOFF", 1.0))
+
+# base worker gathering, $skip windows requested in parallel when the headcount
+# is unknown
+base_pages = int(os.environ.get("ADP_BASE_PAGES", 4))
+
+# HTTP retries: exponential backoff with jitter starting at retry_base_delay seconds,
+# capped at retry_max_delay. An endpoint failing breaker_threshold times in a row is
+# skipped for breaker_reset seconds.
+retry_max_tries = int(os.environ.get("ADP_RETRY_MAX_TRIES", 6))
+retry_base_delay = float(os.environ.get("ADP_RETRY_BASE_DELAY", 0.5))
+retry_max_delay = float(os.environ.get("ADP_RETRY_MAX_DELAY", 20))
+breaker_threshold = int(os.environ.get("ADP_BREAKER_THRESHOLD", 5))
+breaker_reset = float(os.environ.get("ADP_BREAKER_RESET", 30))
+
+# SQLite cache of custom attribute responses, revalidated with ETag/Last-Modified.
+# Off unless a file name is set: the bodies hold worker PII and are stored
+# unencrypted in the temp directory. Responses without validators are reused for
+# http_cache_ttl seconds (0 always refetches them). Entries not revalidated for
+# http_cache_max_age seconds are deleted, and the oldest beyond
+# http_cache_max_entries.
+http_cache_path = os.environ.get("ADP_HTTP_CACHE", "")
+http_cache_ttl = int(os.environ.get("ADP_HTTP_CACHE_TTL", 0))
+http_cache_max_age = int(os.environ.get("ADP_HTTP_CACHE_MAX_AGE", 86400))
+http_cache_max_entries = int(os.environ.get("ADP_HTTP_CACHE_MAX_ENTRIES", 100000))
+
+# seconds Key Vault secrets and certificates are reused by warm invocations, a newer
+# version replaces the cached one whenever it is fetched
+kv_cache_ttl = int(os.environ.get("ADP_KV_CACHE_TTL", 900))
+
+# connections kept alive per pooled requests session
+http_pool_size = int(os.environ.get("ADP_HTTP_POOL_SIZE", 32))
+
+# seconds before expiry at which an ADP bearer token is replaced
+token_refresh_margin = int(os.environ.get("ADP_TOKEN_REFRESH_MARGIN", 300))
+
+# claim-check store for large orchestration payloads: "" keeps payloads inline,
+# "local" writes under ADP_PAYLOAD_PATH (single instance/testing), "blob" writes to
+# ADP_PAYLOAD_CONTAINER in the AzureWebJobsStorage account
+payload_store = os.environ.get("ADP_PAYLOAD_STORE", "")
+payload_path = os.environ.get("ADP_PAYLOAD_PATH", "")
+payload_container = os.environ.get("ADP_PAYLOAD_CONTAINER", "adp-payloads")
+payload_chunk_size = int(os.environ.get("ADP_PAYLOAD_CHUNK_SIZE", 1000))
+
+# how LoadEDW writes adp.stg_hr_workers: "truncate" reloads every worker, "delta"
+# only writes the rows that changed, "swap" loads a shadow copy and renames it into
+# place, "parallel" does the same with load_partitions writers at once, "stream"
+# fetches, formats and loads page by page in StreamSyncWorkers. A stream run is a
+# single activity bound by functionTimeout in host.json, 10 minutes at most on the
+# Consumption plan; larger tenants need a Premium or Dedicated plan with a longer
+# functionTimeout, or one of the orchestrated modes
+load_mode = os.environ.get("ADP_LOAD_MODE", "truncate")
+
+# writers of the "parallel" load mode, each holds one pooled connection, so at most
+# db_pool_size + db_max_overflow are used
+load_partitions = int(os.environ.get("ADP_LOAD_PARTITIONS", 4))
+
+# EDW engines are shared by the activities on a worker: db_pool_size connections stay
+# open (plus up to db_max_overflow on demand), each is pinged before use and reopened
+# after db_pool_recycle seconds. db_pool_timeout is the wait for a free connection.
+db_pool_size = int(os.environ.get("ADP_DB_POOL_SIZE", 5))
+db_max_overflow = int(os.environ.get("ADP_DB_MAX_OVERFLOW", 5))
+db_pool_timeout = int(os.environ.get("ADP_DB_POOL_TIMEOUT", 30))
+db_pool_recycle = int(os.environ.get("ADP_DB_POOL_RECYCLE", 1800))
+
+# how rows are written to the EDW: "executemany", "tvp" (needs ADP_TVP_TYPE to exist
+# in the target schema) or "to_sql"
+bulk_strategy = os.environ.get("ADP_BULK_STRATEGY", "executemany")
+tvp_type = os.environ.get("ADP_TVP_TYPE", "stg_hr_workers_type")
+
+# compression of columnar frames passed between activities: "" or "zlib"
+wire_codec = os.environ.get("ADP_WIRE_CODEC", "")
+
+# pages buffered between the stages of StreamSyncWorkers
+stream_queue_size = int(os.environ.get("ADP_STREAM_QUEUE_SIZE", 2))
+
+# telemetry is queued and exported to Application Insights by a background thread in
+# batches of telemetry_batch_size, or every telemetry_flush_interval seconds. When
+# telemetry_queue_size records are waiting new ones are dropped. High-volume records
+# (activity start/end, per-request retries) are kept with probability log_sample_rate.
+telemetry_queue_size = int(os.environ.get("ADP_TELEMETRY_QUEUE_SIZE", 10000))
+telemetry_batch_size = int(os.environ.get("ADP_TELEMETRY_BATCH_SIZE", 100))
+telemetry_flush_interval = float(os.environ.get("ADP_TELEMETRY_FLUSH_INTERVAL", 2.0))
+log_sample_rate = float(os.environ.get("ADP_LOG_SAMPLE_RATE", 1.0))
+
+# seconds between exports of the per-activity and per-endpoint metrics
+metrics_export_interval = float(os.environ.get("ADP_METRICS_INTERVAL", 60))
+# measuring an activity's input and output serializes them to JSON, so the bytes in and
+# out of an activity are only measured for this fraction of its invocations
+payload_sample_rate = float(os.environ.get("ADP_PAYLOAD_SAMPLE_RATE", 0.05))
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from SharedCode.BulkLoad import ToSqlWriter
+from SharedCode.DeltaSync import row_hashes
+from SharedCode.Lazy import lazy_import
+from SharedCode.LogIt import logger
+
+pd = lazy_import("pandas")
+sqlalchemy = lazy_import("sqlalchemy")
+
+
+def _quoted(connection, table: str, schema=None) -> str:
+    preparer = connection.dialect.identifier_preparer
+    quoted = preparer.quote(table)
+    return f"{preparer.quote_schema(schema)}.{quoted}" if schema else quoted
+
+
+def _index_name(connection, name: str) -> str:
+    # SQL Server scopes index names to their table, elsewhere the shadow's indexes
+    # need names of their own, alternating between loads
+    if connection.dialect.name == "mssql":
+        return name
+    return name[: -len("__swap")] if name.endswith("__swap") else f"{name}__swap"
+
+
+def rename_table(connection, table: str, new_name: str, schema=None):
+    """Rename table within its schema, inside the caller's transaction"""
+    if connection.dialect.name == "mssql":
+        source = f"{schema}.{table}" if schema else table
+        connection.execute(
+            sqlalchemy.text("EXEC sp_rename :source, :new_name"),
+            {"source": source, "new_name": new_name},
+        )
+    else:
+        preparer = connection.dialect.identifier_preparer
+        connection.execute(
+            sqlalchemy.text(
+                f"ALTER TABLE {_quoted(connection, table, schema)} "
+                f"RENAME TO {preparer.quote(new_name)}"
+            )
+        )
+
+
+def drop_table(connection, table: str, schema=None):
+    if sqlalchemy.inspect(connection).has_table(table, schema=schema):
+        connection.execute(
+            sqlalchemy.text(f"DROP TABLE {_quoted(connection, table, schema)}")
+        )
+
+
+def create_shadow(connection, table: str, shadow: str, schema=None):
+    """Create shadow with table's columns, but neither its primary key nor its indexes
+
+    SQLite cannot add a primary key to an existing table, there the shadow gets it
+    when it is created.
+
+    Raises:
+        ValueError: table has an IDENTITY column, which a reload would renumber
+
+    Returns:
+        tuple: (shadow Table, indexes to build on it once it is loaded, primary key
+        columns)
+    """
+    target = sqlalchemy.Table(
+        table, sqlalchemy.MetaData(), schema=schema, autoload_with=connection
+    )
+    identity = [column.name for column in target.columns if column.identity is not None]
+    if identity:
+        raise ValueError(
+            f"Cannot swap {table}, its IDENTITY column {', '.join(identity)} would be "
+            "renumbered. Load it with another mode."
+        )
+    metadata = sqlalchemy.MetaData()
+    columns = [
+        sqlalchemy.Column(
+            column.name,
+            column.type,
+            nullable=column.nullable,
+            server_default=column.server_default,
+        )
+        for column in target.columns
+    ]
+    key = [column.name for column in target.primary_key.columns]
+    if key and connection.dialect.name == "sqlite":
+        columns.append(sqlalchemy.PrimaryKeyConstraint(*key))
+    shadow_table = sqlalchemy.Table(shadow, metadata, *columns, schema=schema)
+    shadow_table.create(connection)
+
+    indexes = [
+        sqlalchemy.Index(
+            _index_name(connection, index.name),
+            *[shadow_table.c[column.name] for column in index.columns],
+            unique=index.unique,
+        )
+        for index in target.indexes
+    ]
+    return shadow_table, indexes, key
+
+
+def add_primary_key(connection, table: str, key: list, schema=None):
+    """Add an unnamed primary key, so it cannot clash with another table's constraint"""
+    if not key or connection.dialect.name == "sqlite":
+        return
+    preparer = connection.dialect.identifier_preparer
+    columns = ", ".join(preparer.quote(column) for column in key)
+    target = _quoted(connection, table, schema)
+    connection.execute(
+        sqlalchemy.text(f"ALTER TABLE {target} ADD PRIMARY KEY ({columns})")
+    )
+
+
+def write_partitions(
+    engine,
+    writer,
+    df: pd.DataFrame,
+    table: str,
+    schema=None,
+    partitions=1,
+    key=(),
+) -> list:
+    """Write df in contiguous partitions, each over its own pooled connection
+
+    Partitions are written by threads at the same time (the driver releases the GIL
+    while the database works), each in its own transaction. Rows are ordered by key
+    first, so partitions fill separate ranges of a clustered index. When a partition
+    fails, the ones not started yet are cancelled and the first error is raised once
+    the running ones finished; the caller discards the table.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): database, with a pool of at least
+        partitions connections
+        writer (BulkLoad.BulkWriter): writes each partition
+        df (pd.DataFrame): rows to write
+        table (str): target table
+        schema (str, optional): target schema. Defaults to None.
+        partitions (int, optional): concurrent writers. Defaults to 1.
+        key (tuple, optional): columns to order rows by. Defaults to ().
+
+    Returns:
+        list: [{partition, rows, seconds}]
+    """
+    key = [column for column in key if column in df.columns]
+    if key:
+        df = df.sort_values(key, kind="stable")
+    count = max(1, min(partitions, len(df)))
+    bounds = [len(df) * number // count for number in range(count + 1)]
+    parts = [df.iloc[bounds[number] : bounds[number + 1]] for number in range(count)]
+
+    def write(number, part):
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            rows = writer.write(connection, part, table=table, schema=schema)
+        return {
+            "partition": number,
+            "rows": rows,
+            "seconds": time.perf_counter() - started,
+        }
+
+    if count == 1:
+        return [write(0, parts[0])]
+    with ThreadPoolExecutor(
+        max_workers=count, thread_name_prefix="LoadEDW"
+    ) as executor:
+        futures = [
+            executor.submit(write, number, part) for number, part in enumerate(parts)
+        ]
+        try:
+            return [future.result() for future in futures]
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+class ShadowTable:
+    """A shadow copy of table, loaded in steps and then swapped in
+
+        shadow = ShadowTable(engine, "stg_hr_workers", schema="adp")
+        shadow.create()
+        try:
+            with engine.begin() as connection:
+                writer.write(connection, shadow.prepare(df), shadow.name, "adp")
+            shadow.build()
+        except Exception:
+            shadow.discard()
+            raise
+        shadow.swap()
+
+    create() commits an empty shadow without primary key or indexes, so the writes
+    can take as long as they need without holding a lock on table and do not
+    maintain an index row by row. build() adds the key and indexes in one pass and
+    swap() renames the shadow in place of table in a short transaction of its own,
+    then drops the previous table. Readers keep seeing the previous load until the
+    swap commits, never an empty or half-loaded table.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): target database
+        table (str): table to replace
+        schema (str, optional): schema of table. Defaults to None.
+        hash_column (str, optional): filled with DeltaSync row hashes by prepare()
+        when table has it. Defaults to "row_hash".
+    """
+
+    def __init__(self, engine, table: str, schema=None, hash_column="row_hash"):
+        self.engine = engine
+        self.table = table
+        self.schema = schema
+        self.hash_column = hash_column
+        self.name = f"{table}_shadow"
+        self.previous = f"{table}_previous"
+        self.shadow_table = None
+        self.indexes = []
+        self.key = []
+
+    def create(self):
+        """Replace any leftover shadow with an empty one"""
+        with self.engine.begin() as connection:
+            drop_table(connection, self.name, self.schema)
+            self.shadow_table, self.indexes, self.key = create_shadow(
+                connection, self.table, self.name, self.schema
+            )
+
+    def prepare(self, df: pd.DataFrame) -> pd.DataFrame:
+        """df with the row hash column filled in, when the table has one"""
+        columns = [column.name for column in self.shadow_table.columns]
+        if self.hash_column in columns and self.hash_column not in df.columns:
+            hashed = [column for column in df.columns if column in columns]
+            df = df.assign(
+                **{self.hash_column: row_hashes(df, hashed, self.shadow_table)}
+            )
+        return df
+
+    def build(self) -> float:
+        """Create the primary key and indexes of table on the loaded shadow
+
+        Duplicate keys in the loaded rows fail here.
+
+        Returns:
+            float: seconds taken
+        """
+        started = time.perf_counter()
+        with self.engine.begin() as connection:
+            add_primary_key(connection, self.name, self.key, self.schema)
+            for index in self.indexes:
+                index.create(connection)
+        return time.perf_counter() - started
+
+    def swap(self) -> float:
+        """Rename the shadow in place of table and drop the previous table
+
+        Returns:
+            float: seconds the swap transaction took
+        """
+        started = time.perf_counter()
+        with self.engine.begin() as connection:
+            drop_table(connection, self.previous, self.schema)
+            rename_table(connection, self.table, self.previous, self.schema)
+            rename_table(connection, self.name, self.table, self.schema)
+        seconds = time.perf_counter() - started
+
+        try:
+            with self.engine.begin() as connection:
+                drop_table(connection, self.previous, self.schema)
+        except Exception as er:
+            # the swap is done, the next load drops the leftover
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.warning(
+                f"Could not drop {self.previous}: {str(er)}", extra=properties
+            )
+        return seconds
+
+    def discard(self):
+        """Drop the shadow after a failed load, leaving table as it was"""
+        try:
+            with self.engine.begin() as connection:
+                drop_table(connection, self.name, self.schema)
+        except Exception as er:
+            # keep the error of the load, the next create() drops the leftover
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.warning(f"Could not drop {self.name}: {str(er)}", extra=properties)
+
+
+def swap_load(
+    engine,
+    df: pd.DataFrame,
+    table: str,
+    schema=None,
+    writer=None,
+    hash_column="row_hash",
+    partitions=1,
+) -> dict:
+    """Load df into a shadow copy of table and swap it in
+
+    The shadow table (see ShadowTable) is loaded by several writers at once when
+    partitions > 1 (see write_partitions). A failed load drops the shadow and leaves
+    table as it was, so the load succeeds or fails as a whole however many writers
+    took part.
+
+    Grants, triggers and statistics belong to the table object, so they do not
+    carry over to the swapped-in table.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): target database
+        df (pd.DataFrame): every row the table should hold
+        table (str): table to replace
+        schema (str, optional): schema of table. Defaults to None.
+        writer (BulkLoad.BulkWriter, optional): writes the rows. Defaults to pandas
+        to_sql.
+        hash_column (str, optional): filled with DeltaSync row hashes when table has
+        it, so a later delta load can compare against them. Defaults to "row_hash".
+        partitions (int, optional): concurrent writers. Defaults to 1.
+
+    Raises:
+        ValueError: table has an IDENTITY column
+
+    Returns:
+        dict: {inserted, indexes, partitions: [{partition, rows, seconds}],
+        write_seconds, index_seconds, swap_seconds}
+    """
+    writer = writer or ToSqlWriter()
+    shadow = ShadowTable(engine, table, schema, hash_column)
+    timings = {}
+
+    shadow.create()
+    try:
+        started = time.perf_counter()
+        written = write_partitions(
+            engine,
+            writer,
+            shadow.prepare(df),
+            shadow.name,
+            schema,
+            partitions,
+            key=shadow.key,
+        )
+        timings["write_seconds"] = time.perf_counter() - started
+        timings["index_seconds"] = shadow.build()
+    except Exception:
+        shadow.discard()
+        raise
+    timings["swap_seconds"] = shadow.swap()
+
+    return {
+        "inserted": sum(partition["rows"] for partition in written),
+        "indexes": len(shadow.indexes),
+        "partitions": written,
+        **timings,
+    }
@@ -0,0 +1,163 @@
+import json
+import threading
+
+from datetime import datetime, timedelta, timezone
+
+from SharedCode.Config import endpoints
+from SharedCode.KVAid import load_credentials
+from SharedCode.LogIt import logger
+from SharedCode.Patch import post_request
+from SharedCode.Settings import token_refresh_margin
+
+# lifetime assumed when ADP does not send expires_in
+default_expires_in = 3600
+
+
+def _utc(moment: datetime) -> datetime:
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+def token_expiring(token: dict, now: datetime, margin=token_refresh_margin) -> bool:
+    """Check whether a token expires within margin seconds of now
+
+    Orchestrations pass context.current_utc_datetime so the check replays the same way.
+
+    Args:
+        token (dict): result of ADPOpenConnection
+        now (datetime): current time, naive values are taken as UTC
+        margin (int, optional): headroom. Defaults to ADP_TOKEN_REFRESH_MARGIN.
+
+    Returns:
+        bool: True when the token should be replaced
+    """
+    if not token or not token.get("expires_at"):
+        return True
+    expires_at = datetime.fromisoformat(token["expires_at"])
+    return _utc(now) + timedelta(seconds=margin) >= expires_at
+
+
+def request_token(adp_credentials: dict) -> dict:
+    """Request a new bearer token from ADP
+
+    Args:
+        adp_credentials (dict): adp_credentials from Parameters
+
+    Returns:
+        dict: {bearer_token, status, expires_in, expires_at}
+    """
+    credentials = load_credentials(
+        adp_credentials["certificate"], adp_credentials["private_key"]
+    )
+    form_data = {
+        "grant_type": "client_credentials",
+        "client_id": adp_credentials["client_id"],
+        "client_secret": adp_credentials["client_secret"],
+    }
+    headers = {"user-agent": "cd-adpApi-func-python/1.0.0"}
+
+    issued_at = datetime.now(timezone.utc)
+    r = post_request(
+        url=endpoints.auth_url,
+        headers=headers,
+        cert=(credentials.x509, credentials.pkey),
+        data=form_data,
+        module_name=__name__,
+    )
+    content = json.loads(r.content)
+    expires_in = int(content.get("expires_in", default_expires_in))
+    return {
+        "bearer_token": content["access_token"],
+        "status": r.status_code,
+        "expires_in": expires_in,
+        "expires_at": (issued_at + timedelta(seconds=expires_in)).isoformat(),
+    }
+
+
+class TokenManager:
+    """Bearer tokens cached per ADP client id for the life of the worker process.
+
+    Activities reuse a token until it is about to expire and replace it once, for all
+    callers holding it, when ADP rejects it with a 401.
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def get(self, adp_credentials: dict) -> dict:
+        """Cached token, requesting a new one when it is about to expire
+
+        Args:
+            adp_credentials (dict): adp_credentials from Parameters
+
+        Returns:
+            dict: token
+        """
+        client_id = adp_credentials["client_id"]
+        with self._lock:
+            token = self._tokens.get(client_id)
+            if token_expiring(token, datetime.now(timezone.utc)):
+                token = request_token(adp_credentials)
+                self._tokens[client_id] = token
+            return token
+
+    def bearer(self, adp_credentials: dict, token: dict) -> dict:
+        """The token that was passed in, or a newer one this process already holds
+
+        Args:
+            adp_credentials (dict): adp_credentials from Parameters
+            token (dict): token passed in by the orchestration
+
+        Returns:
+            dict: token to send
+        """
+        with self._lock:
+            cached = self._tokens.get(adp_credentials["client_id"])
+        if cached is None or cached is token:
+            return token
+        if token_expiring(token, datetime.fromisoformat(cached["expires_at"]), 0):
+            return cached
+        return token
+
+    def refresh(self, adp_credentials: dict, stale: dict) -> dict:
+        """Replace a token ADP rejected; callers with the same token share one refresh
+
+        Args:
+            adp_credentials (dict): adp_credentials from Parameters
+            stale (dict): rejected token
+
+        Returns:
+            dict: new token
+        """
+        client_id = adp_credentials["client_id"]
+        with self._lock:
+            cached = self._tokens.get(client_id)
+            if cached is not None and cached["bearer_token"] != stale["bearer_token"]:
+                return cached
+            token = request_token(adp_credentials)
+            self._tokens[client_id] = token
+            return token
+
+    def send(self, request, adp_credentials: dict, token: dict):
+        """Call request(token), refreshing the token once if ADP answers with a 401
+
+        Args:
+            request (callable): sends the request with the given token
+            adp_credentials (dict): adp_credentials from Parameters
+            token (dict): token passed in by the orchestration
+
+        Returns:
+            requests.Response: response
+        """
+        token = self.bearer(adp_credentials, token)
+        r = request(token)
+        if r.status_code == 401:
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.warning(
+                "ADP rejected the bearer token, refreshing it", extra=properties
+            )
+            r = request(self.refresh(adp_credentials, token))
+        return r
+
+
+tokens = TokenManager()
@@ -36,3 +36,12 @@ Queries = namedtuple(
     "Queries",
     ["base_select", "custom_select"],
 )
+# parsed ADP client certificate and key, as cryptography and pyOpenSSL objects
+CertMaterial = namedtuple(
+    "CertMaterial",
+    ["fingerprint", "certificate", "private_key", "x509", "pkey"],
+)
+# status, headers and body of an aiohttp response read inside its context
+HttpResponse = namedtuple("HttpResponse", ["status", "headers", "content"])
+# Key Vault value with the version it was read at
+VaultObject = namedtuple("VaultObject", ["value", "version", "fetched_at"])
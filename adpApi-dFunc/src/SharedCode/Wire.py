@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import base64
+import json
+import zlib
+
+from SharedCode import Settings
+from SharedCode.Lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+FORMAT = "columnar"
+VERSION = 1
+
+
+def is_frame(payload) -> bool:
+    """True when payload was written by encode_frame"""
+    return isinstance(payload, dict) and payload.get("format") == FORMAT
+
+
+def _values(series: pd.Series) -> list:
+    values = series.tolist()
+    if series.hasnans:
+        # NaN is not valid JSON, NULLs travel as None
+        values = [None if pd.isna(value) else value for value in values]
+    return values
+
+
+def encode_frame(df: pd.DataFrame, codec=None) -> dict:
+    """Encode a DataFrame with its column names once and one value list per column
+
+    Args:
+        df (pd.DataFrame): frame to encode
+        codec (str, optional): "zlib" compresses the value lists. Defaults to
+        ADP_WIRE_CODEC.
+
+    Returns:
+        dict: {format, version, columns, length, codec, data}
+    """
+    codec = Settings.wire_codec if codec is None else codec
+    data = [_values(df[column]) for column in df.columns]
+    if codec == "zlib":
+        data = base64.b64encode(
+            zlib.compress(json.dumps(data, separators=(",", ":")).encode())
+        ).decode()
+    elif codec:
+        raise ValueError(f"Unknown wire codec: {codec}")
+    return {
+        "format": FORMAT,
+        "version": VERSION,
+        "columns": [str(column) for column in df.columns],
+        "length": len(df),
+        "codec": codec or None,
+        "data": data,
+    }
+
+
+def decode_frame(payload) -> pd.DataFrame:
+    """Rebuild a DataFrame from encode_frame output
+
+    The older shapes, DataFrame.to_dict() and a list of records, are still accepted.
+
+    Args:
+        payload (dict or list): encoded frame, {column: {index: value}} or records
+
+    Returns:
+        pd.DataFrame: frame
+    """
+    if not is_frame(payload):
+        return pd.DataFrame(payload)
+    if payload["version"] != VERSION:
+        raise ValueError(f"Unsupported frame version: {payload['version']}")
+    data = payload["data"]
+    if payload["codec"] == "zlib":
+        data = json.loads(zlib.decompress(base64.b64decode(data)))
+    elif payload["codec"]:
+        raise ValueError(f"Unknown wire codec: {payload['codec']}")
+    columns = payload["columns"]
+    return pd.DataFrame(dict(zip(columns, data)), columns=columns)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import traceback
+
+from SharedCode.AsyncFetch import (
+    gather_custom_attributes,
+    iter_worker_pages,
+    make_auth,
+    open_client,
+    repair_custom_attributes,
+)
+from SharedCode.BulkLoad import get_writer
+from SharedCode.Config import columns, custom_columns, endpoints
+from SharedCode.Credentials import resolve_credentials
+from SharedCode.Decorate import log_execution
+from SharedCode.Engine import edw_engine
+from SharedCode.Flatten import Flattener
+from SharedCode.HttpCache import get_cache
+from SharedCode.Lazy import lazy_import
+from SharedCode.Limiter import get_limiter, release_limiter
+from SharedCode.LogIt import logger
+from SharedCode.Metrics import metrics
+from SharedCode.Patch import teams_notification
+from SharedCode.Pipeline import in_thread, run_pipeline
+from SharedCode.Settings import (
+    limit_max,
+    max_in_flight,
+    repair_attempts,
+    repair_backoff,
+    stream_queue_size,
+)
+from SharedCode.ShadowSwap import ShadowTable
+
+pd = lazy_import("pandas")
+
+worker_flattener = Flattener(columns)
+custom_flattener = Flattener(custom_columns)
+
+
+def merge_page(page: list, custom_workers: list) -> pd.DataFrame:
+    """Flatten one page of workers and its custom attributes and merge them
+
+    Args:
+        page (list): base attributes of the workers
+        custom_workers (list): [(aoid, custom attributes or None)]
+
+    Returns:
+        pd.DataFrame: merged workers, as MergeWorkers builds them
+    """
+    workers_df = worker_flattener.frame(page)
+    custom_df = custom_flattener.frame(
+        [
+            {**(attribute[0] if attribute else {}), "aoid": aoid}
+            for aoid, attribute in custom_workers
+        ]
+    )
+    return pd.merge(workers_df, custom_df, on="associate_oid", suffixes=("", "_delme"))
+
+
+@log_execution(func_name="StreamSyncWorkers")
+async def main(StreamSyncWorkers: list) -> dict:
+    """Fetch, format and load workers one page at a time
+
+    Pages flow through bounded queues: fetch base attributes -> fetch custom
+    attributes -> repair the empty ones as CheckNoneWorkers does -> flatten and
+    merge -> write. Memory is bound by the page size rather than the headcount.
+    Each page is written to a shadow of adp.stg_hr_workers in a transaction of its
+    own, and the shadow is swapped in once the last page is loaded (see
+    SharedCode.ShadowSwap), so readers keep the previous load during the fetch and
+    a failed run leaves it in place. The whole run is one activity, so it has to fit
+    in functionTimeout (see Settings.load_mode).
+
+    Args:
+        StreamSyncWorkers (list): (parameters, token)
+
+    Returns:
+        dict: {status, worker_count, message}
+    """
+    parameters = resolve_credentials(StreamSyncWorkers[0])
+    token = StreamSyncWorkers[1]
+    adp_credentials = parameters["adp_credentials"]
+    edw_credentials = parameters["edw_credentials"]
+    writer = get_writer(parameters["load"].get("strategy", "to_sql"))
+
+    engine = edw_engine(edw_credentials)
+    shadow = ShadowTable(engine, "stg_hr_workers", schema="adp")
+
+    counts = {"workers": 0, "missing_custom": 0}
+    dead_letter = []
+    limiter = get_limiter(endpoints.select_url, max_in_flight)
+    cache = get_cache()
+    try:
+        shadow.create()
+        async with open_client(adp_credentials) as session:
+            auth = make_auth(adp_credentials, token)
+
+            async def fetch_custom(page):
+                aoids = [worker["associateOID"] for worker in page]
+                custom_workers = await gather_custom_attributes(
+                    session, limiter, auth, aoids, cache=cache
+                )
+                return page, custom_workers
+
+            async def repair_custom(item):
+                page, custom_workers = item
+                none_aoids = [
+                    aoid for aoid, attribute in custom_workers if attribute is None
+                ]
+                if not none_aoids:
+                    return item
+                repaired, failed = await repair_custom_attributes(
+                    session,
+                    limiter,
+                    auth,
+                    none_aoids,
+                    attempts=repair_attempts,
+                    backoff=repair_backoff,
+                    workers=limit_max,
+                )
+                counts["missing_custom"] += len(failed)
+                dead_letter.extend(failed)
+                return page, [
+                    (aoid, repaired.get(aoid, attribute))
+                    for aoid, attribute in custom_workers
+                ]
+
+            def transform(item):
+                return merge_page(*item)
+
+            def load(workers_df):
+                # a short transaction per page, the shadow keeps the load all or
+                # nothing until it is swapped in
+                with metrics.timer(
+                    "db.duration_seconds",
+                    activity="StreamSyncWorkers",
+                    operation="insert",
+                ):
+                    with engine.begin() as connection:
+                        writer.write(
+                            connection,
+                            shadow.prepare(workers_df),
+                            schema="adp",
+                            table=shadow.name,
+                        )
+                metrics.count(
+                    "db.rows",
+                    len(workers_df),
+                    activity="StreamSyncWorkers",
+                    operation="inserted",
+                )
+                counts["workers"] += len(workers_df)
+
+            pages = await run_pipeline(
+                iter_worker_pages(
+                    session, limiter, auth, top=parameters["query"]["top"]
+                ),
+                [
+                    fetch_custom,
+                    repair_custom,
+                    in_thread(transform),
+                    in_thread(load),
+                ],
+                maxsize=stream_queue_size,
+            )
+        with metrics.timer(
+            "db.duration_seconds", activity="StreamSyncWorkers", operation="index"
+        ):
+            shadow.build()
+        with metrics.timer(
+            "db.duration_seconds", activity="StreamSyncWorkers", operation="swap"
+        ):
+            shadow.swap()
+
+        if dead_letter:
+            properties = {"custom_dimensions": {"app": "ADP"}}
+            logger.warning(
+                f"{len(dead_letter)} workers still without custom attributes after "
+                f"{repair_attempts} attempts: {', '.join(dead_letter)}",
+                extra=properties,
+            )
+        return {
+            "status": 200,
+            "worker_count": counts["workers"],
+            "message": f"Workers streamed in {pages} pages, "
+            f"{counts['missing_custom']} without custom attributes",
+        }
+    except Exception as er:
+        shadow.discard()
+        properties = {"custom_dimensions": {"app": "ADP"}}
+        logger.exception(
+            f"Unknown error streaming workers to Database. \n\n\
+            ERROR: {str(er)}. \n\n\
+            TRACEBACK: {traceback.format_exc()}",
+            extra=properties,
+        )
+        payload = {"status": 500, "worker_count": None, "message": str(er)}
+        teams_notification(status=payload, params=parameters)
+        raise er
+    finally:
+        release_limiter(endpoints.select_url, limiter)
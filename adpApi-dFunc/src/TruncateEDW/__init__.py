@@ -1,14 +1,15 @@
 import traceback
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import URL
-from sqlalchemy.orm import sessionmaker
-from urllib.parse import quote_plus
-
+from SharedCode.Credentials import resolve_credentials
 from SharedCode.Decorate import log_execution
+from SharedCode.Engine import edw_engine
+from SharedCode.Lazy import lazy_import
 from SharedCode.LogIt import logger
+from SharedCode.Metrics import metrics
 from SharedCode.Patch import teams_notification
 
+sqlalchemy = lazy_import("sqlalchemy")
+
 
 @log_execution(func_name="TruncateEDW")
 def main(TruncateEDW: str) -> None:
@@ -20,27 +21,16 @@ def main(TruncateEDW: str) -> None:
     Returns:
         None: None
     """
+    TruncateEDW = resolve_credentials(TruncateEDW)
     edw_credentials = TruncateEDW["edw_credentials"]
-    user = edw_credentials["user"]
-    password = edw_credentials["password"]
-    host = edw_credentials["host"]
-    db_name = edw_credentials["db_name"]
-    driver = edw_credentials["driver"]
-
     sql_statement = "TRUNCATE TABLE adp.stg_hr_workers"
-
-    connection_string = (
-        f"Driver={driver};Server={host};Database={db_name};Uid={user};Pwd={password}"
-    )
-    connection_url = URL.create(
-        "mssql+pyodbc", query={"odbc_connect": connection_string}
-    )
-    engine = create_engine(connection_url, echo=False)
-    Session = sessionmaker(bind=engine)
+    engine = edw_engine(edw_credentials)
 
     try:
-        with Session.begin() as session:
-            session.execute(text(sql_statement))
+        with metrics.timer(
+            "db.duration_seconds", activity="TruncateEDW", operation="truncate"
+        ), engine.begin() as connection:
+            connection.execute(sqlalchemy.text(sql_statement))
     except Exception as er:
         logger.exception(
             f"Unknown error loading workers to Database. \n\n\
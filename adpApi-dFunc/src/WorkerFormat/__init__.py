@@ -1,33 +1,27 @@
-import pandas as pd
-
-from flatten_json import flatten
-
 from SharedCode.Config import columns
 from SharedCode.Decorate import log_execution
+from SharedCode.Flatten import Flattener
+from SharedCode.PayloadStore import iter_records, offload
+from SharedCode.Wire import encode_frame
+
+flattener = Flattener(columns)
 
 
 @log_execution(func_name="WorkerFormat")
 def main(WorkerFormat: list) -> dict:
-    """Fully flattens JSON/Dictionary paylaod and renames columns
+    """Extracts the mapped columns from the JSON/Dictionary payload
 
     Args:
-        WorkerFormat (list): dict
+        WorkerFormat (list): workers and/or payload references to pages of workers
 
     Returns:
-        str: _description_
+        dict: {workers, aoids, worker_count, status}, workers is a columnar frame,
+        workers and aoids may be references
     """
-    workers = WorkerFormat
-    all_workers = []
-    for worker in workers:
-        flat_worker = flatten(worker)
-        all_workers.append(flat_worker)
-
-    workers_df = pd.DataFrame(all_workers)
-
-    workers_df = workers_df.rename(columns=columns)
-    columns_to_remove = workers_df.columns[workers_df.columns == "remove"]
-    workers_df.drop(columns=columns_to_remove, inplace=True)
-
-    workers_dict = workers_df.to_dict()
-
-    return {"workers": workers_dict, "status": 200}
+    workers_df = flattener.frame(iter_records(WorkerFormat))
+    return {
+        "workers": offload(encode_frame(workers_df)),
+        "aoids": offload(workers_df["associate_oid"].tolist()),
+        "worker_count": len(workers_df),
+        "status": 200,
+    }
@@ -1,6 +1,24 @@
 import os
 import sys
 
+import pytest
+
 sys.path.insert(
     0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
 )
+
+
+@pytest.fixture
+def make_workers():
+    """Factory of small worker frames, make_workers(rows, columns)
+
+    Without rows it returns three workers with a None and a NaN among them.
+    """
+    import pandas as pd
+
+    def make(rows=None, columns=("associate_oid", "first_name", "status")):
+        if rows is None:
+            rows = [["G1", "Ada", None], ["G2", "Bob", "T"], ["G3", float("nan"), "A"]]
+        return pd.DataFrame(rows, columns=list(columns))
+
+    return make
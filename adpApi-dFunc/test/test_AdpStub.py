@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+adp_stub = pytest.importorskip("adp_stub")
+
+import ADPOpenConnection  # noqa: E402
+import CheckNoneWorkers  # noqa: E402
+import GetCustomAttributesBatch  # noqa: E402
+import GetWorkerAttributes  # noqa: E402
+from SharedCode import Settings  # noqa: E402
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    from SharedCode import Config
+
+    # let monkeypatch undo what point_app_at replaces
+    for module in list(sys.modules.values()):
+        if getattr(module, "endpoints", None) is Config.endpoints:
+            monkeypatch.setattr(module, "endpoints", Config.endpoints)
+    for name in ("REQUESTS_CA_BUNDLE", "SSL_CERT_FILE"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(Settings, "http_cache_path", "")
+
+    behaviour = adp_stub.Behaviour(headcount=30, retry_after=0, seed=1)
+    with adp_stub.serve(behaviour) as server:
+        adp_stub.point_app_at(server)
+        yield server
+
+
+def test_fetch_activities_against_stub(stub):
+    parameters = {
+        "adp_credentials": stub.pki.adp_credentials(),
+        "edw_credentials": {"host": "adp-stub"},
+        "query": {"skip": 0, "top": 10, "count": True},
+    }
+    token = ADPOpenConnection.main(parameters)
+    assert token["status"] == 200
+
+    page = GetWorkerAttributes.main((parameters, token))
+    assert page["total"] == 30
+    assert len(page["workers"]) == 10
+
+    # the per-worker fetches retry empty bodies
+    stub.behaviour.empty_rate = 0.2
+    aoids = [adp_stub.aoid(index) for index in range(30)]
+    batch = GetCustomAttributesBatch.main((parameters, token, aoids))
+    assert all(attributes is not None for _, attributes in batch)
+
+    checked = CheckNoneWorkers.main(
+        (parameters, token, [(aoid, None) for aoid in aoids[:5]])
+    )
+    assert not checked["dead_letter"]
+    assert stub.stats["empty"] > 0
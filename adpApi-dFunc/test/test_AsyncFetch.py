@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from SharedCode import AsyncFetch
+from SharedCode.Retry import CircuitOpenError
+
+
+def test_repair_custom_attributes(monkeypatch):
+    calls = {}
+
+    async def fake_gather(session, semaphore, auth, aoids, attempts=3, **kwargs):
+        (aoid,) = aoids
+        calls[aoid] = calls.get(aoid, 0) + 1
+        if aoid == "G1":
+            return [(aoid, [{"person": {}}])]
+        if aoid == "G2" and calls[aoid] == 3:
+            return [(aoid, [{"person": {}}])]
+        if aoid == "G3":
+            raise OSError("connection reset")
+        return [(aoid, None)]
+
+    monkeypatch.setattr(AsyncFetch, "gather_custom_attributes", fake_gather)
+
+    repaired, dead_letter = asyncio.run(
+        AsyncFetch.repair_custom_attributes(
+            None, None, {}, ["G1", "G2", "G3", "G4"], attempts=3, backoff=0, workers=2
+        )
+    )
+
+    assert repaired == {"G1": [{"person": {}}], "G2": [{"person": {}}]}
+    assert sorted(dead_letter) == ["G3", "G4"]
+    assert calls == {"G1": 1, "G2": 3, "G3": 3, "G4": 3}
+
+
+def test_iter_worker_pages_raises_on_a_failed_page(monkeypatch):
+    pages = iter(
+        [
+            (200, {"workers": [{"associateOID": "G1"}]}),
+            (500, None),
+            (200, {"workers": [{"associateOID": "G3"}]}),
+        ]
+    )
+
+    async def fake_get(*args, **kwargs):
+        return next(pages)
+
+    monkeypatch.setattr(AsyncFetch, "_get", fake_get)
+
+    async def collect(seen):
+        auth = {"adp_credentials": {"client_id": "id", "client_secret": "secret"}}
+        async for page in AsyncFetch.iter_worker_pages(None, None, auth, top=1):
+            seen.append(page)
+
+    seen = []
+    with pytest.raises(AsyncFetch.PageFetchError) as raised:
+        asyncio.run(collect(seen))
+    assert raised.value.status == 500 and raised.value.skip == 1
+    assert seen == [[{"associateOID": "G1"}]]
+
+
+def test_repair_waits_out_an_open_circuit(monkeypatch):
+    calls = []
+
+    async def fake_gather(
+        session, semaphore, auth, aoids, attempts=3, raise_open=False, **kwargs
+    ):
+        calls.append(aoids[0])
+        if len(calls) <= 2:
+            assert raise_open
+            raise CircuitOpenError("https://api.adp.test", 0.01)
+        return [(aoids[0], [{"person": {}}])]
+
+    monkeypatch.setattr(AsyncFetch, "gather_custom_attributes", fake_gather)
+
+    repaired, dead_letter = asyncio.run(
+        AsyncFetch.repair_custom_attributes(
+            None, None, {}, ["G1"], attempts=2, backoff=0
+        )
+    )
+
+    # the two calls refused by the circuit did not spend the two tries
+    assert repaired == {"G1": [{"person": {}}]} and dead_letter == []
+    assert calls == ["G1", "G1", "G1"]
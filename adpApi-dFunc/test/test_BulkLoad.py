@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from sqlalchemy import create_engine, text
+
+from SharedCode.BulkLoad import _bind_length, get_writer
+
+
+@pytest.mark.parametrize("strategy", ["executemany", "to_sql"])
+def test_writers_append_rows(strategy, make_workers):
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE workers "
+                "(associate_oid TEXT, first_name TEXT, status TEXT)"
+            )
+        )
+        assert get_writer(strategy).write(connection, make_workers(), "workers") == 3
+        rows = connection.execute(
+            text("SELECT * FROM workers ORDER BY associate_oid")
+        ).fetchall()
+
+    assert rows == [("G1", "Ada", None), ("G2", "Bob", "T"), ("G3", None, "A")]
+
+
+def test_tvp_needs_sql_server():
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        assert not get_writer("tvp").supports(connection)
+    with pytest.raises(ValueError):
+        get_writer("bcp")
+
+
+def test_bind_length_of_null_and_empty_columns():
+    from sqlalchemy import Date, String
+
+    nulls = pd.Series([None, float("nan")], dtype=object)
+    assert _bind_length(None, nulls) == 1
+    assert _bind_length(Date(), nulls) == 1
+    assert _bind_length(String(), pd.Series([], dtype=object)) == 1
+    assert _bind_length(String(30), nulls) == 30
+    assert _bind_length(None, pd.Series(["abc", None])) == 3
+    assert _bind_length(None, pd.Series(["x" * 5000])) == 0
+
+
+def test_executemany_writes_all_null_columns_and_empty_frames(make_workers):
+    engine = create_engine("sqlite://")
+    workers = make_workers().assign(status=None)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE workers "
+                "(associate_oid TEXT, first_name TEXT, status DATE)"
+            )
+        )
+        writer = get_writer("executemany")
+        assert writer.write(connection, workers, "workers") == 3
+        assert writer.write(connection, workers.head(0), "workers") == 0
+        nulls = connection.execute(
+            text("SELECT COUNT(*) FROM workers WHERE status IS NULL")
+        )
+        assert nulls.scalar() == 3
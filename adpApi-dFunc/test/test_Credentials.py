@@ -0,0 +1,66 @@
+from unittest.mock import Mock
+
+from azure.keyvault.certificates import KeyVaultCertificate
+from azure.keyvault.secrets import KeyVaultSecret
+
+from SharedCode import Credentials, KVAid
+
+
+class PinnedVault:
+    def __init__(self):
+        self.calls = []
+        self.version = "v1"
+
+    def get_secret(self, name, version=None):
+        self.calls.append((name, version))
+        secret = Mock(spec=KeyVaultSecret)
+        secret.value = f"{name}-{version or self.version}"
+        secret.properties = Mock(version=version or self.version)
+        return secret
+
+    def get_certificate(self, name):
+        return self.get_certificate_version(name, self.version)
+
+    def get_certificate_version(self, name, version):
+        self.calls.append((f"cert:{name}", version))
+        cert = Mock(spec=KeyVaultCertificate)
+        cert.cer = f"cert-{version}".encode()
+        cert.properties = Mock(version=version)
+        return cert
+
+
+def test_resolve_credentials_pins_versions(monkeypatch):
+    vault = PinnedVault()
+    monkeypatch.setitem(KVAid._clients, "https://kv.vault.azure.net", (vault, vault))
+    monkeypatch.setattr(KVAid.vault_cache, "_entries", {})
+    monkeypatch.setattr(Credentials, "_resolved", {})
+
+    kv_help = KVAid.KVHelper(*Credentials.kv_names)
+    kv_help.prefetch()
+    _, edw_credentials = Credentials.read_credentials(kv_help)
+    parameters = {
+        "credentials": kv_help.handle(),
+        "edw_credentials": Credentials.public_edw_credentials(edw_credentials),
+    }
+    assert "password" not in parameters["edw_credentials"]
+    assert set(parameters["credentials"]["versions"].values()) == {"v1"}
+
+    # the secrets rotate after Parameters ran, the run keeps the versions it began with
+    vault.version = "v2"
+    monkeypatch.setattr(KVAid.vault_cache, "_entries", {})
+    vault.calls.clear()
+    resolved = Credentials.resolve_credentials(parameters)
+    assert resolved["edw_credentials"]["password"] == "dbp-v1"
+    assert resolved["edw_credentials"]["host"] == "dbh-v1"
+    assert resolved["adp_credentials"]["client_secret"] == "csec-v1"
+    assert all(version == "v1" for _, version in vault.calls)
+
+    # later activities on the same worker do not go back to the vault
+    vault.calls.clear()
+    assert Credentials.resolve_credentials(parameters) == resolved
+    assert vault.calls == []
+
+
+def test_resolve_credentials_passes_legacy_parameters():
+    parameters = {"adp_credentials": {"client_id": "id"}, "query": {}}
+    assert Credentials.resolve_credentials(parameters) is parameters
@@ -0,0 +1,129 @@
+import pandas as pd
+
+from sqlalchemy import create_engine, inspect, text
+
+from SharedCode.DeltaSync import plan_delta, row_hashes, sync_table
+
+
+def test_row_hashes_ignore_column_order(make_workers):
+    workers = make_workers([["G1", "Ada", "A"], ["G2", None, "T"]])
+    reordered = workers[["status", "associate_oid", "first_name"]]
+    columns = list(workers.columns)
+
+    assert (
+        row_hashes(workers, columns).tolist() == row_hashes(reordered, columns).tolist()
+    )
+    assert row_hashes(workers, columns)[0] != row_hashes(workers, columns)[1]
+
+
+def test_plan_delta():
+    existing = pd.Series({"G1": "a", "G2": "b", "G3": "c"})
+    incoming = pd.Series({"G1": "a", "G2": "x", "G4": "d"})
+
+    assert plan_delta(incoming, existing) == (["G4"], ["G2"], ["G3"])
+
+
+def test_sync_table(make_workers):
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE stg_hr_workers "
+                "(associate_oid TEXT, first_name TEXT, status TEXT, row_hash TEXT)"
+            )
+        )
+        seed = make_workers([["G1", "Ada", "A"], ["G2", "Bob", "A"], ["G3", "Cy", "A"]])
+        assert sync_table(connection, seed, table="stg_hr_workers")["inserted"] == 3
+
+    workers = make_workers([["G1", "Ada", "A"], ["G2", "Bob", "T"], ["G4", "Di", "A"]])
+    with engine.begin() as connection:
+        counts = sync_table(connection, workers, table="stg_hr_workers")
+    assert counts == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": 1}
+
+    with engine.connect() as connection:
+        stored = pd.read_sql(
+            "SELECT associate_oid, first_name, status FROM stg_hr_workers "
+            "ORDER BY associate_oid",
+            connection,
+        )
+    assert stored.values.tolist() == workers.values.tolist()
+
+    # the stored hashes now match, so a rerun writes nothing
+    with engine.begin() as connection:
+        counts = sync_table(connection, workers, table="stg_hr_workers")
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 3}
+
+
+def test_sync_table_without_hash_column(make_workers):
+    engine = create_engine("sqlite://")
+    workers = make_workers([["G1", "Ada", "A"], ["G2", "Bob", "T"]])
+    with engine.begin() as connection:
+        make_workers([["G1", "Ada", "A"], ["G2", "Bob", "A"]]).to_sql(
+            "stg_hr_workers", connection, index=False
+        )
+        counts = sync_table(connection, workers, table="stg_hr_workers")
+
+    assert counts == {"inserted": 0, "updated": 1, "deleted": 0, "unchanged": 1}
+
+
+def test_sync_table_against_typed_columns():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE stg_hr_workers (associate_oid TEXT, "
+                "hire_date DATE, updated_at DATETIME, position_id INTEGER)"
+            )
+        )
+        connection.execute(
+            text(
+                "INSERT INTO stg_hr_workers VALUES "
+                "('G1', '2020-01-31', '2023-05-01 08:30:00.000000', 42), "
+                "('G2', '2019-06-01', NULL, NULL)"
+            )
+        )
+
+    # as the API sends them: text, and ints where JSON has numbers
+    workers = pd.DataFrame(
+        [
+            ["G1", "2020-01-31", "2023-05-01T08:30:00Z", "42"],
+            ["G2", "2019-06-01", None, None],
+        ],
+        columns=["associate_oid", "hire_date", "updated_at", "position_id"],
+    )
+    with engine.begin() as connection:
+        counts = sync_table(connection, workers, table="stg_hr_workers")
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 2}
+
+    workers.loc[1, "position_id"] = 7
+    with engine.begin() as connection:
+        counts = sync_table(connection, workers, table="stg_hr_workers")
+    assert counts == {"inserted": 0, "updated": 1, "deleted": 0, "unchanged": 1}
+
+
+def test_staging_tables_are_named_per_run(monkeypatch):
+    engine = create_engine("sqlite://")
+    created = []
+    monkeypatch.setattr(
+        pd.DataFrame,
+        "to_sql",
+        lambda self, name, *args, _to_sql=pd.DataFrame.to_sql, **kwargs: (
+            created.append(name),
+            _to_sql(self, name, *args, **kwargs),
+        )[1],
+    )
+    with engine.begin() as connection:
+        connection.execute(
+            text("CREATE TABLE stg_hr_workers (associate_oid TEXT, status TEXT)")
+        )
+        for status in ("A", "T"):
+            workers = pd.DataFrame(
+                [["G1", status]], columns=["associate_oid", "status"]
+            )
+            sync_table(connection, workers, table="stg_hr_workers")
+
+    # rows and keys of each run
+    assert (
+        len({name for name in created if name.startswith("stg_hr_workers_delta")}) == 4
+    )
+    assert inspect(engine).get_table_names() == ["stg_hr_workers"]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from sqlalchemy import text
+
+from SharedCode.Engine import EngineRegistry, edw_engine, engines
+
+
+def test_registry_shares_a_pooled_engine(tmp_path):
+    registry = EngineRegistry(pool_size=2, max_overflow=0)
+    url = f"sqlite:///{tmp_path / 'edw.db'}"
+    engine = registry.get(url)
+
+    assert registry.get(url) is engine
+    assert registry.get(url, key=("other",)) is not engine
+    assert engine.pool.size() == 2
+    assert engine.pool._pre_ping
+
+    def query():
+        with registry.get(url).connect() as connection:
+            assert connection.execute(text("SELECT 1")).scalar() == 1
+
+    threads = [threading.Thread(target=query) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert engine.pool.checkedin() <= 2
+
+    registry.dispose()
+    assert len(registry) == 0
+
+
+def test_rotated_secret_replaces_the_engine(tmp_path, caplog):
+    registry = EngineRegistry()
+    url = f"sqlite:///{tmp_path / 'edw.db'}"
+    first = registry.get(url, key=("edw",), secret="old")
+    assert registry.get(url, key=("edw",), secret="old") is first
+    assert registry.get(url, key=("edw",), secret="new") is not first
+    assert len(registry) == 1
+    # logged at the FUNC level, the lowest the func logger lets through
+    replaced = [r for r in caplog.records if r.getMessage().startswith("Credentials")]
+    assert [record.levelname for record in replaced] == ["FUNC"]
+
+
+def test_edw_engine_keys_without_the_password():
+    pytest.importorskip("pyodbc")
+    credentials = {
+        "user": "svc",
+        "password": "s3cret",
+        "host": "edw.example.net",
+        "db_name": "edw_stage",
+        "driver": "ODBC Driver 17 for SQL Server",
+    }
+    try:
+        engine = edw_engine(credentials)
+        assert edw_engine(dict(credentials)) is engine
+        assert engine.dialect.fast_executemany
+        assert all(
+            "s3cret" not in str(part) for key in engines._engines for part in key
+        )
+    finally:
+        engines.dispose()
@@ -0,0 +1,60 @@
+from flatten_json import flatten
+
+from SharedCode.Flatten import Flattener
+
+mapping = {
+    "associateOID": "associate_oid",
+    "workerID_idValue": "worker_id",
+    "custom_field_value": "custom",
+    "workAssignments_0_hireDate": "hire_date",
+    "workAssignments_1_hireDate": "rehire_date",
+    "person_communication_emails_0_emailUri": "email",
+    "person_communication_mobiles_0_formattedNumber": "phone",
+    "person_communication_landlines_0_formattedNumber": "phone",
+    "person_birthDate": "remove",
+}
+
+worker = {
+    "associateOID": "G1",
+    "workerID": {"idValue": "100"},
+    "custom_field": {"value": "x"},
+    "workAssignments": [{"hireDate": "2020-01-01"}],
+    "person": {
+        "birthDate": "1990-01-01",
+        "communication": {
+            "emails": [{"emailUri": "ada@example.com"}],
+            "landlines": [{"formattedNumber": "555-0100"}],
+        },
+    },
+}
+
+
+def test_matches_flatten_json():
+    flat = flatten(worker)
+    row = Flattener(mapping).row(worker)
+
+    assert row == {
+        "associate_oid": flat["associateOID"],
+        "worker_id": flat["workerID_idValue"],
+        "custom": flat["custom_field_value"],
+        "hire_date": flat["workAssignments_0_hireDate"],
+        "rehire_date": None,
+        "email": flat["person_communication_emails_0_emailUri"],
+        "phone": flat["person_communication_landlines_0_formattedNumber"],
+    }
+
+
+def test_frame():
+    workers = Flattener(mapping).frame([worker, {"associateOID": "G2"}])
+
+    assert list(workers.columns) == [
+        "associate_oid",
+        "worker_id",
+        "custom",
+        "hire_date",
+        "rehire_date",
+        "email",
+        "phone",
+    ]
+    assert workers["associate_oid"].tolist() == ["G1", "G2"]
+    assert workers["email"].tolist() == ["ada@example.com", None]
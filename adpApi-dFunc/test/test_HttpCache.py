@@ -0,0 +1,114 @@
+import asyncio
+import importlib
+import json
+
+from SharedCode.AsyncFetch import _get
+from SharedCode import Settings
+from SharedCode.HttpCache import HttpCache, get_cache
+from SharedCode.Limiter import AdaptiveLimiter
+
+
+class FakeResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = responses
+        self.sent = []
+
+    def get(self, url, headers=None, params=None, data=None):
+        self.sent.append(headers)
+        return self.responses.pop(0)
+
+
+def fetch(session, cache):
+    return asyncio.run(
+        _get(
+            session,
+            AdaptiveLimiter(),
+            "https://api.adp.test/hr/v2/workers/G1",
+            {"token": {"bearer_token": "abc"}},
+            {"$select": "workers/person"},
+            None,
+            1,
+            cache=cache,
+        )
+    )
+
+
+def test_conditional_requests(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.sqlite"))
+    body = json.dumps({"workers": [{"person": {}}]}).encode()
+    session = FakeSession(
+        [
+            FakeResponse(200, {"ETag": '"v1"'}, body),
+            FakeResponse(304, {}, b""),
+        ]
+    )
+
+    assert fetch(session, cache) == (200, {"workers": [{"person": {}}]})
+    assert fetch(session, cache) == (200, {"workers": [{"person": {}}]})
+    assert "If-None-Match" not in session.sent[0]
+    assert session.sent[1]["If-None-Match"] == '"v1"'
+    assert cache.snapshot() == {"hits": 0, "revalidated": 1, "misses": 1}
+
+
+def test_ttl_without_validators(tmp_path):
+    now = [1000.0]
+    cache = HttpCache(str(tmp_path / "cache.sqlite"), ttl=60, clock=lambda: now[0])
+    body = json.dumps({"workers": []}).encode()
+    session = FakeSession([FakeResponse(200, {}, body), FakeResponse(200, {}, body)])
+
+    fetch(session, cache)
+    fetch(session, cache)
+    assert len(session.sent) == 1
+
+    now[0] += 61
+    fetch(session, cache)
+    assert len(session.sent) == 2
+    assert cache.snapshot() == {"hits": 1, "revalidated": 0, "misses": 2}
+
+
+def test_eviction_by_age_and_size(tmp_path):
+    now = [1000.0]
+    path = str(tmp_path / "cache.sqlite")
+    cache = HttpCache(
+        path, max_age=60, max_entries=3, evict_every=2, clock=lambda: now[0]
+    )
+    for number in range(4):
+        now[0] += 1
+        cache.store(f"G{number}", {"ETag": f'"v{number}"'}, b"{}")
+
+    # the fourth store went over max_entries, the oldest entry made way
+    assert cache.lookup("G0") is None
+    assert cache.lookup("G1").etag == '"v1"'
+
+    # too old to be used, and deleted when the cache is opened again
+    now[0] += 61
+    cache.store("G4", {}, b"{}")
+    assert cache.lookup("G3") is None
+    reopened = HttpCache(path, max_age=60, clock=lambda: now[0])
+    assert reopened._db.execute("SELECT key FROM http_cache").fetchall() == [("G4",)]
+
+
+def test_cache_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("ADP_HTTP_CACHE", raising=False)
+    settings = importlib.reload(Settings)
+    try:
+        assert settings.http_cache_path == ""
+        assert get_cache() is None
+    finally:
+        importlib.reload(Settings)
@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from SharedCode.Lazy import LazyModule, lazy_import
+
+src = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+entry_points = sorted(
+    name
+    for name in os.listdir(src)
+    if os.path.isfile(os.path.join(src, name, "function.json"))
+)
+# loaded on first use by the activities that need them, never by an import
+heavy_modules = (
+    "pandas",
+    "numpy",
+    "sqlalchemy",
+    "azure.identity",
+    "azure.keyvault.secrets",
+    "azure.keyvault.certificates",
+    "opencensus",
+)
+# cumulative import time allowed per entry point, in milliseconds
+budget_ms = int(os.environ.get("ADP_IMPORT_BUDGET_MS", 1500))
+
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds of every module module pulls in,
+    imported in a fresh interpreter without APPINSIGHTS_INSTRUMENTATIONKEY"""
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if key != "APPINSIGHTS_INSTRUMENTATIONKEY"
+    }
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [src, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=src,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("entry_point", entry_points)
+def test_entry_point_import_budget(entry_point):
+    times = import_times(entry_point)
+    costliest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:10]
+    report = "\n".join(f"{us / 1000:8.1f} ms  {name}" for name, us in costliest)
+    print(f"\n{entry_point}\n{report}")
+
+    assert not [name for name in heavy_modules if name in times], report
+    assert times[entry_point] / 1000 < budget_ms, report
+
+
+def test_lazy_import_defers_until_used():
+    module = lazy_import("json.tool")
+    if "json.tool" not in sys.modules:
+        assert isinstance(module, LazyModule)
+    assert module.main is sys.modules["json.tool"].main
+    assert lazy_import("json.tool") is sys.modules["json.tool"]
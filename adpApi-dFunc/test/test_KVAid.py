@@ -1,12 +1,17 @@
+import datetime
 import json
 import pytest
 from unittest.mock import Mock, patch
 
 from azure.core.exceptions import ClientAuthenticationError
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
 from azure.keyvault.certificates import KeyVaultCertificate
 from azure.keyvault.secrets import KeyVaultSecret
 
-from src.SharedCode.KVAid import string_it, KVHelper
+from src.SharedCode.KVAid import CertCache, string_it, KVHelper, _clients, vault_cache
 from src.SharedCode.Config import kv_names
 
 
@@ -27,6 +32,46 @@ def test_string_it():
     assert result is None
 
 
+def make_credential_strings():
+    """Self-signed certificate and key in the string formats KVHelper returns"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "adp.test")])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return (
+        cert.public_bytes(serialization.Encoding.DER).decode("latin1"),
+        json.dumps(key_pem.decode()),
+    )
+
+
+def test_cert_cache():
+    cache = CertCache(max_entries=1)
+    credentials = make_credential_strings()
+
+    material = cache.get(*credentials)
+    assert cache.get(*credentials) is material
+    assert cache.find(material.certificate, material.private_key) is material
+    assert material.x509.to_cryptography() == material.certificate
+
+    # rotated credentials evict the old pair
+    cache.get(*make_credential_strings())
+    assert cache.find(material.certificate, material.private_key) is None
+
+
 def test_get_srvc_user():
     kv_helper = KVHelper(*kv_names)
     result = kv_helper.get_srvc_user()
@@ -72,3 +117,55 @@ def test_get_datv_credentials_exception(mock_get):
     with pytest.raises(ClientAuthenticationError):
         kv_helper = KVHelper(*kv_names)
         kv_helper.get_datv_credentials()
+
+
+class FakeVault:
+    def __init__(self):
+        self.calls = []
+        self.version = "v1"
+
+    def get_secret(self, name, version=None):
+        self.calls.append(name)
+        secret = Mock(spec=KeyVaultSecret)
+        secret.value = f"{name}-{version or self.version}"
+        secret.properties = Mock(version=version or self.version)
+        return secret
+
+    def get_certificate(self, name):
+        self.calls.append(f"cert:{name}")
+        cert = Mock(spec=KeyVaultCertificate)
+        cert.cer = b"cert-bytes"
+        cert.properties = Mock(version=self.version)
+        return cert
+
+    def get_certificate_version(self, name, version):
+        cert = self.get_certificate(name)
+        cert.properties = Mock(version=version)
+        return cert
+
+
+def test_prefetch_dedupes_and_caches(monkeypatch):
+    vault = FakeVault()
+    names = ["fake-kv", "cid", "csec", "cert", "db", "dbu", "dbp", "dbh", "dbport"]
+    monkeypatch.setitem(_clients, "https://fake-kv.vault.azure.net", (vault, vault))
+    monkeypatch.setattr(vault_cache, "_entries", {})
+
+    kv_helper = KVHelper(*names)
+    kv_helper.prefetch()
+    assert kv_helper.get_srvc_user() == "dbu-v1"
+    assert kv_helper.get_datv_credentials()["db_user"] == "dbu-v1"
+    assert kv_helper.get_certficate() == "cert-bytes"
+    assert kv_helper.get_private_key() == json.dumps("cert-v1")
+    assert sorted(vault.calls) == sorted(
+        ["cert:cert", "cert", "cid", "csec", "dbu", "dbp", "dbh", "dbport"]
+    )
+
+    # a warm invocation is answered from the process cache
+    KVHelper(*names).prefetch()
+    assert len(vault.calls) == 8
+
+    # a fresh fetch with a new version replaces the cached value
+    vault.version = "v2"
+    KVHelper(*names).get_srvc_user()
+    entry = vault_cache.get(("https://fake-kv.vault.azure.net", "secret", "dbu"))
+    assert entry.version == "v2"
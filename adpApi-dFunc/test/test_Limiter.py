@@ -0,0 +1,60 @@
+import asyncio
+
+from SharedCode.Limiter import AdaptiveLimiter, get_limiter, release_limiter
+
+
+def test_additive_increase_multiplicative_decrease():
+    now = [0.0]
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=8, clock=lambda: now[0])
+
+    # about one more slot per limit's worth of healthy responses
+    for _ in range(5):
+        limiter.record(200, 0.1)
+    assert limiter.limit == 5
+
+    limiter.record(429, 0.1)
+    assert limiter.limit == 2
+    # the rest of the same burst does not cut again
+    limiter.record(503, 0.1)
+    assert limiter.limit == 2
+
+    now[0] = 1.0
+    limiter.record(None, 0.1)
+    assert limiter.limit == 1
+    assert limiter.snapshot()["throttled"] == 2
+    assert limiter.snapshot()["errors"] == 1
+    assert limiter.snapshot()["decreases"] == 2
+
+
+def test_slow_responses_count_as_congestion():
+    limiter = AdaptiveLimiter(initial=8, latency_target=1.0)
+
+    limiter.record(200, 3.0)
+
+    assert limiter.limit == 4
+    assert limiter.counters["slow"] == 1
+
+
+def test_caps_requests_in_flight():
+    limiter = AdaptiveLimiter(initial=3, minimum=1, maximum=3)
+    peak = [0]
+
+    async def request():
+        async with limiter:
+            peak[0] = max(peak[0], limiter.in_flight)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert peak[0] == 3
+    assert limiter.in_flight == 0
+
+
+def test_learned_limit_carries_over():
+    limiter = get_limiter("https://api.adp.test/limiter", initial=10)
+    limiter.record(429, 0.1)
+    release_limiter("https://api.adp.test/limiter", limiter)
+
+    assert get_limiter("https://api.adp.test/limiter", initial=10).limit == 5
@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+
+from SharedCode.LogIt import MemoryExporter, TelemetryPipeline
+
+
+def make_logger(pipeline, name):
+    test_logger = logging.getLogger(f"test.telemetry.{name}")
+    test_logger.propagate = False
+    test_logger.handlers = [pipeline]
+    test_logger.setLevel(logging.INFO)
+    return test_logger
+
+
+def test_batches_by_size_and_flush():
+    exporter = MemoryExporter()
+    pipeline = TelemetryPipeline(exporter, batch_size=3, flush_interval=60)
+    test_logger = make_logger(pipeline, "size")
+
+    for number in range(7):
+        test_logger.info("record %s", number)
+    assert pipeline.flush()
+
+    assert [len(batch) for batch in exporter.batches] == [3, 3, 1]
+    assert [record.getMessage() for record in exporter.records][-1] == "record 6"
+
+
+def test_exports_partial_batch_after_interval():
+    exporter = MemoryExporter()
+    pipeline = TelemetryPipeline(exporter, batch_size=100, flush_interval=0.05)
+    make_logger(pipeline, "interval").info("lonely record")
+
+    deadline = time.monotonic() + 2
+    while not exporter.records and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(exporter.records) == 1
+
+
+def test_drops_instead_of_blocking():
+    release = threading.Event()
+
+    class StuckExporter(MemoryExporter):
+        def export(self, records):
+            release.wait()
+            super().export(records)
+
+    exporter = StuckExporter()
+    pipeline = TelemetryPipeline(exporter, max_queue=2, batch_size=1, flush_interval=60)
+    test_logger = make_logger(pipeline, "pressure")
+
+    started = time.monotonic()
+    for number in range(20):
+        test_logger.info("record %s", number)
+    assert time.monotonic() - started < 1
+    assert pipeline.dropped >= 17
+
+    release.set()
+    assert pipeline.flush()
+    assert len(exporter.records) == 20 - pipeline.dropped
+
+
+def test_samples_only_marked_records():
+    exporter = MemoryExporter()
+    pipeline = TelemetryPipeline(
+        exporter, sample_rate=0.25, rng=iter([0.1, 0.9]).__next__
+    )
+    test_logger = make_logger(pipeline, "sampling")
+
+    test_logger.info("kept", extra={"sampled": True})
+    test_logger.info("sampled out", extra={"sampled": True})
+    test_logger.info("not sampled")
+    test_logger.error("errors are always kept", extra={"sampled": True})
+    assert pipeline.flush()
+
+    assert [record.getMessage() for record in exporter.records] == [
+        "kept",
+        "not sampled",
+        "errors are always kept",
+    ]
+    assert exporter.records[0].custom_dimensions == {"sample_rate": 0.25}
+    assert pipeline.snapshot()["sampled_out"] == 1
+
+
+def test_one_flusher_for_concurrent_first_records(monkeypatch):
+    thread = threading.Thread
+    started = []
+
+    class SlowThread(thread):
+        def __init__(self, *args, **kwargs):
+            # widen the window between the None check and the assignment
+            time.sleep(0.05)
+            super().__init__(*args, **kwargs)
+
+        def start(self):
+            started.append(self)
+            super().start()
+
+    monkeypatch.setattr(threading, "Thread", SlowThread)
+    exporter = MemoryExporter()
+    pipeline = TelemetryPipeline(exporter, flush_interval=60)
+    # emit directly, without the handler lock logging.Handler.handle takes
+    senders = [
+        thread(
+            target=pipeline.emit,
+            args=(logging.makeLogRecord({"msg": "first", "levelno": logging.INFO}),),
+        )
+        for _ in range(8)
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+
+    assert len(started) == 1
+    assert pipeline.flush()
+    assert len(exporter.records) == 8
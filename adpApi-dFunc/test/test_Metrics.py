@@ -0,0 +1,125 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from SharedCode import Decorate, Patch
+from SharedCode.Decorate import log_execution
+from SharedCode.Metrics import (
+    Histogram,
+    MemoryExporter,
+    MetricsRegistry,
+    endpoint_label,
+    metrics,
+)
+from SharedCode.Retry import RetryPolicy
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    metrics.snapshot(reset=True)
+    exporter = MemoryExporter()
+    monkeypatch.setattr(metrics, "exporter", exporter)
+    return exporter
+
+
+def test_histogram_and_registry():
+    histogram = Histogram()
+    for value in [0.01] * 90 + [2.0] * 10:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(0.01, rel=1)
+    assert histogram.quantile(0.99) == 2.0
+    assert histogram.snapshot()["count"] == 100
+
+    exporter = MemoryExporter()
+    registry = MetricsRegistry(
+        exporter=exporter, interval=10, clock=iter([0, 5, 11, 11]).__next__
+    )
+    registry.count("calls", activity="A")
+    registry.count("calls", 2, activity="A")
+    registry.export_due()
+    assert exporter.exports == []
+    registry.export_due()
+    assert exporter.find("calls", activity="A")[0]["value"] == 3
+    assert registry.snapshot() == []
+
+
+def test_endpoint_label_collapses_ids():
+    assert (
+        endpoint_label("https://api.adp.com/hr/v2/workers/G3Q8G0YMBGB4MJ2Q?$select=x")
+        == "https://api.adp.com/hr/v2/workers/{id}"
+    )
+
+
+def test_log_execution_records_activity(exported, monkeypatch):
+    monkeypatch.setattr(Decorate, "payload_sample_rate", 1.0)
+
+    @log_execution(func_name="Counted")
+    def counted(payload):
+        return {"status": 200, "worker_count": len(payload)}
+
+    @log_execution(func_name="Failing")
+    def failing(payload):
+        raise ValueError("boom")
+
+    counted([1, 2, 3])
+    failing([])
+    metrics.export()
+
+    assert exported.find("activity.invocations", activity="Counted")[0]["value"] == 1
+    assert exported.find("activity.workers", activity="Counted")[0]["max"] == 3
+    assert exported.find("activity.bytes_in", activity="Counted")[0]["sum"] == len(
+        "[[1, 2, 3]]"
+    )
+    assert exported.find("activity.errors", activity="Failing")[0]["value"] == 1
+    assert (
+        exported.find("activity.duration_seconds", activity="Failing")[0]["count"] == 1
+    )
+
+
+def test_log_execution_only_sizes_sampled_payloads(exported, monkeypatch):
+    monkeypatch.setattr(Decorate, "payload_sample_rate", 0.0)
+    sized = []
+    monkeypatch.setattr(Decorate, "payload_bytes", lambda value: sized.append(value))
+
+    @log_execution(func_name="Unsampled")
+    def unsampled(payload):
+        return {"status": 200, "worker_count": len(payload)}
+
+    unsampled([1, 2, 3])
+    metrics.export()
+
+    assert sized == []
+    assert exported.find("activity.bytes_in", activity="Unsampled") == []
+    assert exported.find("activity.workers", activity="Unsampled")[0]["max"] == 3
+
+
+def test_http_helpers_record_status_and_retries(exported, monkeypatch):
+    responses = iter([503, 503, 200])
+
+    def fake_get(**kwargs):
+        return SimpleNamespace(
+            status_code=next(responses),
+            headers={},
+            content=b'{"ok": true}',
+            request=SimpleNamespace(body=None),
+        )
+
+    monkeypatch.setattr(
+        Patch.sessions, "lease", lambda cert: nullcontext(SimpleNamespace(get=fake_get))
+    )
+    policy = RetryPolicy(max_tries=3, base_delay=0, jitter=False, breaker=False)
+    url = "https://api.adp.test/hr/v2/workers"
+    response = policy.call(
+        Patch.get_request.__wrapped__, url=url, headers={}, endpoint=url
+    )
+    assert response.status_code == 200
+    metrics.export()
+
+    assert exported.find("http.requests", endpoint=url, status=503)[0]["value"] == 2
+    assert exported.find("http.requests", endpoint=url, status=200)[0]["value"] == 1
+    assert exported.find("http.bytes_in", endpoint=url)[0]["sum"] == 3 * len(
+        b'{"ok": true}'
+    )
+    assert exported.find("http.retries", endpoint=url)[0]["value"] == 2
+    assert exported.find("http.retry_sleep_seconds", endpoint=url)[0]["sum"] == 0
@@ -0,0 +1,69 @@
+from SharedCode import PayloadStore
+from SharedCode.PayloadStore import (
+    LocalPayloadStore,
+    delete_payloads,
+    extend_records,
+    is_ref,
+    iter_records,
+    payload_len,
+    payload_refs,
+    payload_slice,
+    resolve,
+)
+
+
+def test_put_and_get(tmp_path):
+    store = LocalPayloadStore(str(tmp_path), chunk_size=3)
+    workers = [{"associateOID": str(n)} for n in range(10)]
+
+    ref = store.put(workers)
+    assert is_ref(ref)
+    assert ref["chunks"] == 4
+    assert store.get(ref) == workers
+    # only the chunks holding items 4:8 are read
+    assert store.get(ref, 4, 8) == workers[4:8]
+
+    ref = store.put({"workers": workers})
+    assert store.get(ref) == {"workers": workers}
+
+    store.delete(ref)
+    assert not (tmp_path / ref["payload_ref"]).exists()
+
+
+def test_views_and_records(tmp_path, monkeypatch):
+    store = LocalPayloadStore(str(tmp_path), chunk_size=4)
+    monkeypatch.setitem(PayloadStore._stores, "local", store)
+    aoids = [f"G{n}" for n in range(10)]
+    ref = store.put(aoids)
+
+    view = payload_slice(ref, 3, 20)
+    assert payload_len(view) == 7
+    assert resolve(payload_slice(view, 2, 4)) == aoids[5:7]
+    assert payload_slice(aoids, 3, 5) == aoids[3:5]
+
+    records = []
+    extend_records(records, [["G0", None]])
+    extend_records(records, store.put([["G1", []], ["G2", []]]))
+    extend_records(records, None)
+    assert list(iter_records(records)) == [["G0", None], ["G1", []], ["G2", []]]
+
+
+def test_payload_refs_and_delete(tmp_path, monkeypatch):
+    store = LocalPayloadStore(str(tmp_path), chunk_size=2)
+    monkeypatch.setitem(PayloadStore._stores, "local", store)
+    pages = store.put([{"associateOID": "G0"}] * 3)
+    aoids = store.put(["G0", "G1"])
+    missing = {**store.put(["G2"]), "payload_ref": "gone"}
+
+    assert payload_refs(pages) == [pages]
+    assert payload_refs([{"associateOID": "G1"}, pages]) == [pages]
+    assert payload_refs({"workers": pages, "aoids": aoids, "status": 200}) == [
+        pages,
+        aoids,
+    ]
+    assert payload_refs(None) == []
+
+    refs = [pages, aoids, payload_slice(aoids, 0, 1), missing]
+    assert delete_payloads(refs) == 2
+    assert not (tmp_path / pages["payload_ref"]).exists()
+    assert not (tmp_path / aoids["payload_ref"]).exists()
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from SharedCode.Pipeline import in_thread, run_pipeline
+
+
+async def numbers(count, produced):
+    for number in range(count):
+        produced.append(number)
+        yield number
+
+
+def test_run_pipeline_keeps_order():
+    produced, loaded = [], []
+
+    async def double(number):
+        return number * 2
+
+    async def load(number):
+        await asyncio.sleep(0)
+        loaded.append(number)
+
+    finished = asyncio.run(
+        run_pipeline(numbers(5, produced), [double, in_thread(str), load])
+    )
+
+    assert finished == 5
+    assert loaded == ["0", "2", "4", "6", "8"]
+
+
+def test_run_pipeline_applies_back_pressure():
+    produced = []
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def slow_load(number):
+            await gate.wait()
+
+        task = asyncio.ensure_future(
+            run_pipeline(numbers(100, produced), [slow_load], maxsize=2)
+        )
+        for _ in range(10):
+            await asyncio.sleep(0)
+        # one item held by the stage, two queued, one waiting on the full queue
+        assert len(produced) == 4
+        gate.set()
+        return await task
+
+    assert asyncio.run(scenario()) == 100
+
+
+def test_run_pipeline_raises_first_failure():
+    async def fail(number):
+        if number == 3:
+            raise ValueError("bad page")
+        return number
+
+    async def load(number):
+        pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(run_pipeline(numbers(10, []), [fail, load]))
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from SharedCode import Retry
+from SharedCode.Retry import CircuitBreaker, CircuitOpenError, RetryPolicy, retry_after
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def responses(*statuses):
+    calls = []
+
+    def send():
+        calls.append(len(calls))
+        return Response(statuses[min(len(calls) - 1, len(statuses) - 1)])
+
+    return send, calls
+
+
+def test_delay_backs_off_exponentially():
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=False)
+
+    assert [policy.delay(attempt) for attempt in range(1, 5)] == [1, 2, 4, 5]
+    assert 0 <= RetryPolicy(base_delay=1).delay(3) <= 4
+    assert policy.delay(1, Response(429, {"Retry-After": "3"})) == 3
+    assert policy.delay(1, Response(429, {"Retry-After": "120"})) == 5
+
+
+def test_retry_after_http_date():
+    assert (
+        retry_after(Response(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}))
+        == 0
+    )
+    assert retry_after(Response(503)) is None
+
+
+def test_retries_retryable_statuses():
+    policy = RetryPolicy(max_tries=4, base_delay=0, breaker=False)
+
+    send, calls = responses(503, 429, 200)
+    assert policy.call(send).status_code == 200
+    assert len(calls) == 3
+
+    send, calls = responses(404)
+    assert policy.call(send).status_code == 404
+    assert len(calls) == 1
+
+    send, calls = responses(500)
+    assert policy.call(send).status_code == 500
+    assert len(calls) == 4
+
+
+def test_retries_exceptions():
+    policy = RetryPolicy(max_tries=3, base_delay=0, retry_exceptions=(ConnectionError,))
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        policy.call(flaky)
+    assert len(calls) == 3
+
+    def broken():
+        raise KeyError("not retried")
+
+    with pytest.raises(KeyError):
+        policy.call(broken)
+
+
+def test_call_async():
+    policy = RetryPolicy(max_tries=3, base_delay=0, breaker=False)
+    calls = []
+
+    async def send():
+        calls.append(1)
+        return Response(200, {}) if len(calls) == 2 else Response(200, {"empty": True})
+
+    response = asyncio.run(
+        policy.call_async(send, retry_if=lambda response: response.headers.get("empty"))
+    )
+    assert response.headers == {}
+    assert len(calls) == 2
+
+
+def test_circuit_breaker():
+    now = [0.0]
+    breaker = CircuitBreaker("https://api.adp.test", 2, 30, clock=lambda: now[0])
+
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    now[0] = 31
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        # only one trial call while half open
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_empty_bodies_do_not_open_the_circuit():
+    endpoint = "https://empty-bodies.adp.test/hr/v2/workers"
+    policy = RetryPolicy(max_tries=3, base_delay=0)
+    for _ in range(5):
+        send, calls = responses(200)
+        policy.call(send, endpoint=endpoint, retry_if=lambda response: True)
+        assert len(calls) == 3
+
+    send, calls = responses(503)
+    policy.call(send, endpoint=endpoint)
+    assert len(calls) == 3
+
+
+def test_unexpected_error_in_the_trial_call_reopens_the_circuit(monkeypatch):
+    now = [0.0]
+    endpoint = "https://trial.adp.test"
+    breaker = CircuitBreaker(endpoint, 2, 30, clock=lambda: now[0])
+    monkeypatch.setitem(Retry._breakers, endpoint, breaker)
+    policy = RetryPolicy(max_tries=2, base_delay=0, retry_exceptions=(ConnectionError,))
+
+    def refused():
+        raise ConnectionError("refused")
+
+    def broken():
+        raise ValueError("not a response")
+
+    with pytest.raises(ConnectionError):
+        policy.call(refused, endpoint=endpoint)
+    assert breaker.state == "open"
+
+    # the half open trial fails with an error the policy does not retry
+    now[0] = 31
+    with pytest.raises(ValueError):
+        policy.call(broken, endpoint=endpoint)
+    assert breaker.state == "open" and not breaker.trial
+
+    # a cancelled trial does not leave the circuit waiting either
+    now[0] = 62
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(policy.call_async(cancelled, endpoint=endpoint))
+    assert not breaker.trial
+
+    now[0] = 93
+    send, calls = responses(200)
+    assert policy.call(send, endpoint=endpoint).status_code == 200
+    assert breaker.state == "closed"
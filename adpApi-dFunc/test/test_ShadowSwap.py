@@ -0,0 +1,194 @@
+import threading
+
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from sqlalchemy import Table, create_engine, event, inspect, text
+from sqlalchemy.dialects import mssql
+
+from SharedCode.BulkLoad import ToSqlWriter
+from SharedCode.DeltaSync import sync_table
+from SharedCode.ShadowSwap import (
+    ShadowTable,
+    add_primary_key,
+    swap_load,
+    write_partitions,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'edw.db'}")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE stg_hr_workers (associate_oid TEXT PRIMARY KEY, "
+                "first_name TEXT, status TEXT, row_hash TEXT)"
+            )
+        )
+        connection.execute(text("CREATE INDEX ix_status ON stg_hr_workers (status)"))
+        connection.execute(
+            text("INSERT INTO stg_hr_workers VALUES ('G0', 'Old', 'T', NULL)")
+        )
+    yield engine
+    engine.dispose()
+
+
+def stored(engine):
+    with engine.connect() as connection:
+        return pd.read_sql(
+            "SELECT associate_oid, first_name, status FROM stg_hr_workers "
+            "ORDER BY associate_oid",
+            connection,
+        ).values.tolist()
+
+
+def test_swap_replaces_the_table_and_keeps_its_shape(engine, make_workers):
+    workers = make_workers([["G1", "Ada", "A"], ["G2", None, "A"]])
+    result = swap_load(engine, workers, table="stg_hr_workers")
+
+    assert result["inserted"] == 2 and result["indexes"] == 1
+    assert stored(engine) == workers.values.tolist()
+    tables = inspect(engine).get_table_names()
+    assert tables == ["stg_hr_workers"]
+    assert inspect(engine).get_pk_constraint("stg_hr_workers")[
+        "constrained_columns"
+    ] == ["associate_oid"]
+    assert [
+        index["column_names"] for index in inspect(engine).get_indexes("stg_hr_workers")
+    ] == [["status"]]
+
+    # row hashes were stored, so a delta load right after finds nothing to do
+    with engine.begin() as connection:
+        counts = sync_table(connection, workers, table="stg_hr_workers")
+    assert counts["unchanged"] == 2
+
+    # index names alternate, a second swap does not clash with the first
+    swap_load(engine, make_workers([["G3", "Cy", "A"]]), table="stg_hr_workers")
+    assert stored(engine) == [["G3", "Cy", "A"]]
+
+
+def test_failed_load_leaves_the_table_alone(engine, make_workers):
+    duplicates = make_workers([["G1", "Ada", "A"], ["G1", "Ada", "A"]])
+    with pytest.raises(Exception):
+        swap_load(engine, duplicates, table="stg_hr_workers")
+
+    assert stored(engine) == [["G0", "Old", "T"]]
+    assert inspect(engine).get_table_names() == ["stg_hr_workers"]
+
+
+def test_shadow_is_loaded_in_steps_while_the_table_stays_readable(engine, make_workers):
+    shadow = ShadowTable(engine, "stg_hr_workers")
+    shadow.create()
+    for page in ([["G1", "Ada", "A"]], [["G2", "Bo", "A"]]):
+        with engine.begin() as connection:
+            ToSqlWriter().write(
+                connection, shadow.prepare(make_workers(page)), shadow.name
+            )
+        assert stored(engine) == [["G0", "Old", "T"]]
+
+    shadow.build()
+    shadow.swap()
+    assert stored(engine) == [["G1", "Ada", "A"], ["G2", "Bo", "A"]]
+    assert inspect(engine).get_table_names() == ["stg_hr_workers"]
+
+
+def test_discarded_shadow_leaves_the_table_alone(engine, make_workers):
+    shadow = ShadowTable(engine, "stg_hr_workers")
+    shadow.create()
+    with engine.begin() as connection:
+        ToSqlWriter().write(connection, make_workers([["G1", "Ada", "A"]]), shadow.name)
+    shadow.discard()
+
+    assert stored(engine) == [["G0", "Old", "T"]]
+    assert inspect(engine).get_table_names() == ["stg_hr_workers"]
+
+
+def test_primary_key_is_added_after_the_load():
+    executed = []
+    connection = SimpleNamespace(dialect=mssql.dialect(), execute=executed.append)
+    add_primary_key(connection, "stg_hr_workers_shadow", ["associate_oid"], "adp")
+
+    assert [str(statement) for statement in executed] == [
+        "ALTER TABLE adp.stg_hr_workers_shadow ADD PRIMARY KEY (associate_oid)"
+    ]
+
+
+def test_refuses_tables_with_identity(engine, make_workers):
+    def reflect_identity(inspector, table, column):
+        if column["name"] == "associate_oid":
+            column["identity"] = {"start": 1, "increment": 1}
+
+    event.listen(Table, "column_reflect", reflect_identity)
+    try:
+        with pytest.raises(ValueError, match="IDENTITY"):
+            swap_load(
+                engine, make_workers([["G1", "Ada", "A"]]), table="stg_hr_workers"
+            )
+    finally:
+        event.remove(Table, "column_reflect", reflect_identity)
+
+    assert stored(engine) == [["G0", "Old", "T"]]
+    assert inspect(engine).get_table_names() == ["stg_hr_workers"]
+
+
+class RecordingWriter(ToSqlWriter):
+    def __init__(self, fail_on=None):
+        super().__init__()
+        self.fail_on = fail_on
+        self.threads = set()
+
+    def write(self, connection, df, table, schema=None):
+        self.threads.add(threading.get_ident())
+        if self.fail_on in df["associate_oid"].values:
+            raise RuntimeError("partition failed")
+        return super().write(connection, df, table, schema)
+
+
+def test_parallel_swap_reports_each_partition(engine, make_workers):
+    workers = make_workers([[f"G{n:03d}", f"Name{n}", "A"] for n in range(50, 0, -1)])
+    writer = RecordingWriter()
+    result = swap_load(
+        engine, workers, table="stg_hr_workers", writer=writer, partitions=4
+    )
+
+    assert [partition["rows"] for partition in result["partitions"]] == [12, 13, 12, 13]
+    assert all(partition["seconds"] >= 0 for partition in result["partitions"])
+    assert result["inserted"] == 50
+    assert len(writer.threads) > 1
+    assert stored(engine) == sorted(workers.values.tolist())
+
+
+def test_failed_partition_fails_the_whole_load(engine, make_workers):
+    workers = make_workers([[f"G{n:03d}", "Ada", "A"] for n in range(40)])
+    with pytest.raises(RuntimeError, match="partition failed"):
+        swap_load(
+            engine,
+            workers,
+            table="stg_hr_workers",
+            writer=RecordingWriter(fail_on="G025"),
+            partitions=4,
+        )
+
+    assert stored(engine) == [["G0", "Old", "T"]]
+    assert inspect(engine).get_table_names() == ["stg_hr_workers"]
+
+
+def test_write_partitions_never_splits_into_empty_parts(engine, make_workers):
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE scratch "
+                "(associate_oid TEXT, first_name TEXT, status TEXT)"
+            )
+        )
+    written = write_partitions(
+        engine,
+        ToSqlWriter(),
+        make_workers([["G1", "Ada", "A"]]),
+        "scratch",
+        partitions=8,
+    )
+    assert written == [{"partition": 0, "rows": 1, "seconds": written[0]["seconds"]}]
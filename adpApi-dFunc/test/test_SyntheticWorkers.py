@@ -0,0 +1,44 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from synthetic_workers import WorkerGenerator, aoid  # noqa: E402
+
+import CustomFormat  # noqa: E402
+import MergeWorkers  # noqa: E402
+import WorkerFormat  # noqa: E402
+from SharedCode.Config import columns, custom_columns  # noqa: E402
+from SharedCode.Flatten import Flattener  # noqa: E402
+from SharedCode.Wire import decode_frame  # noqa: E402
+
+
+def test_documents_are_reproducible_and_shaped_by_config():
+    generator = WorkerGenerator(columns, custom_columns, seed=3)
+    assert generator.worker(7) == WorkerGenerator(
+        columns, custom_columns, seed=3
+    ).worker(7)
+
+    full = WorkerGenerator(
+        columns, custom_columns, missing_rate=0, empty_rate=0, none_rate=0
+    )
+    row = Flattener(columns).row(full.base(5))
+    assert row["associate_oid"] == aoid(5)
+    assert None not in row.values()
+    assert None not in Flattener(custom_columns).row(full.custom(5)).values()
+
+
+def test_stages_handle_missing_sections_and_none_workers():
+    generator = WorkerGenerator(
+        columns, custom_columns, missing_rate=0.3, none_rate=0.2, none_custom_rate=0.2
+    )
+    pairs = generator.custom_workers(200)
+    assert any(attributes is None for _, attributes in pairs)
+
+    base = WorkerFormat.main(generator.workers(200))
+    custom = CustomFormat.main(({}, pairs))
+    merged = decode_frame(MergeWorkers.main((base, custom))["workers"])
+
+    assert len(merged) == 200
+    assert merged["associate_oid"].tolist() == [aoid(index) for index in range(200)]
+    assert merged.isna().any().any()
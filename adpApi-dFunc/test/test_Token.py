@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+from SharedCode.Token import TokenManager, token_expiring
+
+adp_credentials = {"client_id": "mock_client_id"}
+
+
+def make_token(name, expires_at):
+    return {"bearer_token": name, "status": 200, "expires_at": expires_at.isoformat()}
+
+
+def test_token_expiring():
+    now = datetime(2023, 8, 18, 23, 50, tzinfo=timezone.utc)
+
+    # crosses midnight without wrapping around
+    assert not token_expiring(make_token("a", now + timedelta(hours=1)), now, 300)
+    assert token_expiring(make_token("a", now + timedelta(minutes=4)), now, 300)
+    # naive orchestration clocks are treated as UTC
+    assert not token_expiring(
+        make_token("a", now + timedelta(hours=1)), now.replace(tzinfo=None), 300
+    )
+    assert token_expiring({"bearer_token": "a"}, now)
+    assert token_expiring(None, now)
+
+
+@patch("SharedCode.Token.request_token")
+def test_get_reuses_cached_token(mock_request):
+    mock_request.return_value = make_token(
+        "a", datetime.now(timezone.utc) + timedelta(hours=1)
+    )
+    manager = TokenManager()
+
+    assert manager.get(adp_credentials) is manager.get(adp_credentials)
+    assert mock_request.call_count == 1
+
+
+@patch("SharedCode.Token.request_token")
+def test_send_refreshes_once_on_401(mock_request):
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    stale = make_token("stale", expires_at)
+    mock_request.return_value = make_token("fresh", expires_at)
+    manager = TokenManager()
+
+    sent = []
+
+    def request(token):
+        sent.append(token["bearer_token"])
+        return Mock(status_code=401 if token["bearer_token"] == "stale" else 200)
+
+    assert manager.send(request, adp_credentials, stale).status_code == 200
+    # a second caller holding the stale token picks up the refreshed one
+    assert manager.send(request, adp_credentials, stale).status_code == 200
+    assert sent == ["stale", "fresh", "fresh"]
+    assert mock_request.call_count == 1
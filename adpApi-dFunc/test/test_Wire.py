@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from SharedCode.Wire import decode_frame, encode_frame
+
+
+@pytest.fixture
+def workers(make_workers):
+    return make_workers(
+        [["G1", "Ada", 1.5], ["G2", None, float("nan")], ["G3", "Cy", 3.0]],
+        columns=["associate_oid", "first_name", "salary"],
+    )
+
+
+@pytest.mark.parametrize("codec", ["", "zlib"])
+def test_round_trip(codec, workers):
+    frame = encode_frame(workers, codec=codec)
+
+    assert frame["columns"] == ["associate_oid", "first_name", "salary"]
+    assert frame["length"] == 3
+    if not codec:
+        assert frame["data"][2] == [1.5, None, 3.0]
+    pd.testing.assert_frame_equal(decode_frame(frame), workers)
+
+
+def test_legacy_shapes(workers):
+    assert decode_frame(workers.to_dict())["first_name"].tolist() == ["Ada", None, "Cy"]
+    assert decode_frame(workers.to_dict("records"))["associate_oid"].tolist() == [
+        "G1",
+        "G2",
+        "G3",
+    ]
@@ -1,5 +1,5 @@
 import requests
-from SharedCode.Patch import _is_key_file_encrypted, patch_requests
+from SharedCode.Patch import SessionPool, _is_key_file_encrypted, patch_requests
 from unittest.mock import MagicMock, patch
 from OpenSSL.crypto import PKey
 from OpenSSL.crypto import TYPE_RSA
@@ -19,3 +19,39 @@ def test_patch_requests_with_adapter():
 
     r = requests.get("https://httpbin.org/get")
     assert r.status_code == 200
+
+
+def test_session_pool_reuses_sessions():
+    cert = MagicMock()
+    cert.fingerprint.return_value = b"\x01"
+    pool = SessionPool(pool_size=2, max_sessions=1)
+
+    with pool.lease((cert, None)) as session:
+        with pool.lease((cert, None)) as again:
+            assert again is session
+    with pool.lease() as other:
+        assert other is not session
+
+    # only one session is kept, the first certificate gets a new one
+    with pool.lease((cert, None)) as again:
+        assert again is not session
+    pool.clear()
+
+
+def test_session_pool_closes_evicted_sessions_once_released():
+    cert = MagicMock()
+    cert.fingerprint.return_value = b"\x01"
+    pool = SessionPool(pool_size=2, max_sessions=1)
+
+    with pool.lease((cert, None)) as session:
+        session.close = MagicMock()
+        with pool.lease() as other:
+            other.close = MagicMock()
+            # evicted while another thread still sends on it
+            session.close.assert_not_called()
+        session.close.assert_not_called()
+        other.close.assert_not_called()
+    session.close.assert_called_once()
+
+    pool.clear()
+    other.close.assert_called_once()